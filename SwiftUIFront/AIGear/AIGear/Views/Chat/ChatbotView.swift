@@ -913,6 +913,10 @@ struct FormattedTextView: View {
             // Hide coordinates from user - they're only for internal map integration
             EmptyView()
             
+        } else if content.hasPrefix("**Place ID:**") {
+            // Hide place id - internal reference for the shop
+            EmptyView()
+            
         } else if content.hasPrefix("**Google Maps:**") {
             // Hide old Google Maps entries completely
             EmptyView()
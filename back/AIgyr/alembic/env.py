@@ -3,7 +3,8 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 from src.database import Base
 from src.auth.models import User
-from src.posts.models import Post, TrailData
+from src.posts.models import Post, TrailData, TrailGeoCell
+from src.aiengine.models import RentalShop, RentalRegion
 
 from logging.config import fileConfig
 
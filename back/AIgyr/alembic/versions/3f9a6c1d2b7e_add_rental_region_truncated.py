@@ -0,0 +1,31 @@
+"""add_rental_region_truncated
+
+Revision ID: 3f9a6c1d2b7e
+Revises: ecf7735a9381
+Create Date: 2026-10-19 18:42:10.514203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a6c1d2b7e'
+down_revision: Union[str, Sequence[str], None] = 'ecf7735a9381'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'rental_regions',
+        sa.Column('truncated', sa.Boolean(), server_default=sa.false(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('rental_regions', 'truncated')
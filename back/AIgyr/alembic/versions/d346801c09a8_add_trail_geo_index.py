@@ -0,0 +1,92 @@
+"""add_trail_geo_index
+
+Revision ID: d346801c09a8
+Revises: 687edc95c240
+Create Date: 2026-10-19 09:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd346801c09a8'
+down_revision: Union[str, Sequence[str], None] = '687edc95c240'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('trail_data', sa.Column('min_lat', sa.Float(), nullable=True))
+    op.add_column('trail_data', sa.Column('min_lon', sa.Float(), nullable=True))
+    op.add_column('trail_data', sa.Column('max_lat', sa.Float(), nullable=True))
+    op.add_column('trail_data', sa.Column('max_lon', sa.Float(), nullable=True))
+    op.add_column('trail_data', sa.Column('centroid_lat', sa.Float(), nullable=True))
+    op.add_column('trail_data', sa.Column('centroid_lon', sa.Float(), nullable=True))
+    op.add_column('trail_data', sa.Column('geohash', sa.String(length=12, collation='C'), nullable=True))
+    op.create_index('ix_trail_data_geohash', 'trail_data', ['geohash'])
+
+    op.create_table(
+        'trail_geo_cells',
+        sa.Column('cell', sa.String(length=12, collation='C'), nullable=False),
+        sa.Column('trail_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['trail_id'], ['trail_data.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cell', 'trail_id'),
+    )
+    op.create_index('ix_trail_geo_cells_trail_id', 'trail_geo_cells', ['trail_id'])
+
+    _backfill_trail_geometry()
+
+
+def _backfill_trail_geometry() -> None:
+    """Compute the spatial summary for trails uploaded before the index existed."""
+    from src.posts.utils import compute_trail_geometry
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, coordinates FROM trail_data WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+
+        for trail_id, coordinates in rows:
+            geometry = compute_trail_geometry(coordinates or [])
+            if not geometry:
+                continue
+            conn.execute(
+                text("""
+                    UPDATE trail_data
+                    SET min_lat = :min_lat, min_lon = :min_lon, max_lat = :max_lat, max_lon = :max_lon,
+                        centroid_lat = :centroid_lat, centroid_lon = :centroid_lon, geohash = :geohash
+                    WHERE id = :id
+                """),
+                {**{k: v for k, v in geometry.items() if k != "cells"}, "id": trail_id},
+            )
+            conn.execute(
+                text("INSERT INTO trail_geo_cells (cell, trail_id) VALUES (:cell, :trail_id)"),
+                [{"cell": cell, "trail_id": trail_id} for cell in geometry["cells"]],
+            )
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_trail_geo_cells_trail_id', table_name='trail_geo_cells')
+    op.drop_table('trail_geo_cells')
+    op.drop_index('ix_trail_data_geohash', table_name='trail_data')
+    op.drop_column('trail_data', 'geohash')
+    op.drop_column('trail_data', 'centroid_lon')
+    op.drop_column('trail_data', 'centroid_lat')
+    op.drop_column('trail_data', 'max_lon')
+    op.drop_column('trail_data', 'max_lat')
+    op.drop_column('trail_data', 'min_lon')
+    op.drop_column('trail_data', 'min_lat')
@@ -0,0 +1,64 @@
+"""add_trail_fingerprint
+
+Revision ID: e599db55451f
+Revises: d346801c09a8
+Create Date: 2026-10-19 11:40:07.204915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e599db55451f'
+down_revision: Union[str, Sequence[str], None] = 'd346801c09a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('trail_data', sa.Column('last_uploaded_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+    op.add_column('trail_data', sa.Column('fingerprint', sa.String(length=64), nullable=True))
+    op.create_index('ix_trail_data_user_id_fingerprint', 'trail_data', ['user_id', 'fingerprint'])
+
+    conn = op.get_bind()
+    conn.execute(text("UPDATE trail_data SET last_uploaded_at = COALESCE(created_at, now())"))
+    _backfill_fingerprints(conn)
+
+
+def _backfill_fingerprints(conn) -> None:
+    from src.posts.utils import compute_trail_fingerprint
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("""
+                SELECT id, coordinates, distance_meters, elevation_gain_meters, trail_conditions
+                FROM trail_data WHERE id > :last_id ORDER BY id LIMIT :limit
+            """),
+            {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+
+        for trail_id, coordinates, distance, elevation, conditions in rows:
+            fingerprint = compute_trail_fingerprint(coordinates or [], distance, elevation, conditions)
+            if fingerprint:
+                conn.execute(
+                    text("UPDATE trail_data SET fingerprint = :fingerprint WHERE id = :id"),
+                    {"fingerprint": fingerprint, "id": trail_id},
+                )
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_trail_data_user_id_fingerprint', table_name='trail_data')
+    op.drop_column('trail_data', 'fingerprint')
+    op.drop_column('trail_data', 'last_uploaded_at')
@@ -0,0 +1,61 @@
+"""add_rental_shops
+
+Revision ID: ecf7735a9381
+Revises: e599db55451f
+Create Date: 2026-10-19 14:05:31.862417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ecf7735a9381'
+down_revision: Union[str, Sequence[str], None] = 'e599db55451f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'rental_shops',
+        sa.Column('place_id', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lon', sa.Float(), nullable=False),
+        sa.Column('geohash', sa.String(length=12, collation='C'), nullable=False),
+        sa.Column('rating', sa.Float(), nullable=True),
+        sa.Column('user_ratings_total', sa.Integer(), nullable=True),
+        sa.Column('vicinity', sa.String(), nullable=True),
+        sa.Column('business_status', sa.String(), nullable=True),
+        sa.Column('price_level', sa.Integer(), nullable=True),
+        sa.Column('types', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column('region', sa.String(length=12, collation='C'), nullable=False),
+        sa.Column('last_seen_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('place_id'),
+    )
+    op.create_index('ix_rental_shops_geohash', 'rental_shops', ['geohash'])
+    op.create_index('ix_rental_shops_region_last_seen_at', 'rental_shops', ['region', 'last_seen_at'])
+
+    op.create_table(
+        'rental_regions',
+        sa.Column('cell', sa.String(length=12, collation='C'), nullable=False),
+        sa.Column('harvested_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('requested_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('shop_count', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('cell'),
+    )
+    op.create_index('ix_rental_regions_harvested_at', 'rental_regions', ['harvested_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rental_regions_harvested_at', table_name='rental_regions')
+    op.drop_table('rental_regions')
+    op.drop_index('ix_rental_shops_region_last_seen_at', table_name='rental_shops')
+    op.drop_index('ix_rental_shops_geohash', table_name='rental_shops')
+    op.drop_table('rental_shops')
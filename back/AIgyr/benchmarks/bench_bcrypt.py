@@ -0,0 +1,120 @@
+"""Benchmark login throughput against bcrypt cost and password pool size.
+
+Offline mode hashes once per cost, then sends a burst of concurrent verifies
+through a PasswordHasher the way /auth/login does. It reports logins per
+second, end-to-end latency and queue wait. Use it to pick BCRYPT_ROUNDS
+(aim for roughly 250 ms per hash on production hardware) and
+PASSWORD_HASH_WORKERS. With --base-url it also sends a login burst to a
+running server and prints the server's pool stats (an internal endpoint: pass
+--internal-token or set INTERNAL_API_TOKEN).
+
+Usage (from back/AIgyr):
+    python -m benchmarks.bench_bcrypt --rounds 10 11 12 13 --workers 1 2 4 --logins 64
+    python -m benchmarks.bench_bcrypt --rounds 12 --base-url http://localhost:8000 \\
+        --email hiker@example.com --password secret --logins 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+from passlib.context import CryptContext
+
+from src.auth.exceptions import PasswordHashingBusyError
+from src.auth.password_hashing import PasswordHasher
+
+
+def _percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _verifier(rounds: int):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+    stored = context.hash("correct horse battery staple")
+    return lambda password, hashed: (context.verify(password, hashed), None), stored
+
+
+async def _burst(hasher: PasswordHasher, verify, stored: str, logins: int):
+    latencies, rejected = [], 0
+
+    async def login():
+        nonlocal rejected
+        start = time.perf_counter()
+        try:
+            await hasher.run(verify, "correct horse battery staple", stored)
+        except PasswordHashingBusyError:
+            rejected += 1
+            return
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(logins)])
+    return latencies, rejected, time.perf_counter() - start
+
+
+async def bench_offline(rounds_list, workers_list, logins: int, queue_limit: int) -> None:
+    print(f"{os.cpu_count()} CPU(s), burst of {logins} logins, queue limit {queue_limit}\n")
+    print(f"{'rounds':>6} {'hash ms':>8} {'workers':>7} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'wait p99':>8} {'503s':>5}")
+    for rounds in rounds_list:
+        verify, stored = _verifier(rounds)
+        single = []
+        for _ in range(3):
+            start = time.perf_counter()
+            verify("correct horse battery staple", stored)
+            single.append((time.perf_counter() - start) * 1000)
+        for workers in workers_list:
+            hasher = PasswordHasher(workers, queue_limit)
+            latencies, rejected, elapsed = await _burst(hasher, verify, stored, logins)
+            stats = hasher.stats()
+            hasher.close()
+            print(f"{rounds:>6} {statistics.median(single):>8.1f} {workers:>7} {len(latencies) / elapsed:>9.1f} "
+                  f"{_percentile(latencies, 0.5):>8.0f} {_percentile(latencies, 0.99):>8.0f} "
+                  f"{stats['wait_ms_p99']:>8.0f} {rejected:>5}")
+
+
+async def bench_server(base_url: str, email: str, password: str, logins: int, internal_token: str) -> None:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def login():
+            start = time.perf_counter()
+            resp = await client.post("/auth/login", json={"email": email, "password": password})
+            return resp.status_code, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[login() for _ in range(logins)])
+        elapsed = time.perf_counter() - start
+        ok = [ms for code, ms in results if code == 200]
+        codes = sorted({code for code, _ in results})
+        print(f"\n{base_url}/auth/login x{logins}: {len(ok) / elapsed:.1f} logins/s, status codes {codes}")
+        if ok:
+            print(f"   p50={_percentile(ok, 0.5):.0f}ms p99={_percentile(ok, 0.99):.0f}ms")
+        if internal_token:
+            stats = await client.get("/auth/password-hashing/stats", headers={"X-Internal-Token": internal_token})
+            print(f"   pool: {stats.json()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--logins", type=int, default=64, help="Concurrent logins per burst")
+    parser.add_argument("--queue-limit", type=int, default=64)
+    parser.add_argument("--base-url", help="Running API to send a login burst to")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--internal-token", default=os.getenv("INTERNAL_API_TOKEN"),
+                        help="Token for the server's pool stats")
+    args = parser.parse_args()
+
+    asyncio.run(bench_offline(args.rounds, args.workers, args.logins, args.queue_limit))
+    if args.base_url:
+        if not (args.email and args.password):
+            raise SystemExit("--email and --password are required with --base-url")
+        asyncio.run(bench_server(args.base_url, args.email, args.password, args.logins, args.internal_token))
+
+
+if __name__ == "__main__":
+    main()
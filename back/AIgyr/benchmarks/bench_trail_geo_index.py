@@ -0,0 +1,178 @@
+"""Benchmark nearby-trail lookups through the geohash cell index.
+
+Loads synthetic trails into a scratch schema of the database pointed to by
+DATABASE_URL, then compares `find_trails_near` against a sequential scan of
+the bounding-box columns (a lower bound for the old decode-every-row approach).
+
+Usage (from back/AIgyr):
+    python -m benchmarks.bench_trail_geo_index --trails 1000000 --queries 200
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from src.geo import bbox_around
+from src.posts.models import TrailData, TrailGeoCell
+from src.posts.service import find_trails_near
+from src.posts.utils import compute_trail_geometry
+
+SCHEMA = "bench_geo"
+
+# Trailhead clusters the synthetic trails are scattered around
+CLUSTERS = [
+    (43.238, 76.889),    # Almaty
+    (47.606, -122.332),  # Seattle
+    (39.739, -104.990),  # Denver
+    (40.760, -111.891),  # Salt Lake City
+    (35.595, -82.551),   # Asheville
+    (46.558, 7.835),     # Lauterbrunnen
+    (27.988, 86.925),    # Everest region
+    (-41.286, 174.776),  # Wellington
+]
+
+
+def _random_trail(rng: random.Random, points: int):
+    base_lat, base_lon = rng.choice(CLUSTERS)
+    lat = base_lat + rng.gauss(0, 0.8)
+    lon = base_lon + rng.gauss(0, 0.8)
+    coords = []
+    for _ in range(points):
+        lat += rng.uniform(-0.001, 0.001)
+        lon += rng.uniform(-0.001, 0.001)
+        coords.append([round(lat, 6), round(lon, 6)])
+    return coords
+
+
+def _pg_array(coords) -> str:
+    return "{" + ",".join("{%s,%s}" % (lat, lon) for lat, lon in coords) + "}"
+
+
+def load_trails(engine, count: int, points: int, seed: int) -> None:
+    rng = random.Random(seed)
+    batch = 20000
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for start in range(0, count, batch):
+            trails_buf = io.StringIO()
+            cells_buf = io.StringIO()
+            for trail_id in range(start + 1, min(start + batch, count) + 1):
+                coords = _random_trail(rng, points)
+                geometry = compute_trail_geometry(coords)
+                trails_buf.write("\t".join([
+                    str(trail_id), f"user-{trail_id % 50000}", _pg_array(coords), "5000", "300", "{rocky}",
+                    str(geometry["min_lat"]), str(geometry["min_lon"]),
+                    str(geometry["max_lat"]), str(geometry["max_lon"]),
+                    str(geometry["centroid_lat"]), str(geometry["centroid_lon"]), geometry["geohash"],
+                ]) + "\n")
+                for cell in geometry["cells"]:
+                    cells_buf.write(f"{cell}\t{trail_id}\n")
+            trails_buf.seek(0)
+            cells_buf.seek(0)
+            cursor.copy_expert(
+                "COPY trail_data (id, user_id, coordinates, distance_meters, elevation_gain_meters, "
+                "trail_conditions, min_lat, min_lon, max_lat, max_lon, centroid_lat, centroid_lon, geohash) "
+                "FROM STDIN",
+                trails_buf,
+            )
+            cursor.copy_expert("COPY trail_geo_cells (cell, trail_id) FROM STDIN", cells_buf)
+            raw.commit()
+            print(f"  loaded {min(start + batch, count):,} trails", end="\r")
+        cursor.execute("ANALYZE trail_data")
+        cursor.execute("ANALYZE trail_geo_cells")
+        raw.commit()
+        print()
+    finally:
+        raw.close()
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _report(label: str, timings_ms) -> None:
+    print(
+        f"{label:<34} p50={statistics.median(timings_ms):8.2f}ms  "
+        f"p99={_percentile(timings_ms, 0.99):8.2f}ms  n={len(timings_ms)}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trails", type=int, default=1_000_000)
+    parser.add_argument("--points-per-trail", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=5, help="Sequential-scan baseline queries")
+    parser.add_argument("--radius-m", type=float, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    load_dotenv()
+    engine = create_engine(
+        os.environ["DATABASE_URL"],
+        connect_args={"options": f"-csearch_path={SCHEMA}"},
+    )
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    TrailData.__table__.create(engine)
+    TrailGeoCell.__table__.create(engine)
+
+    print(f"Loading {args.trails:,} trails ({args.points_per_trail} points each)...")
+    started = time.perf_counter()
+    load_trails(engine, args.trails, args.points_per_trail, args.seed)
+    print(f"Loaded in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(args.seed + 1)
+    probes = []
+    for _ in range(args.queries):
+        lat, lon = rng.choice(CLUSTERS)
+        probes.append((lat + rng.gauss(0, 0.8), lon + rng.gauss(0, 0.8)))
+
+    Session = sessionmaker(bind=engine)
+    index_ms, hits = [], []
+    with Session() as db:
+        for lat, lon in probes:
+            started = time.perf_counter()
+            results = find_trails_near(db, lat, lon, args.radius_m, limit=50)
+            index_ms.append((time.perf_counter() - started) * 1000)
+            hits.append(len(results))
+
+    scan_ms = []
+    scan_sql = text(
+        "SELECT id FROM trail_data "
+        "WHERE max_lat >= :min_lat AND min_lat <= :max_lat AND max_lon >= :min_lon AND min_lon <= :max_lon"
+    )
+    with engine.connect() as conn:
+        conn.execute(text("SET enable_indexscan = off"))
+        conn.execute(text("SET enable_bitmapscan = off"))
+        for lat, lon in probes[:args.scan_queries]:
+            min_lat, min_lon, max_lat, max_lon = bbox_around(lat, lon, args.radius_m)
+            started = time.perf_counter()
+            conn.execute(scan_sql, {
+                "min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat, "max_lon": max_lon,
+            }).fetchall()
+            scan_ms.append((time.perf_counter() - started) * 1000)
+
+    print(f"\nRadius {args.radius_m:.0f}m over {args.trails:,} trails "
+          f"(avg {statistics.mean(hits):.1f} hits per query)")
+    _report("geohash index (find_trails_near)", index_ms)
+    if scan_ms:
+        _report("sequential scan (bbox only)", scan_ms)
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
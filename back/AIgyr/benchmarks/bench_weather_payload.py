@@ -0,0 +1,144 @@
+"""Benchmark weather payload size and transfer time: full vs projected, plain vs gzip.
+
+Offline mode projects a real One Call document (fetched live with
+OPENWEATHER_API_KEY, or loaded with --payload) the way the weather endpoints
+do, then reports bytes, gzip cost per level and the estimated transfer time
+over a cellular link. With --base-url and --token it also calls a running
+server and measures wire bytes and latency end to end.
+
+Usage (from back/AIgyr):
+    python -m benchmarks.bench_weather_payload --lat 43.05 --lon 76.98
+    python -m benchmarks.bench_weather_payload --payload onecall.json \\
+        --base-url http://localhost:8000 --token <jwt> --requests 20
+"""
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+from src.aiengine.weather_service import (
+    COMPACT_WEATHER_PROJECTION,
+    ONECALL_SECTIONS,
+    _fetch_onecall,
+    project_weather,
+)
+
+GZIP_LEVELS = (1, 5, 9)
+
+# Section sets returned by each endpoint (see src/aiengine/router.py)
+ENDPOINT_SECTIONS = {
+    "current": ("current",),
+    "forecast": ("current", "daily", "alerts"),
+    "hourly": ("current", "hourly"),
+    "full": ("current", "hourly", "daily", "alerts"),
+}
+
+
+def _serialize(data) -> bytes:
+    # Same encoding as Starlette's JSONResponse
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _transfer_ms(size: int, bandwidth_kbps: float, rtt_ms: float) -> float:
+    return rtt_ms + size * 8 / bandwidth_kbps
+
+
+def bench_offline(document, repeat: int, bandwidth_kbps: float, rtt_ms: float) -> None:
+    print(f"Link model: {bandwidth_kbps:.0f} kbit/s, {rtt_ms:.0f} ms RTT\n")
+    header = f"{'endpoint':<9} {'view':<8} {'bytes':>8} {'proj ms':>8}"
+    for level in GZIP_LEVELS:
+        header += f" {'gzip' + str(level):>8} {'ms':>6}"
+    header += f" {'link ms':>8} {'gz link':>8}"
+    print(header)
+
+    for endpoint, sections in ENDPOINT_SECTIONS.items():
+        data = {key: value for key, value in document.items() if key not in ONECALL_SECTIONS or key in sections}
+        for view, projection in (("full", None), ("compact", COMPACT_WEATHER_PROJECTION)):
+            project_ms = _median_ms(lambda: project_weather(data, projection), repeat)
+            body = _serialize(project_weather(data, projection))
+            row = f"{endpoint:<9} {view:<8} {len(body):>8} {project_ms:>8.3f}"
+            default_gz = None
+            for level in GZIP_LEVELS:
+                compressed = gzip.compress(body, compresslevel=level)
+                gzip_ms = _median_ms(lambda: gzip.compress(body, compresslevel=level), repeat)
+                row += f" {len(compressed):>8} {gzip_ms:>6.2f}"
+                if level == 5:
+                    default_gz = len(compressed)
+            row += f" {_transfer_ms(len(body), bandwidth_kbps, rtt_ms):>8.0f} {_transfer_ms(default_gz, bandwidth_kbps, rtt_ms):>8.0f}"
+            print(row)
+
+
+def bench_server(base_url: str, token: str, lat: float, lon: float, requests: int) -> None:
+    cases = [
+        ("POST", "/aiengine/weather/hourly", {"lat": lat, "lon": lon, "hours": 48}),
+        ("POST", "/aiengine/weather/forecast", {"lat": lat, "lon": lon, "days": 8}),
+        ("POST", "/aiengine/weather/current", {"lat": lat, "lon": lon}),
+        ("GET", "/gear/latest", None),
+    ]
+    print(f"\n{'endpoint':<28} {'variant':<16} {'wire bytes':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    headers = {"Authorization": f"Bearer {token}"}
+    with httpx.Client(base_url=base_url, headers=headers, timeout=30) as client:
+        for method, path, body in cases:
+            variants = [("plain", "identity", {}), ("gzip", "gzip", {})]
+            if path.startswith("/aiengine/weather"):
+                variants += [("compact", "identity", {"compact": "true"}), ("compact+gzip", "gzip", {"compact": "true"})]
+            for name, encoding, params in variants:
+                timings, size = [], 0
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    resp = client.request(method, path, json=body, params=params, headers={"Accept-Encoding": encoding})
+                    resp.read()
+                    timings.append((time.perf_counter() - start) * 1000)
+                    size = resp.num_bytes_downloaded
+                    if resp.status_code != 200:
+                        print(f"⚠️ {path} {name}: HTTP {resp.status_code}")
+                        break
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(f"{path:<28} {name:<16} {size:>10} {statistics.median(timings):>8.1f} {p95:>8.1f}")
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lat", type=float, default=43.05)
+    parser.add_argument("--lon", type=float, default=76.98)
+    parser.add_argument("--payload", help="One Call JSON file to use instead of a live fetch")
+    parser.add_argument("--repeat", type=int, default=200, help="Timing repetitions for offline measurements")
+    parser.add_argument("--bandwidth-kbps", type=float, default=400, help="Modelled downlink (weak 3G/LTE edge)")
+    parser.add_argument("--rtt-ms", type=float, default=150)
+    parser.add_argument("--base-url", help="Running API to measure end to end")
+    parser.add_argument("--token", help="Bearer token for --base-url")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per variant against --base-url")
+    args = parser.parse_args()
+
+    if args.payload:
+        with open(args.payload) as f:
+            document = json.load(f)
+    else:
+        document = _fetch_onecall(args.lat, args.lon)
+        if document is None:
+            raise SystemExit("Could not fetch a One Call document; pass --payload or set OPENWEATHER_API_KEY")
+
+    bench_offline(document, args.repeat, args.bandwidth_kbps, args.rtt_ms)
+    if args.base_url:
+        if not args.token:
+            raise SystemExit("--token is required with --base-url")
+        bench_server(args.base_url, args.token, args.lat, args.lon, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Load-test /ws/chat with simulated mobile clients.
+
+Starts the app in a child process with OpenAI, the database and activity
+tracking replaced by local stubs (a streamed canned completion with
+configurable latency, a fixed trail, every token's user accepted), then drives
+it with thousands of websocket clients in this process:
+
+  1. ramp:   open --clients sockets, --connect-concurrency handshakes at a time
+  2. chat:   for --duration seconds every client alternates think time with a
+             message: small talk (answered at once), gear suggestions (a
+             streamed LLM response) or a keepalive ping
+  3. storm:  --storm-fraction of the clients drop at once, as when a cell
+             tower hands over, and all reconnect immediately
+
+It reports connect rate and latency, p50/p99 message latency per kind,
+errors, the server's resident memory per open connection and /ws/stats
+(read with INTERNAL_API_TOKEN, generated for the run unless already set).
+
+Usage (from back/AIgyr):
+    python -m benchmarks.ws_load_test --clients 2000 --duration 60
+    python -m benchmarks.ws_load_test --clients 5000 --protocol msgpack --storm-fraction 0.5
+
+Raise the open-file limit for large runs (ulimit -n 65536). The client side
+shares one event loop, so at very high rates its own scheduling delay shows up
+in the latencies; compare runs at the same client count. Without Redis the
+server logs fan-out warnings and delivers locally, which is all a single
+worker needs.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import statistics
+import sys
+import time
+import types
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import msgpack
+from dotenv import load_dotenv
+from websockets.asyncio.client import connect
+
+STUB_COMPLETION = (
+    "Gear recommendations:\n- Hiking boots with ankle support\n- Trekking poles\n- Rain jacket\n"
+    "- 2L of water\n- Headlamp\n\nHiking tips:\n- Start early\n- Check the forecast\n"
+    "- Tell someone your route\n- Turn back if the weather turns\n- Pack out all trash\n"
+)
+SMALL_TALK = ["hi", "thanks!", "how long is it?", "ok"]
+SUGGESTION_PROMPTS = ["suggest gear for my hike", "what should i bring?", "recommend some gear"]
+MSGPACK_SUBPROTOCOL = "aigear.msgpack.v1"
+
+
+# --- Server side (child process) ---
+
+class _StubStream:
+    def __init__(self, text: str, chunk_chars: int, chunk_delay: float):
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+
+    async def __aiter__(self):
+        for start in range(0, len(self.text), self.chunk_chars):
+            await asyncio.sleep(self.chunk_delay)
+            delta = types.SimpleNamespace(content=self.text[start:start + self.chunk_chars])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+
+class _StubCompletions:
+    def __init__(self, first_token_seconds: float, chunk_delay: float):
+        self.first_token_seconds = first_token_seconds
+        self.chunk_delay = chunk_delay
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.first_token_seconds)
+        return _StubStream(STUB_COMPLETION, 12, self.chunk_delay)
+
+
+def _run_server(port: int, first_token_seconds: float, chunk_delay: float, show_logs: bool) -> None:
+    if not show_logs:
+        # The app prints a line per connection; at thousands of sockets that is the bottleneck
+        sys.stdout = open(os.devnull, "w")
+    # Caps are read at import time; the test must not trip them
+    os.environ.setdefault("WS_MAX_CONNECTIONS_PER_WORKER", "1000000")
+    os.environ.setdefault("WS_IDLE_TIMEOUT_SECONDS", "3600")
+
+    import uvicorn
+    from src.aiengine import websocket as chat
+    from src.main import app
+
+    trail = types.SimpleNamespace(trail_conditions=["rocky", "steep"], elevation_gain_meters=850, distance_meters=14000)
+    chat.openai_client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=_StubCompletions(first_token_seconds, chunk_delay))
+    )
+    chat.load_latest_trail = lambda user_id: trail
+    chat._user_exists = lambda user_id: True
+    chat.record_user_activity = lambda user_id: None
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", ws="websockets",
+                ws_max_size=65536, ws_ping_interval=20, ws_ping_timeout=20, backlog=4096)
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# --- Client side ---
+
+class Stats:
+    def __init__(self):
+        self.connect_ms: List[float] = []
+        self.latency_ms: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class SimulatedClient:
+    def __init__(self, url: str, token: str, protocol: str, stats: Stats):
+        self.url = f"{url}?token={token}"
+        self.protocol = protocol
+        self.stats = stats
+        self.ws = None
+        self.seq = 0
+
+    async def connect(self) -> bool:
+        start = time.perf_counter()
+        try:
+            self.ws = await connect(
+                self.url,
+                subprotocols=[MSGPACK_SUBPROTOCOL] if self.protocol == "msgpack" else None,
+                compression=None,  # URLSessionWebSocketTask doesn't negotiate permessage-deflate
+                open_timeout=30,
+                ping_interval=None,
+                max_size=65536,
+            )
+        except Exception as e:
+            self.stats.errors[f"connect:{type(e).__name__}"] += 1
+            self.ws = None
+            return False
+        self.stats.connect_ms.append((time.perf_counter() - start) * 1000)
+        return True
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            try:
+                await self.ws.close()
+            except Exception:
+                pass
+            self.ws = None
+
+    async def _send(self, kind: str, text: str) -> None:
+        self.seq += 1
+        if self.protocol == "msgpack":
+            type_code = 4 if kind == "ping" else 1
+            frame = msgpack.packb({"t": type_code, "s": self.seq, "m": text})
+        else:
+            frame = json.dumps({"type": "ping" if kind == "ping" else "chat", "message": text})
+        self.stats.bytes_sent += len(frame)
+        await self.ws.send(frame)
+
+    def _is_final(self, frame) -> bool:
+        """True once the reply to the last message is complete."""
+        if self.protocol == "msgpack":
+            messages = msgpack.unpackb(frame)
+            messages = messages if isinstance(messages, list) else [messages]
+            return any(m.get("r") == self.seq and m["t"] in (2, 3, 5, 7) for m in messages)
+        return json.loads(frame)["type"] in ("response", "error", "pong")
+
+    async def exchange(self, kind: str, text: str) -> None:
+        start = time.perf_counter()
+        await self._send(kind, text)
+        while True:
+            frame = await asyncio.wait_for(self.ws.recv(), timeout=30)
+            self.stats.bytes_received += len(frame)
+            if self._is_final(frame):
+                break
+        self.stats.latency_ms[kind].append((time.perf_counter() - start) * 1000)
+
+    async def chat(self, until: float, think_seconds: float, rng: random.Random) -> None:
+        while time.monotonic() < until:
+            await asyncio.sleep(rng.expovariate(1 / think_seconds))
+            if time.monotonic() >= until or self.ws is None:
+                return
+            roll = rng.random()
+            if roll < 0.25:
+                kind, text = "suggestions", rng.choice(SUGGESTION_PROMPTS)
+            elif roll < 0.85:
+                kind, text = "small_talk", rng.choice(SMALL_TALK)
+            else:
+                kind, text = "ping", ""
+            try:
+                await self.exchange(kind, text)
+            except Exception as e:
+                self.stats.errors[f"{kind}:{type(e).__name__}"] += 1
+                await self.close()
+                if not await self.connect():
+                    return
+
+
+async def _connect_all(clients: List[SimulatedClient], concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client):
+        async with semaphore:
+            await client.connect()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(client) for client in clients))
+    return time.perf_counter() - start
+
+
+def _percentiles(values: List[float]) -> str:
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return f"n={len(ordered)} p50={statistics.median(ordered):.1f}ms p99={p99:.1f}ms max={ordered[-1]:.1f}ms"
+
+
+async def run(args, server_pid: int, base_url: str) -> None:
+    from src.auth.utils import create_access_token
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    ws_url = base_url.replace("http://", "ws://") + "/ws/chat"
+    clients = [
+        SimulatedClient(ws_url, create_access_token({"sub": f"load-user-{i}"}), args.protocol, stats)
+        for i in range(args.clients)
+    ]
+
+    rss_idle = _rss_bytes(server_pid)
+    elapsed = await _connect_all(clients, args.connect_concurrency)
+    connected = sum(client.ws is not None for client in clients)
+    await asyncio.sleep(1)  # Let per-connection tasks settle before measuring
+    rss_open = _rss_bytes(server_pid)
+    print(f"\n🔌 Ramp: {connected}/{args.clients} connected in {elapsed:.1f}s ({connected / elapsed:.0f}/s); "
+          f"handshake {_percentiles(stats.connect_ms)}")
+    if rss_idle and rss_open and connected:
+        print(f"🧠 Server RSS {rss_idle / 2**20:.0f} MiB idle -> {rss_open / 2**20:.0f} MiB open, "
+              f"{(rss_open - rss_idle) / connected / 1024:.1f} KiB per connection")
+
+    until = time.monotonic() + args.duration
+    await asyncio.gather(*(
+        client.chat(until, args.think_seconds, random.Random(rng.random()))
+        for client in clients if client.ws is not None
+    ))
+    print(f"\n💬 Chat for {args.duration:.0f}s, mean think time {args.think_seconds:.0f}s ({args.protocol}):")
+    for kind in ("small_talk", "suggestions", "ping"):
+        print(f"   {kind:<12} {_percentiles(stats.latency_ms[kind])}")
+    print(f"   bytes sent {stats.bytes_sent}, received {stats.bytes_received}")
+
+    if args.storm_fraction > 0:
+        dropped = [client for client in clients if client.ws is not None and rng.random() < args.storm_fraction]
+        await asyncio.gather(*(client.close() for client in dropped))
+        stats.connect_ms.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(client.connect() for client in dropped))
+        elapsed = time.perf_counter() - start
+        reconnected = sum(client.ws is not None for client in dropped)
+        print(f"\n🌩️ Reconnect storm: {reconnected}/{len(dropped)} back in {elapsed:.1f}s "
+              f"({reconnected / elapsed:.0f}/s); handshake {_percentiles(stats.connect_ms)}")
+        # Reconnected sockets must still answer
+        sample = [client for client in dropped if client.ws is not None][:200]
+        results = await asyncio.gather(*(client.exchange("small_talk", "hi") for client in sample), return_exceptions=True)
+        print(f"   post-storm small talk: {sum(not isinstance(r, Exception) for r in results)}/{len(sample)} ok, "
+              f"{_percentiles(stats.latency_ms['small_talk'][-len(sample):])}")
+
+    headers = {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers) as http:
+        print(f"\n📊 /ws/stats: {(await http.get('/ws/stats')).json()}")
+    if stats.errors:
+        print(f"❌ Errors: {dict(stats.errors)}")
+
+    await asyncio.gather(*(client.close() for client in clients))
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of chat traffic")
+    parser.add_argument("--think-seconds", type=float, default=10, help="Mean pause between a client's messages")
+    parser.add_argument("--protocol", choices=["json", "msgpack"], default="json")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="Handshakes in flight during the ramp")
+    parser.add_argument("--storm-fraction", type=float, default=0.3, help="Share of clients dropped and reconnected at once")
+    parser.add_argument("--llm-first-token-ms", type=float, default=400, help="Stub completion latency")
+    parser.add_argument("--llm-chunk-ms", type=float, default=15, help="Stub delay between streamed chunks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server-logs", action="store_true", help="Show the server's output")
+    args = parser.parse_args()
+
+    # /ws/stats is internal; the spawned server inherits this token
+    os.environ.setdefault("INTERNAL_API_TOKEN", secrets.token_urlsafe(16))
+    # Spawn, not fork: the server imports the app fresh with the test's settings
+    context = multiprocessing.get_context("spawn")
+    server = context.Process(
+        target=_run_server,
+        args=(args.port, args.llm_first_token_ms / 1000, args.llm_chunk_ms / 1000, args.server_logs),
+        daemon=True,
+    )
+    server.start()
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base_url}/health", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > deadline or not server.is_alive():
+                    raise SystemExit("Server did not start")
+                time.sleep(0.2)
+        asyncio.run(run(args, server.pid, base_url))
+    finally:
+        server.terminate()
+        server.join(5)
+
+
+if __name__ == "__main__":
+    main()
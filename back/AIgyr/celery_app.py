@@ -1,6 +1,7 @@
 import os 
 import time
 from celery import Celery
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,9 +10,21 @@ app = Celery(
     "tasks",
     broker=os.getenv("CELERY_BROKER_URL"),
     backend=os.getenv("CELERY_RESULT_BACKEND"),
+    include=["src.aiengine.tasks", "src.auth.tasks"],
 )
 
+app.conf.beat_schedule = {
+    "harvest-rental-shops": {
+        "task": "harvest_rental_shops",
+        "schedule": crontab(minute=15),  # Hourly
+    },
+    "prefetch-trail-weather": {
+        "task": "prefetch_trail_weather",
+        "schedule": crontab(minute="*/5"),
+    },
+}
+
 @app.task(name = "create_task")
 def create_task(a, b, c):
     time.sleep(a)
-    return b + c
\ No newline at end of file
+    return b + c
@@ -0,0 +1,403 @@
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Optional, Set, Union
+
+import redis
+import redis.asyncio
+from fastapi import WebSocket, status
+
+from src.cache import (
+    CACHE_REDIS_DB,
+    CACHE_REDIS_HOST,
+    CACHE_REDIS_PASSWORD,
+    CACHE_REDIS_PORT,
+    get_async_redis,
+    get_redis,
+)
+
+# Chat sockets are spread over several uvicorn workers. Each worker indexes its
+# own sockets by connection and user id, and workers exchange messages for
+# users through Redis pub/sub: a worker subscribes to a user's channel while it
+# holds one of their sockets, so a message published for a user reaches them
+# wherever they are connected.
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 64))  # Frames buffered per socket
+SEND_TIMEOUT_SECONDS = 10.0  # A socket that can't take a frame this long is dropped
+USER_CHANNEL_PREFIX = "ws:user:"
+BROADCAST_CHANNEL = "ws:broadcast"
+PUBSUB_RECONNECT_SECONDS = 1.0
+PUBSUB_RECONNECT_MAX_SECONDS = 30.0
+PUBSUB_HEALTH_CHECK_SECONDS = 30
+# Bounds under mobile traffic. Dead TCP connections are found by uvicorn's
+# protocol-level pings (--ws-ping-interval/--ws-ping-timeout); sockets that
+# stay open but silent are evicted after the idle timeout.
+MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 3))
+MAX_CONNECTIONS_PER_WORKER = int(os.getenv("WS_MAX_CONNECTIONS_PER_WORKER", 2000))
+IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", 600))
+REAP_INTERVAL_SECONDS = 30
+# Per-worker stats are written to Redis on every reap so any worker can report cluster totals
+STATS_KEY_PREFIX = "ws:stats:"
+STATS_TTL_SECONDS = 3 * REAP_INTERVAL_SECONDS
+
+Message = Union[str, bytes]
+
+
+def _user_channel(user_id: str) -> str:
+    return f"{USER_CHANNEL_PREFIX}{user_id}"
+
+
+def _encode_envelope(origin: str, message: Message) -> str:
+    if isinstance(message, bytes):
+        return json.dumps({"origin": origin, "bytes": base64.b64encode(message).decode("ascii")})
+    return json.dumps({"origin": origin, "text": message})
+
+
+def _decode_envelope(raw) -> tuple:
+    envelope = json.loads(raw)
+    if "bytes" in envelope:
+        return envelope["origin"], base64.b64decode(envelope["bytes"])
+    return envelope["origin"], envelope["text"]
+
+
+def publish_to_user(user_id: str, message: Message) -> bool:
+    """Deliver a frame to a user's sockets on every worker, from sync code (e.g. Celery tasks)."""
+    try:
+        get_redis().publish(_user_channel(user_id), _encode_envelope("external", message))
+        return True
+    except redis.RedisError as e:
+        print(f"⚠️ Could not publish websocket message for user {user_id}: {e}")
+        return False
+
+
+class Connection:
+    """An accepted socket with a bounded outbox drained by its own sender task.
+
+    Sends never touch the socket directly, so a slow client only fills its own
+    queue instead of stalling whoever is sending to it.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Message]" = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.closed = False
+        self.close_reason: Optional[str] = None  # Set when the server closes the socket
+        self.opened_at = time.monotonic()
+        self.last_activity = self.opened_at
+        self._sender: Optional[asyncio.Task] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._sender = asyncio.create_task(self._run_sender())
+
+    def touch(self) -> None:
+        """Record a frame from the client; idle eviction counts from the last one."""
+        self.last_activity = time.monotonic()
+
+    async def send(self, message: Message) -> None:
+        """Queue a reply, waiting for room: backpressure for the socket's own request handling."""
+        if not self.closed:
+            await self.queue.put(message)
+
+    def offer(self, message: Message) -> bool:
+        """Queue a pushed frame without waiting. Returns False if the socket can't keep up."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _run_sender(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                if isinstance(message, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(message), SEND_TIMEOUT_SECONDS)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(message), SEND_TIMEOUT_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Send failed on connection {self.id} of user {self.user_id}: {e}")
+                self.abort(status.WS_1011_INTERNAL_ERROR, "send_error")
+                return
+
+    def abort(self, code: int, reason: str) -> None:
+        """Stop sending and close the socket; the receive loop then sees the disconnect."""
+        if self.closed:
+            return
+        self.close_reason = reason
+        self.stop()
+        self._closer = asyncio.create_task(self.close_socket(code))
+
+    async def close_socket(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already closed by the client
+
+    def stop(self) -> None:
+        self.closed = True
+        if self._sender is not None and self._sender is not asyncio.current_task():
+            self._sender.cancel()
+        # Release replies still waiting for room; nothing will send them now
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class ConnectionManager:
+    """Per-worker registry of chat sockets with cross-worker delivery through Redis."""
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.connections: Dict[str, Connection] = {}
+        self.user_connections: Dict[str, Set[str]] = {}
+        self._pubsub_redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._reaper: Optional[asyncio.Task] = None
+        # opened, rejected_<reason> and closed_<reason> totals since the worker started
+        self.counters: Counter = Counter()
+
+    async def reject(self, websocket: WebSocket, code: int, reason: str) -> None:
+        """Refuse a handshake (before accepting it) and count why."""
+        self.counters[f"rejected_{reason}"] += 1
+        await websocket.close(code=code)
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        subprotocol: Optional[str] = None
+    ) -> Optional[Connection]:
+        """Accept and register a socket. Returns None if the worker is at capacity.
+
+        A user over their cap loses their oldest socket, typically one a phone
+        left behind when it switched networks.
+        """
+        if len(self.connections) >= MAX_CONNECTIONS_PER_WORKER:
+            await self.reject(websocket, status.WS_1013_TRY_AGAIN_LATER, "capacity")
+            return None
+
+        await websocket.accept(subprotocol=subprotocol)
+        connection = Connection(websocket, user_id)
+        connection.start()
+        self.connections[connection.id] = connection
+        self.counters["opened"] += 1
+        user_ids = self.user_connections.setdefault(user_id, set())
+        user_ids.add(connection.id)
+        self._ensure_background_tasks()
+        if len(user_ids) == 1:
+            await self._subscribe(_user_channel(user_id))
+        elif len(user_ids) > MAX_CONNECTIONS_PER_USER:
+            oldest = min((self.connections[connection_id] for connection_id in user_ids), key=lambda c: c.opened_at)
+            oldest.abort(status.WS_1008_POLICY_VIOLATION, "user_cap")
+        return connection
+
+    async def disconnect(self, connection: Connection) -> None:
+        if self.connections.pop(connection.id, None) is None:
+            return
+        connection.stop()
+        self.counters[f"closed_{connection.close_reason or 'client'}"] += 1
+        user_ids = self.user_connections.get(connection.user_id, set())
+        user_ids.discard(connection.id)
+        if not user_ids:
+            self.user_connections.pop(connection.user_id, None)
+            await self._unsubscribe(_user_channel(connection.user_id))
+
+    def user_connection_count(self, user_id: str) -> int:
+        return len(self.user_connections.get(user_id, ()))
+
+    async def send_to_user(self, user_id: str, message: Message) -> int:
+        """Send a frame to all of a user's sockets, on this worker and the others.
+
+        Returns the number of local sockets it was queued on.
+        """
+        delivered = self._deliver_local(user_id, message)
+        await self._publish(_user_channel(user_id), message)
+        return delivered
+
+    async def broadcast(self, message: Message) -> int:
+        """Send a frame to every socket on every worker. Returns the local delivery count."""
+        delivered = self._deliver_all_local(message)
+        await self._publish(BROADCAST_CHANNEL, message)
+        return delivered
+
+    def _deliver_local(self, user_id: str, message: Message) -> int:
+        delivered = 0
+        for connection_id in list(self.user_connections.get(user_id, ())):
+            delivered += self._offer(self.connections[connection_id], message)
+        return delivered
+
+    def _deliver_all_local(self, message: Message) -> int:
+        # Enqueueing never blocks, so one slow socket can't hold up the rest
+        return sum(self._offer(connection, message) for connection in list(self.connections.values()))
+
+    def _offer(self, connection: Connection, message: Message) -> bool:
+        if connection.offer(message):
+            return True
+        if not connection.closed:
+            print(f"🐢 Send queue full for connection {connection.id} of user {connection.user_id}, closing it")
+            connection.abort(status.WS_1013_TRY_AGAIN_LATER, "slow")
+        return False
+
+    # --- Redis fan-out ---
+
+    async def _publish(self, channel: str, message: Message) -> None:
+        try:
+            await get_async_redis().publish(channel, _encode_envelope(self.worker_id, message))
+        except redis.RedisError as e:
+            print(f"⚠️ Websocket fan-out to {channel} failed, delivered locally only: {e}")
+
+    def _get_pubsub_redis(self):
+        # Separate client: subscriptions block on reads, which the cache client's short timeout forbids
+        if self._pubsub_redis is None:
+            self._pubsub_redis = redis.asyncio.Redis(
+                host=CACHE_REDIS_HOST,
+                port=CACHE_REDIS_PORT,
+                db=CACHE_REDIS_DB,
+                password=CACHE_REDIS_PASSWORD,
+                health_check_interval=PUBSUB_HEALTH_CHECK_SECONDS,
+            )
+        return self._pubsub_redis
+
+    def _ensure_background_tasks(self) -> None:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def _subscribe(self, channel: str) -> None:
+        if self._pubsub is None:
+            return  # The listener subscribes every local user when it (re)connects
+        try:
+            await self._pubsub.subscribe(channel)
+        except redis.RedisError as e:
+            print(f"⚠️ Could not subscribe to {channel}: {e}")
+
+    async def _unsubscribe(self, channel: str) -> None:
+        if self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe(channel)
+        except redis.RedisError as e:
+            print(f"⚠️ Could not unsubscribe from {channel}: {e}")
+
+    async def _listen(self) -> None:
+        delay = PUBSUB_RECONNECT_SECONDS
+        while True:
+            pubsub = self._get_pubsub_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(BROADCAST_CHANNEL, *[_user_channel(user_id) for user_id in self.user_connections])
+                self._pubsub = pubsub
+                delay = PUBSUB_RECONNECT_SECONDS
+                async for item in pubsub.listen():
+                    self._handle_published(item)
+            except asyncio.CancelledError:
+                raise
+            except redis.RedisError as e:
+                print(f"⚠️ Websocket fan-out listener lost Redis, retrying in {delay:.0f}s: {e}")
+            finally:
+                self._pubsub = None
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, PUBSUB_RECONNECT_MAX_SECONDS)
+
+    def _handle_published(self, item: dict) -> None:
+        if item.get("type") != "message":
+            return
+        try:
+            origin, message = _decode_envelope(item["data"])
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring malformed websocket fan-out message: {e}")
+            return
+        if origin == self.worker_id:
+            return  # Already delivered locally by the sender
+        channel = item["channel"].decode() if isinstance(item["channel"], bytes) else item["channel"]
+        if channel == BROADCAST_CHANNEL:
+            self._deliver_all_local(message)
+        elif channel.startswith(USER_CHANNEL_PREFIX):
+            self._deliver_local(channel[len(USER_CHANNEL_PREFIX):], message)
+
+    # --- Idle eviction and stats ---
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - IDLE_TIMEOUT_SECONDS
+        idle = [
+            connection for connection in self.connections.values()
+            if not connection.closed and connection.last_activity < cutoff
+        ]
+        for connection in idle:
+            connection.abort(status.WS_1001_GOING_AWAY, "idle")
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open": len(self.connections),
+            "users": len(self.user_connections),
+            **self.counters,
+        }
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(REAP_INTERVAL_SECONDS)
+            evicted = self.evict_idle()
+            if evicted:
+                print(f"🧹 Evicted {evicted} idle websocket(s)")
+            try:
+                await get_async_redis().set(
+                    f"{STATS_KEY_PREFIX}{self.worker_id}", json.dumps(self.stats()), ex=STATS_TTL_SECONDS
+                )
+            except redis.RedisError as e:
+                print(f"⚠️ Could not publish websocket stats: {e}")
+
+    async def cluster_stats(self) -> Dict[str, Any]:
+        """Sum the stats every live worker last reported; this worker's are always current."""
+        workers = {self.worker_id: self.stats()}
+        try:
+            client = get_async_redis()
+            keys = [key async for key in client.scan_iter(match=f"{STATS_KEY_PREFIX}*", count=100)]
+            for key, raw in zip(keys, await client.mget(keys) if keys else []):
+                worker_id = key[len(STATS_KEY_PREFIX):]
+                if raw is not None and worker_id != self.worker_id:
+                    workers[worker_id] = json.loads(raw)
+        except redis.RedisError as e:
+            print(f"⚠️ Could not read websocket stats of other workers: {e}")
+        totals: Counter = Counter()
+        for worker_stats in workers.values():
+            totals.update(worker_stats)
+        return {"workers": len(workers), **totals}
+
+    async def close(self) -> None:
+        """Close every socket and stop the background tasks (worker shutdown)."""
+        for task in (self._listener, self._reaper):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._listener = self._reaper = None
+        connections = list(self.connections.values())
+        for connection in connections:
+            connection.stop()
+        await asyncio.gather(*(connection.close_socket(status.WS_1001_GOING_AWAY) for connection in connections))
+        self.connections.clear()
+        self.user_connections.clear()
+        if self._pubsub_redis is not None:
+            await self._pubsub_redis.aclose()
+            self._pubsub_redis = None
+
+
+manager = ConnectionManager()
@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.cache import TTLCache
+from src import geo
+from src.posts.utils import trail_cache_key
+
+# Speed multipliers on top of Tobler's hiking function, keyed by User.fitness_level
+FITNESS_SPEED_FACTORS = {
+    "Beginner": 0.85,
+    "Intermediate": 1.0,
+    "Advanced": 1.15,
+}
+
+# Rest time as a fraction of moving time, keyed by User.fitness_level
+FITNESS_REST_FACTORS = {
+    "Beginner": 0.17,  # ~10 min per hour
+    "Intermediate": 0.12,
+    "Advanced": 0.08,
+}
+
+DEFAULT_FITNESS_LEVEL = "Intermediate"
+MIN_SPEED_KMH = 0.5  # Floor so very steep segments don't produce absurd times
+SPLIT_INTERVAL_KM = 1.0
+
+# Estimates only depend on the trail geometry and the fitness level
+_estimate_cache = TTLCache(maxsize=2048, ttl_seconds=24 * 3600)
+
+
+def tobler_speed_kmh(grade: np.ndarray) -> np.ndarray:
+    """Tobler's hiking function: walking speed in km/h for a slope dh/dx."""
+    return 6.0 * np.exp(-3.5 * np.abs(grade + 0.05))
+
+
+def estimate_duration(
+    coordinates: List,
+    distance_meters: Optional[float] = None,
+    elevation_gain_meters: Optional[float] = None,
+    fitness_level: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Estimate hiking time segment by segment with Tobler's hiking function.
+
+    Per-point elevation (a third coordinate value) gives real per-segment
+    grades, including descents. Without it, the total elevation gain is spread
+    as a uniform grade over the trail. Segment lengths are rescaled to the
+    reported distance when one is given.
+
+    Returns:
+        dict | None: {
+            "moving_hours": float,
+            "rest_hours": float,
+            "total_hours": float,
+            "distance_km": float,
+            "ascent_m": float,
+            "descent_m": float,
+            "fitness_level": str,
+            "splits": [{"km": float, "elapsed_hours": float}, ...]  # cumulative moving+rest time
+        } or None if the track cannot be parsed.
+    """
+    lat, lon, elevation = geo.track_arrays(coordinates)
+    if lat is None:
+        return None
+
+    lengths = geo.segment_lengths_m(lat, lon)
+    track_length = float(lengths.sum())
+    if track_length <= 0:
+        return None
+    if distance_meters:
+        lengths = lengths * (distance_meters / track_length)
+    total_length = float(lengths.sum())
+
+    if elevation is not None:
+        rises = np.diff(elevation)
+    else:
+        uniform_grade = (elevation_gain_meters or 0) / total_length
+        rises = lengths * uniform_grade
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grades = np.where(lengths > 0, rises / lengths, 0.0)
+    grades = np.clip(grades, -1.0, 1.0)
+
+    level = fitness_level if fitness_level in FITNESS_SPEED_FACTORS else DEFAULT_FITNESS_LEVEL
+    speeds_kmh = np.maximum(tobler_speed_kmh(grades) * FITNESS_SPEED_FACTORS[level], MIN_SPEED_KMH)
+    segment_hours = (lengths / 1000.0) / speeds_kmh
+
+    rest_factor = 1.0 + FITNESS_REST_FACTORS[level]
+    cumulative_km = np.concatenate(([0.0], np.cumsum(lengths) / 1000.0))
+    cumulative_hours = np.concatenate(([0.0], np.cumsum(segment_hours))) * rest_factor
+
+    split_marks = np.arange(SPLIT_INTERVAL_KM, cumulative_km[-1], SPLIT_INTERVAL_KM)
+    split_hours = np.interp(split_marks, cumulative_km, cumulative_hours)
+
+    moving_hours = float(segment_hours.sum())
+    return {
+        "moving_hours": moving_hours,
+        "rest_hours": moving_hours * (rest_factor - 1.0),
+        "total_hours": float(cumulative_hours[-1]),
+        "distance_km": float(cumulative_km[-1]),
+        "ascent_m": float(rises[rises > 0].sum()),
+        "descent_m": float(-rises[rises < 0].sum()),
+        "fitness_level": level,
+        "splits": [
+            {"km": float(km), "elapsed_hours": float(hours)}
+            for km, hours in zip(split_marks, split_hours)
+        ],
+    }
+
+
+def estimate_trail_duration(trail, fitness_level: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Cached `estimate_duration` for a stored trail, keyed by (trail fingerprint, fitness level)."""
+    key = trail_cache_key(trail, "duration", fitness_level or DEFAULT_FITNESS_LEVEL)
+    cached = _estimate_cache.get(key)
+    if cached is not None:
+        return cached
+
+    estimate = estimate_duration(
+        trail.coordinates or [],
+        trail.distance_meters,
+        trail.elevation_gain_meters,
+        fitness_level
+    )
+    if estimate is not None:
+        _estimate_cache.set(key, estimate)
+    return estimate
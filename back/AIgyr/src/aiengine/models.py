@@ -0,0 +1,38 @@
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, Index, false, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.database import Base
+
+class RentalShop(Base):
+    """Gear rental shop harvested from Google Places (see src/aiengine/rental_service.py)."""
+    __tablename__ = "rental_shops"
+
+    place_id = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    geohash = Column(String(12, collation="C"), nullable=False, index=True)
+    rating = Column(Float, nullable=True)
+    user_ratings_total = Column(Integer, nullable=True)
+    vicinity = Column(String, nullable=True)
+    business_status = Column(String, nullable=True)
+    price_level = Column(Integer, nullable=True)
+    types = Column(ARRAY(String), nullable=True)
+    # Region whose harvest last returned this shop; shops it stops returning are dropped
+    region = Column(String(12, collation="C"), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_rental_shops_region_last_seen_at", "region", "last_seen_at"),
+    )
+
+class RentalRegion(Base):
+    """Geohash region the rental shop harvester covers."""
+    __tablename__ = "rental_regions"
+
+    cell = Column(String(12, collation="C"), primary_key=True)
+    harvested_at = Column(DateTime(timezone=True), nullable=True, index=True)  # NULL until first harvest
+    # Last time a recent trail or a live lookup needed this region; idle regions stop being refreshed
+    requested_at = Column(DateTime(timezone=True), server_default=func.now())
+    shop_count = Column(Integer, default=0)
+    # Google had more results than it pages through; lookups here keep going live
+    truncated = Column(Boolean, nullable=False, default=False, server_default=false())
@@ -0,0 +1,437 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from src import geo, http_client
+from src.cache import (
+    TTLCache,
+    cache_get_json_async,
+    cache_get_many_json_async,
+    cache_set_json_async,
+    cache_try_lock_async,
+)
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+NEARBY_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+PLACE_DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
+
+REQUEST_TIMEOUT_SECONDS = 10
+PLACES_DEADLINE_SECONDS = float(os.getenv("PLACES_DEADLINE_SECONDS", 12))
+PLACES_MAX_CONCURRENCY = int(os.getenv("PLACES_MAX_CONCURRENCY", 8))
+
+# Search terms for hiking/outdoor gear rental - more specific to avoid unrelated businesses
+RENTAL_SEARCH_QUERIES = [
+    "outdoor equipment rental hiking camping",
+    "sporting goods rental outdoor gear",
+    "adventure gear rental hiking",
+    "outdoor outfitters rental",
+    "camping hiking equipment rental",
+    "REI outdoor gear rental"  # Include known outdoor brands
+]
+
+# Geocoding cache: results barely change, so keep them for a long time
+GEOCODE_POSITIVE_TTL_SECONDS = 30 * 24 * 3600
+GEOCODE_NEGATIVE_TTL_SECONDS = 24 * 3600
+GEOCODE_LOCAL_TTL_SECONDS = 3600
+REVERSE_GEOCODE_PRECISION = 7  # ~150m geohash buckets for reverse lookups
+# Statuses that describe the query itself and are safe to cache; anything else
+# (REQUEST_DENIED, OVER_QUERY_LIMIT, UNKNOWN_ERROR) is retried next time
+GEOCODE_CACHEABLE_STATUSES = {"OK", "ZERO_RESULTS"}
+
+# Rental candidate cache, keyed by (geohash cell, radius bucket)
+RENTAL_CELL_PRECISION = 5  # ~5km cells; searches are centred on the cell
+RENTAL_RADIUS_BUCKETS = [5000, 10000, 25000, 50000]  # Places nearbysearch caps radius at 50km
+RENTAL_FRESH_SECONDS = 6 * 3600
+RENTAL_STALE_SECONDS = 7 * 24 * 3600
+RENTAL_REFRESH_LOCK_SECONDS = 60
+RENTAL_CANDIDATE_LIMIT = 10
+# Nearby Search returns 20 results a page and at most 3 pages; a next_page_token
+# only becomes valid a couple of seconds after it is issued
+NEARBY_SEARCH_MAX_PAGES = 3
+NEXT_PAGE_DELAY_SECONDS = 2
+
+# Place details (website/phone), fetched on demand and cached per place_id
+PLACE_DETAILS_FIELDS = "website,formatted_phone_number"
+PLACE_DETAILS_TTL_SECONDS = 7 * 24 * 3600
+PLACE_DETAILS_NEGATIVE_TTL_SECONDS = 24 * 3600
+PLACE_DETAILS_NOT_FOUND_STATUSES = {"NOT_FOUND", "ZERO_RESULTS"}
+
+# Filters for businesses that are clearly not outdoor gear related
+OUTDOOR_KEYWORDS = [
+    "outdoor", "hiking", "camping", "adventure", "mountain", "trek",
+    "climbing", "backpack", "gear", "equipment", "outfitter", "sporting goods",
+    "rei", "patagonia", "north face", "sports", "expedition", "alpine", "trail"
+]
+EXCLUDE_KEYWORDS = [
+    "car", "auto", "vehicle", "truck", "motorcycle", "scooter", "bike rental",
+    "apartment", "house", "property", "real estate", "gravity", "finance"
+]
+EXCLUDE_TYPES = {"car_rental", "gas_station", "real_estate_agency"}
+# Nearby-search fields the gear rental response uses; everything else is dropped before caching
+CANDIDATE_FIELDS = (
+    "place_id", "name", "rating", "user_ratings_total", "vicinity",
+    "business_status", "price_level", "geometry", "opening_hours", "types"
+)
+
+http_client.set_host_concurrency(urlsplit(GEOCODE_URL).hostname, PLACES_MAX_CONCURRENCY)
+
+_geocode_local_cache = TTLCache(maxsize=2048, ttl_seconds=GEOCODE_LOCAL_TTL_SECONDS)
+_refreshing: Dict[str, asyncio.Task] = {}
+_warming_details: Dict[str, asyncio.Task] = {}
+
+
+def get_places_api_key() -> Optional[str]:
+    return os.getenv("GOOGLE_PLACES_API_KEY")
+
+
+async def _get_json(url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """GET a Google Maps endpoint through the shared pool. Raises httpx errors / ValueError."""
+    response = await http_client.arequest("GET", url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+    return response.json()
+
+
+async def _gather_until(coros: List, deadline: float) -> List[Any]:
+    """Run coroutines concurrently and return the results finished before `deadline`.
+
+    Unfinished calls are cancelled; failed calls are returned as their exception.
+    """
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    if not tasks:
+        return []
+    timeout = max(deadline - time.monotonic(), 0)
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        print(f"⏱️ Google Places deadline hit, {len(pending)}/{len(tasks)} call(s) cancelled")
+    return [task.result() if not task.exception() else task.exception() for task in tasks if task in done]
+
+
+def normalize_location_query(address: str) -> str:
+    """Normalise a free-form location so "Seattle, WA" and " seattle  wa" share a cache entry."""
+    text = unicodedata.normalize("NFKC", address).casefold()
+    text = re.sub(r"[^\w]+", " ", text)
+    return " ".join(text.split())
+
+
+async def _cached_lookup(key: str) -> Optional[Dict[str, Any]]:
+    cached = _geocode_local_cache.get(key)
+    if cached is not None:
+        return cached
+    cached = await cache_get_json_async(key)
+    if cached is not None:
+        _geocode_local_cache.set(key, cached)
+    return cached
+
+
+async def _store_lookup(key: str, value: Dict[str, Any], positive: bool) -> None:
+    ttl = GEOCODE_POSITIVE_TTL_SECONDS if positive else GEOCODE_NEGATIVE_TTL_SECONDS
+    _geocode_local_cache.set(key, value, ttl_seconds=min(ttl, GEOCODE_LOCAL_TTL_SECONDS))
+    await cache_set_json_async(key, value, ttl)
+
+
+async def geocode_address(address: str) -> Dict[str, Any]:
+    """Geocode a free-form location string. Returns the raw Geocoding API payload.
+
+    Results (including ZERO_RESULTS) are cached by normalised query string.
+    """
+    normalized = normalize_location_query(address)
+    key = f"geocode:addr:{hashlib.sha1(normalized.encode()).hexdigest()}"
+    cached = await _cached_lookup(key)
+    if cached is not None:
+        return cached
+
+    data = await _get_json(GEOCODE_URL, {"address": address, "key": get_places_api_key()})
+    status = data.get("status")
+    if status in GEOCODE_CACHEABLE_STATUSES:
+        # Only keep the first result, which is all callers use
+        entry = {"status": status, "results": data.get("results", [])[:1]}
+        await _store_lookup(key, entry, positive=status == "OK")
+    return data
+
+
+async def reverse_geocode(lat: float, lng: float) -> Optional[str]:
+    """Return a formatted address for coordinates, or None if the lookup fails.
+
+    Lookups are bucketed by geohash cell, so nearby coordinates share an entry.
+    """
+    key = f"geocode:rev:{geo.encode(lat, lng, REVERSE_GEOCODE_PRECISION)}"
+    cached = await _cached_lookup(key)
+    if cached is not None:
+        return cached.get("address")
+
+    try:
+        data = await _get_json(GEOCODE_URL, {"latlng": f"{lat},{lng}", "key": get_places_api_key()})
+    except (httpx.HTTPError, ValueError):
+        return None
+    status = data.get("status")
+    address = None
+    if status == "OK" and data.get("results"):
+        address = data["results"][0].get("formatted_address")
+    if status in GEOCODE_CACHEABLE_STATUSES:
+        await _store_lookup(key, {"address": address}, positive=address is not None)
+    return address
+
+
+async def _nearby_search(
+    lat: float,
+    lng: float,
+    radius: int,
+    keyword: str,
+    max_pages: int = 1
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Returns (results, whether Google had more pages than `max_pages`)."""
+    params = {
+        "location": f"{lat},{lng}",
+        "radius": radius,
+        "keyword": keyword,
+        "type": "store",
+        "key": get_places_api_key()
+    }
+    results = []
+    for page in range(max_pages):
+        data = await _get_json(NEARBY_SEARCH_URL, params)
+        if page and data.get("status") == "INVALID_REQUEST":
+            # Token not active yet; give it one more delay
+            await asyncio.sleep(NEXT_PAGE_DELAY_SECONDS)
+            data = await _get_json(NEARBY_SEARCH_URL, params)
+        if data.get("status") != "OK":
+            break
+        results.extend(data.get("results", []))
+        token = data.get("next_page_token")
+        if not token:
+            return results, False
+        params = {"pagetoken": token, "key": get_places_api_key()}
+        if page + 1 < max_pages:
+            await asyncio.sleep(NEXT_PAGE_DELAY_SECONDS)
+    else:
+        return results, True
+    return results, False
+
+
+async def search_rental_places_with_status(
+    lat: float,
+    lng: float,
+    radius: int,
+    deadline: float,
+    max_pages: int = 1
+) -> Tuple[List[Dict[str, Any]], bool, bool]:
+    """Run every keyword search concurrently.
+
+    Returns (raw results, whether every call succeeded, whether any search
+    had more results than `max_pages` pages).
+    """
+    results = await _gather_until(
+        [_nearby_search(lat, lng, radius, query, max_pages) for query in RENTAL_SEARCH_QUERIES],
+        deadline
+    )
+    places, truncated = [], False
+    for result in results:
+        if isinstance(result, Exception):
+            continue
+        places.extend(result[0])
+        truncated = truncated or result[1]
+    complete = len(results) == len(RENTAL_SEARCH_QUERIES) and not any(isinstance(r, Exception) for r in results)
+    return places, complete, truncated
+
+
+async def search_rental_places(
+    lat: float,
+    lng: float,
+    radius: int,
+    deadline: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Run every rental keyword search concurrently and return the combined raw results."""
+    places, _, _ = await search_rental_places_with_status(lat, lng, radius, deadline or time.monotonic() + PLACES_DEADLINE_SECONDS)
+    return places
+
+
+def filter_rental_places(places: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop businesses that are clearly not outdoor gear shops and de-duplicate by place_id."""
+    unique_places = {}
+    for place in places:
+        name = place.get("name", "").lower()
+        types = place.get("types", [])
+        place_id = place.get("place_id")
+        if not place_id or place_id in unique_places:
+            continue
+
+        # Skip if it contains excluded keywords or is clearly not outdoor-related
+        if any(keyword in name for keyword in EXCLUDE_KEYWORDS):
+            continue
+        if EXCLUDE_TYPES.intersection(types):
+            continue
+
+        # Only include if it has outdoor-related keywords OR is a sporting goods store
+        has_outdoor_keywords = any(keyword in name for keyword in OUTDOOR_KEYWORDS)
+        is_sporting_goods = "sporting_goods_store" in types
+        is_general_store = "store" in types or "establishment" in types
+        if has_outdoor_keywords or is_sporting_goods or (is_general_store and "rental" in name):
+            unique_places[place_id] = place
+    return list(unique_places.values())
+
+
+def rank_rental_places(places: List[Dict[str, Any]], limit: int = RENTAL_CANDIDATE_LIMIT) -> List[Dict[str, Any]]:
+    """Order candidates by number of reviews and keep only the fields the response needs."""
+    ranked = sorted(places, key=lambda x: x.get("user_ratings_total", 0), reverse=True)[:limit]
+    return [{field: place[field] for field in CANDIDATE_FIELDS if field in place} for place in ranked]
+
+
+def radius_bucket(radius: int) -> int:
+    """Round a search radius up to the nearest cached bucket."""
+    for bucket in RENTAL_RADIUS_BUCKETS:
+        if radius <= bucket:
+            return bucket
+    return RENTAL_RADIUS_BUCKETS[-1]
+
+
+def _rental_cache_key(cell: str, bucket: int) -> str:
+    return f"places:rental:{cell}:{bucket}"
+
+
+async def _refresh_rental_candidates(cell: str, bucket: int, deadline: float) -> Optional[List[Dict[str, Any]]]:
+    """Search around the cell centre, store the ranked candidates and return them.
+
+    Results from a search that hit the deadline or errored are returned but not cached.
+    """
+    lat, lng = geo.decode(cell)
+    places, complete, _ = await search_rental_places_with_status(lat, lng, bucket, deadline)
+    candidates = rank_rental_places(filter_rental_places(places))
+    if complete:
+        await cache_set_json_async(
+            _rental_cache_key(cell, bucket),
+            {"fetched_at": time.time(), "places": candidates},
+            RENTAL_STALE_SECONDS
+        )
+    return candidates
+
+
+async def _background_refresh(cell: str, bucket: int) -> None:
+    key = _rental_cache_key(cell, bucket)
+    try:
+        # One refresher per key across all workers
+        if await cache_try_lock_async(f"{key}:lock", RENTAL_REFRESH_LOCK_SECONDS):
+            await _refresh_rental_candidates(cell, bucket, time.monotonic() + PLACES_DEADLINE_SECONDS)
+    except Exception as e:
+        print(f"⚠️ Background refresh failed for {key}: {e}")
+    finally:
+        _refreshing.pop(key, None)
+
+
+async def find_rental_candidates(
+    lat: float,
+    lng: float,
+    radius: int,
+    deadline: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Return filtered, ranked gear rental candidates near a point.
+
+    Searches are shared per (geohash cell, radius bucket). Fresh entries are
+    returned as is; stale ones are returned immediately while a background
+    task refreshes them; misses search Google inline.
+    """
+    cell = geo.encode(lat, lng, RENTAL_CELL_PRECISION)
+    bucket = radius_bucket(radius)
+    key = _rental_cache_key(cell, bucket)
+
+    cached = await cache_get_json_async(key)
+    if cached is not None:
+        age = time.time() - cached.get("fetched_at", 0)
+        if age > RENTAL_FRESH_SECONDS and key not in _refreshing:
+            _refreshing[key] = asyncio.create_task(_background_refresh(cell, bucket))
+        return cached.get("places", [])
+
+    return await _refresh_rental_candidates(cell, bucket, deadline or time.monotonic() + PLACES_DEADLINE_SECONDS)
+
+
+def _place_details_key(place_id: str) -> str:
+    return f"places:details:{place_id}"
+
+
+async def _fetch_place_details(place_id: str) -> Optional[Dict[str, Any]]:
+    """Call Place Details and cache the outcome. Unknown places are cached as {}."""
+    try:
+        data = await _get_json(PLACE_DETAILS_URL, {
+            "place_id": place_id,
+            "fields": PLACE_DETAILS_FIELDS,
+            "key": get_places_api_key()
+        })
+    except (httpx.HTTPError, ValueError):
+        return None
+    status = data.get("status")
+    if status == "OK" and data.get("result") is not None:
+        await cache_set_json_async(_place_details_key(place_id), data["result"], PLACE_DETAILS_TTL_SECONDS)
+        return data["result"]
+    if status in PLACE_DETAILS_NOT_FOUND_STATUSES:
+        await cache_set_json_async(_place_details_key(place_id), {}, PLACE_DETAILS_NEGATIVE_TTL_SECONDS)
+    return None
+
+
+async def cached_places_details(place_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Return details already in the cache, without calling Google. Returns {place_id: details}."""
+    cached = await cache_get_many_json_async([_place_details_key(place_id) for place_id in place_ids])
+    return {place_id: details for place_id, details in zip(place_ids, cached) if details}
+
+
+async def fetch_places_details(
+    place_ids: List[str],
+    deadline: Optional[float] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Fetch website/phone for several places. Returns {place_id: details}.
+
+    Cached entries come from one Redis round trip; the rest are fetched
+    concurrently until `deadline`. Places without details are left out.
+    """
+    deadline = deadline or time.monotonic() + PLACES_DEADLINE_SECONDS
+    place_ids = list(dict.fromkeys(place_ids))
+    cached = await cache_get_many_json_async([_place_details_key(place_id) for place_id in place_ids])
+
+    details = {place_id: entry for place_id, entry in zip(place_ids, cached) if entry}
+    missing = [place_id for place_id, entry in zip(place_ids, cached) if entry is None]
+
+    async def _one(place_id: str):
+        return place_id, await _fetch_place_details(place_id)
+
+    results = await _gather_until([_one(place_id) for place_id in missing], deadline)
+    for result in results:
+        if isinstance(result, Exception):
+            continue
+        place_id, entry = result
+        if entry:
+            details[place_id] = entry
+    return details
+
+
+async def _warm_places_details(place_ids: List[str]) -> None:
+    try:
+        await fetch_places_details(place_ids)
+    except Exception as e:
+        print(f"⚠️ Warming place details failed for {place_ids}: {e}")
+    finally:
+        for place_id in place_ids:
+            _warming_details.pop(place_id, None)
+
+
+def warm_places_details(place_ids: List[str]) -> None:
+    """Fetch and cache details for places in the background, without waiting.
+
+    Used after an answer went out without them, so the next one has them.
+    """
+    missing = [place_id for place_id in dict.fromkeys(place_ids) if place_id not in _warming_details]
+    if not missing:
+        return
+    task = asyncio.create_task(_warm_places_details(missing))
+    for place_id in missing:
+        _warming_details[place_id] = task
+
+
+async def fetch_place_details(place_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch website and phone number for a place, or None if unavailable."""
+    return (await fetch_places_details([place_id])).get(place_id)
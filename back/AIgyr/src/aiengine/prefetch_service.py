@@ -0,0 +1,74 @@
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from src.auth.activity import recently_active_users
+from src.database import SessionLocal
+from src.posts.models import TrailData
+from .weather_service import (
+    WEATHER_SECTION_TTLS,
+    cached_weather_age,
+    refresh_weather_cell,
+    sample_trail_weather_points,
+    weather_cell,
+)
+
+ACTIVE_USER_WINDOW_SECONDS = 30 * 60
+MAX_ACTIVE_USERS = 2000
+# Refresh a little before "current" expires so the next question is a cache hit
+PREFETCH_REFRESH_AGE_SECONDS = WEATHER_SECTION_TTLS["current"] * 0.7
+WEATHER_PREFETCH_MAX_CALLS = int(os.getenv("WEATHER_PREFETCH_MAX_CALLS", 50))  # Per run
+WEATHER_PREFETCH_CONCURRENCY = 4
+
+
+def latest_trails_for_users(db: Session, user_ids: List[str]) -> List[TrailData]:
+    """Return each user's most recently uploaded trail (one query, DISTINCT ON user_id)."""
+    if not user_ids:
+        return []
+    return (
+        db.query(TrailData)
+        .filter(TrailData.user_id.in_(user_ids))
+        .distinct(TrailData.user_id)
+        .order_by(TrailData.user_id, TrailData.last_uploaded_at.desc().nullslast(), TrailData.id.desc())
+        .all()
+    )
+
+
+def cells_to_prefetch(trails: List[TrailData]) -> List[str]:
+    """Weather cells of the trails' sample points, shared cells first, skipping ones still fresh."""
+    demand = Counter()
+    for trail in trails:
+        cells = {weather_cell(lat, lon) for lat, lon in sample_trail_weather_points(trail.coordinates or [])}
+        demand.update(cells)
+
+    due = []
+    for cell, _ in demand.most_common():
+        age = cached_weather_age(cell)
+        if age is None or age > PREFETCH_REFRESH_AGE_SECONDS:
+            due.append(cell)
+    return due
+
+
+def prefetch_active_trail_weather(max_calls: int = WEATHER_PREFETCH_MAX_CALLS) -> Dict[str, int]:
+    """Refresh cached weather along the latest trails of recently active users."""
+    user_ids = recently_active_users(ACTIVE_USER_WINDOW_SECONDS, MAX_ACTIVE_USERS)
+    if not user_ids:
+        return {"users": 0, "cells": 0, "refreshed": 0}
+
+    db = SessionLocal()
+    try:
+        trails = latest_trails_for_users(db, user_ids)
+    finally:
+        db.close()
+
+    due = cells_to_prefetch(trails)
+    selected = due[:max_calls]
+    with ThreadPoolExecutor(max_workers=WEATHER_PREFETCH_CONCURRENCY) as pool:
+        refreshed = sum(pool.map(lambda cell: refresh_weather_cell(cell, PREFETCH_REFRESH_AGE_SECONDS), selected))
+
+    stats = {"users": len(user_ids), "cells": len(due), "refreshed": refreshed, "skipped": len(due) - len(selected)}
+    print(f"🌦️ Weather prefetch: {stats}")
+    return stats
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src import geo
+from src.database import SessionLocal
+from src.http_client import aclose_async_client
+from src.posts.models import TrailData
+from .models import RentalRegion, RentalShop
+from .places_service import (
+    RENTAL_CANDIDATE_LIMIT,
+    NEARBY_SEARCH_MAX_PAGES,
+    filter_rental_places,
+    search_rental_places_with_status,
+)
+
+RENTAL_REGION_PRECISION = 4  # ~39km x 20km regions
+HARVEST_RADIUS_M = 25000  # Covers a whole region from its centre
+REGION_REFRESH_DAYS = 7
+ACTIVE_REGION_DAYS = 90  # Regions nobody has needed for this long are no longer refreshed
+HARVEST_REGIONS_PER_RUN = int(os.getenv("HARVEST_REGIONS_PER_RUN", 10))  # 6-18 Places calls each
+HARVEST_DEADLINE_SECONDS = 30  # Room for the delays between result pages
+MAX_SHOP_QUERY_CELLS = 32
+
+# Ranking: Bayesian-averaged rating, minus a small penalty per km of distance
+RATING_PRIOR = 3.5
+RATING_PRIOR_WEIGHT = 20
+DISTANCE_PENALTY_PER_KM = 0.03
+
+
+def region_for(lat: float, lon: float) -> str:
+    return geo.encode(lat, lon, RENTAL_REGION_PRECISION)
+
+
+def is_region_covered(db: Session, cell: str) -> bool:
+    return db.query(RentalRegion.cell).filter(
+        RentalRegion.cell == cell,
+        RentalRegion.harvested_at.isnot(None),
+        RentalRegion.truncated.is_(False)
+    ).first() is not None
+
+
+def note_region_demand(db: Session, cells: List[str]) -> None:
+    """Mark regions as needed so the harvester covers (or keeps refreshing) them."""
+    if not cells:
+        return
+    stmt = insert(RentalRegion).values([{"cell": cell, "shop_count": 0} for cell in cells])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[RentalRegion.cell],
+        set_={"requested_at": func.now()}
+    ))
+    db.commit()
+
+
+def _shop_cell_filter(bbox: geo.BBox):
+    """Prefix range scans on rental_shops.geohash covering a bounding box."""
+    precision = 6
+    while precision > 1 and geo.count_cells_for_bbox(bbox, precision) > MAX_SHOP_QUERY_CELLS:
+        precision -= 1
+    # "~" sorts after every geohash character under the C collation
+    return or_(*[
+        and_(RentalShop.geohash >= cell, RentalShop.geohash < cell + "~")
+        for cell in sorted(geo.cells_for_bbox(bbox, precision))
+    ])
+
+
+def shop_score(shop: RentalShop, distance_m: float) -> float:
+    reviews = shop.user_ratings_total or 0
+    rating = ((shop.rating or 0) * reviews + RATING_PRIOR * RATING_PRIOR_WEIGHT) / (reviews + RATING_PRIOR_WEIGHT)
+    return rating - DISTANCE_PENALTY_PER_KM * distance_m / 1000.0
+
+
+def find_rental_shops_near(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_m: float,
+    limit: int = RENTAL_CANDIDATE_LIMIT
+) -> List[Tuple[RentalShop, float]]:
+    """Return (shop, distance_m) pairs within `radius_m`, best score first."""
+    bbox = geo.bbox_around(lat, lon, radius_m)
+    min_lat, min_lon, max_lat, max_lon = bbox
+    shops = (
+        db.query(RentalShop)
+        .filter(_shop_cell_filter(bbox))
+        .filter(RentalShop.lat.between(min_lat, max_lat), RentalShop.lon.between(min_lon, max_lon))
+        .all()
+    )
+    results = []
+    for shop in shops:
+        distance = geo.haversine_m(lat, lon, shop.lat, shop.lon)
+        if distance <= radius_m:
+            results.append((shop, distance))
+    results.sort(key=lambda item: shop_score(*item), reverse=True)
+    return results[:limit]
+
+
+def shop_to_candidate(shop: RentalShop, distance_m: Optional[float] = None) -> Dict[str, Any]:
+    """Render a stored shop in the nearbysearch result shape `gear_rental_tool` formats."""
+    candidate = {
+        "place_id": shop.place_id,
+        "name": shop.name,
+        "rating": shop.rating,
+        "user_ratings_total": shop.user_ratings_total or 0,
+        "vicinity": shop.vicinity,
+        "business_status": shop.business_status,
+        "price_level": shop.price_level,
+        "types": shop.types or [],
+        "geometry": {"location": {"lat": shop.lat, "lng": shop.lon}},
+    }
+    if distance_m is not None:
+        candidate["distance_m"] = distance_m
+    return {key: value for key, value in candidate.items() if value is not None}
+
+
+def local_rental_candidates(
+    lat: float,
+    lon: float,
+    radius_m: float,
+    limit: int = RENTAL_CANDIDATE_LIMIT
+) -> Optional[List[Dict[str, Any]]]:
+    """Answer a rental lookup from the harvested shop table.
+
+    Returns None when the point's region has not been harvested yet (the
+    region is queued for the next harvest run), when no harvested shop is in
+    range (the harvest searches from the region centre and can miss shops
+    near its edges), or the table is unavailable. Callers then search live.
+    """
+    cell = region_for(lat, lon)
+    db = SessionLocal()
+    try:
+        if not is_region_covered(db, cell):
+            note_region_demand(db, [cell])
+            return None
+        shops = find_rental_shops_near(db, lat, lon, radius_m, limit)
+        if not shops:
+            return None
+        return [shop_to_candidate(shop, distance) for shop, distance in shops]
+    except SQLAlchemyError as e:
+        print(f"⚠️ Local rental lookup failed, falling back to Google: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def regions_due_for_harvest(db: Session, limit: int = HARVEST_REGIONS_PER_RUN) -> List[str]:
+    """Return regions to harvest next: never-harvested first, then the stalest.
+
+    Regions of recently uploaded trails are registered as needed on the way.
+    """
+    now = datetime.now(timezone.utc)
+    trail_regions = [
+        row[0] for row in db.execute(
+            select(func.substr(TrailData.geohash, 1, RENTAL_REGION_PRECISION))
+            .where(TrailData.geohash.isnot(None))
+            .where(TrailData.last_uploaded_at >= now - timedelta(days=ACTIVE_REGION_DAYS))
+            .distinct()
+        )
+    ]
+    note_region_demand(db, trail_regions)
+
+    rows = (
+        db.query(RentalRegion.cell)
+        .filter(RentalRegion.requested_at >= now - timedelta(days=ACTIVE_REGION_DAYS))
+        .filter(or_(
+            RentalRegion.harvested_at.is_(None),
+            RentalRegion.harvested_at < now - timedelta(days=REGION_REFRESH_DAYS)
+        ))
+        .order_by(RentalRegion.harvested_at.asc().nullsfirst(), RentalRegion.requested_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return [row.cell for row in rows]
+
+
+def store_region_shops(
+    db: Session,
+    cell: str,
+    places: List[Dict[str, Any]],
+    harvested_at: datetime,
+    truncated: bool = False
+) -> int:
+    """Upsert a region's harvested shops and drop the ones it no longer returns.
+
+    A `truncated` region had more results than Google pages through; its shops
+    are kept but it doesn't count as covered, so lookups there stay live.
+    """
+    rows = []
+    for place in places:
+        location = place.get("geometry", {}).get("location", {})
+        if location.get("lat") is None or location.get("lng") is None:
+            continue
+        rows.append({
+            "place_id": place["place_id"],
+            "name": place.get("name", "Unknown"),
+            "lat": location["lat"],
+            "lon": location["lng"],
+            "geohash": geo.encode(location["lat"], location["lng"], 9),
+            "rating": place.get("rating"),
+            "user_ratings_total": place.get("user_ratings_total"),
+            "vicinity": place.get("vicinity"),
+            "business_status": place.get("business_status"),
+            "price_level": place.get("price_level"),
+            "types": place.get("types"),
+            "region": cell,
+            "last_seen_at": harvested_at,
+        })
+
+    if rows:
+        stmt = insert(RentalShop).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[RentalShop.place_id],
+            set_={column: stmt.excluded[column] for column in rows[0] if column != "place_id"}
+        ))
+    db.query(RentalShop).filter(
+        RentalShop.region == cell,
+        RentalShop.last_seen_at < harvested_at
+    ).delete(synchronize_session=False)
+    db.query(RentalRegion).filter(RentalRegion.cell == cell).update(
+        {"harvested_at": harvested_at, "shop_count": len(rows), "truncated": truncated},
+        synchronize_session=False
+    )
+    db.commit()
+    return len(rows)
+
+
+async def _search_regions(cells: List[str]) -> Dict[str, Tuple[List[Dict[str, Any]], bool]]:
+    """Search each region from its centre, following result pages.
+
+    Returns {region: (places, truncated)}. Regions whose search was
+    incomplete are left out and retried next run.
+    """
+    results = {}
+    try:
+        for cell in cells:
+            lat, lon = geo.decode(cell)
+            places, complete, truncated = await search_rental_places_with_status(
+                lat, lon, HARVEST_RADIUS_M, time.monotonic() + HARVEST_DEADLINE_SECONDS,
+                max_pages=NEARBY_SEARCH_MAX_PAGES
+            )
+            if complete:
+                results[cell] = (filter_rental_places(places), truncated)
+                if truncated:
+                    print(f"⚠️ Rental search for region {cell} hit Google's result limit, leaving it to live lookups")
+            else:
+                print(f"⚠️ Incomplete rental search for region {cell}, will retry next run")
+    finally:
+        await aclose_async_client()
+    return results
+
+
+def harvest_due_regions(limit: int = HARVEST_REGIONS_PER_RUN) -> Dict[str, int]:
+    """Harvest rental shops for the regions that are due. Returns {region: shop count}."""
+    db = SessionLocal()
+    try:
+        cells = regions_due_for_harvest(db, limit)
+        if not cells:
+            return {}
+        harvested = asyncio.run(_search_regions(cells))
+        harvested_at = datetime.now(timezone.utc)
+        counts = {
+            cell: store_region_shops(db, cell, places, harvested_at, truncated)
+            for cell, (places, truncated) in harvested.items()
+        }
+        print(f"🏪 Harvested rental shops for {len(counts)}/{len(cells)} region(s): {counts}")
+        return counts
+    finally:
+        db.close()
@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from sqlalchemy.orm import Session
 from .schemas import TrailDataInput, GearRecommendation, GearAndHikeResponse
 from .knowledge_base import retrieve_gear
+from .duration_service import estimate_trail_duration
+from .rental_service import local_rental_candidates
 import openai
 import os
 import json
-import requests
+import time
+import asyncio
+import inspect
+import httpx
 from datetime import datetime, timedelta
 from src.database import get_db
 from src.posts.models import TrailData
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from src.posts.service import get_latest_trail, load_latest_trail
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
 from src.auth.dependencies import get_current_user
 from src.auth.models import User
 from .weather_service import (
@@ -18,13 +24,32 @@ from .weather_service import (
     fetch_comprehensive_weather,
     fetch_weather_forecast,
     fetch_hourly_weather,
-    get_weather_alerts,
+    get_weather_alerts as fetch_weather_alerts,
     sample_coordinates,
-    sample_trail_endpoints
+    sample_trail_endpoints,
+    sample_trail_weather_points,
+    fetch_weather_for_points,
+    fetch_weather_batch,
+    summarize_weather_quality,
+    parse_weather_fields,
+    project_weather,
+    COMPACT_WEATHER_PROJECTION
+)
+from .places_service import (
+    PLACES_DEADLINE_SECONDS,
+    get_places_api_key,
+    geocode_address,
+    reverse_geocode,
+    find_rental_candidates,
+    fetch_places_details,
+    cached_places_details,
+    warm_places_details
 )
 
 router = APIRouter(prefix="/aiengine", tags=["AIEngine"])
 
+MAX_PLACE_DETAILS_PER_REQUEST = 10
+
 # Create OpenAI client instance
 openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
@@ -58,9 +83,7 @@ def gear_recommendation_tool(
     # Get user-specific trail data if user_id provided
     trail = None
     if user_id:
-        trail = db.query(TrailData).filter(
-            TrailData.user_id == user_id
-        ).order_by(TrailData.id.desc()).first()
+        trail = get_latest_trail(db, user_id)
     
     recommendations = []
     
@@ -261,10 +284,7 @@ def trail_analysis_tool(analyze_elevation: bool = False, analyze_difficulty: boo
     db = next(get_db())
     
     # Get user-specific trail data
-    query = db.query(TrailData)
-    if user_id:
-        query = query.filter(TrailData.user_id == user_id)
-    trail = query.order_by(TrailData.id.desc()).first()
+    trail = get_latest_trail(db, user_id)
     
     if not trail:
         return "No trail data available. Please upload a trail first."
@@ -312,9 +332,7 @@ def hiking_plan_tool(
 ) -> str:
     """Generate comprehensive hiking plan with timing, safety, and preparation recommendations"""
     db = next(get_db())
-    trail = db.query(TrailData).filter(
-        TrailData.user_id == user_id
-    ).order_by(TrailData.id.desc()).first()
+    trail = get_latest_trail(db, user_id) if user_id else None
     
     # Default to 6:00 AM if no start time specified
     if not start_time:
@@ -330,13 +348,17 @@ def hiking_plan_tool(
         distance_km = (trail.distance_meters or 0) / 1000
         elevation_m = trail.elevation_gain_meters or 0
         
-        # Calculate estimated duration using Naismith's rule + modifications
-        # Base time: 1 hour per 5km + 1 hour per 600m elevation gain
-        base_time_hours = (distance_km / 5) + (elevation_m / 600)
+        # Per-segment estimate (Tobler's hiking function) adjusted for the user's fitness
+        user = db.query(User).filter(User.id == user_id).first()
+        fitness_level = user.fitness_level if user else None
+        estimate = estimate_trail_duration(trail, fitness_level)
         
-        # Add time for breaks (10 minutes per hour of hiking)
-        break_time_hours = base_time_hours * 0.17
-        total_time_hours = base_time_hours + break_time_hours
+        if estimate:
+            total_time_hours = estimate["total_hours"]
+        else:
+            # Fallback to Naismith's rule when the track can't be parsed:
+            # 1 hour per 5km + 1 hour per 600m elevation gain, plus 10 minutes of breaks per hour
+            total_time_hours = ((distance_km / 5) + (elevation_m / 600)) * 1.17
         
         # Convert to hours and minutes
         hours = int(total_time_hours)
@@ -348,6 +370,15 @@ def hiking_plan_tool(
             plan_sections.append(f"• **Estimated hiking time:** {hours}h {minutes}min")
             plan_sections.append(f"• **Distance:** {distance_km:.1f} km")
             plan_sections.append(f"• **Elevation gain:** {elevation_m:.0f}m")
+            if estimate:
+                moving_h = int(estimate["moving_hours"])
+                moving_m = int((estimate["moving_hours"] - moving_h) * 60)
+                plan_sections.append(
+                    f"• **Moving time:** {moving_h}h {moving_m}min "
+                    f"(pace adjusted for {estimate['fitness_level'].lower()} fitness)"
+                )
+                if estimate["descent_m"] > 0:
+                    plan_sections.append(f"• **Descent:** {estimate['descent_m']:.0f}m")
             
             # Calculate return time
             try:
@@ -356,8 +387,22 @@ def hiking_plan_tool(
                 plan_sections.append(f"• **Estimated return:** {end_dt.strftime('%I:%M %p')}")
             except ValueError:
                 # Fallback for invalid time format
+                start_dt = None
                 plan_sections.append(f"• **Estimated return:** Approximately {hours} hours after {start_time}")
             
+            # Split times, thinned out so long trails stay readable
+            if estimate and estimate["splits"]:
+                splits = estimate["splits"]
+                step = max(1, -(-len(splits) // 8))
+                plan_sections.append("• **Split times:**")
+                for split in splits[step - 1::step]:
+                    elapsed = timedelta(hours=split["elapsed_hours"])
+                    split_h, split_m = divmod(int(elapsed.total_seconds() // 60), 60)
+                    line = f"  – km {split['km']:.0f}: {split_h}h {split_m:02d}min"
+                    if start_dt:
+                        line += f" ({(start_dt + elapsed).strftime('%I:%M %p')})"
+                    plan_sections.append(line)
+            
             plan_sections.append("")
     
     if include_safety_prep:
@@ -401,7 +446,7 @@ def hiking_plan_tool(
     
     return "\n".join(plan_sections)
 
-def gear_rental_tool(
+async def gear_rental_tool(
     location: str = None,
     latitude: float = None,
     longitude: float = None,
@@ -409,7 +454,7 @@ def gear_rental_tool(
     user_id: str = None
 ) -> str:
     """Find hiking gear rental locations using Google Places API"""
-    api_key = os.getenv("GOOGLE_PLACES_API_KEY")
+    api_key = get_places_api_key()
     if not api_key:
         return """⚠️ **Google Places API Setup Required**
 
@@ -421,6 +466,9 @@ To enable gear rental search, please:
     lat = None
     lng = None
     formatted_address = None
+    reverse_geocode_task = None
+    # One overall budget for every Google call made by this request
+    deadline = time.monotonic() + PLACES_DEADLINE_SECONDS
     
     # Priority 1: Use provided coordinates if available
     if latitude is not None and longitude is not None:
@@ -428,33 +476,16 @@ To enable gear rental search, please:
         lng = longitude
         formatted_address = f"Your current location ({lat:.4f}, {lng:.4f})"
         
-        # Reverse geocode to get readable address
-        try:
-            reverse_geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
-            reverse_params = {
-                "latlng": f"{lat},{lng}",
-                "key": api_key
-            }
-            reverse_response = requests.get(reverse_geocode_url, params=reverse_params, timeout=10)
-            reverse_data = reverse_response.json()
-            
-            if reverse_data.get("status") == "OK" and reverse_data.get("results"):
-                formatted_address = reverse_data["results"][0]["formatted_address"]
-        except (requests.RequestException, KeyError, ValueError):
-            # If reverse geocoding fails, use coordinates
-            pass
+        # Reverse geocode to get readable address, concurrently with the place searches below
+        reverse_geocode_task = asyncio.ensure_future(reverse_geocode(lat, lng))
     
     # Priority 2: Use location string if no coordinates provided
     elif location:
-        geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
-        geocode_params = {
-            "address": location,
-            "key": api_key
-        }
-        
         try:
-            geocode_response = requests.get(geocode_url, params=geocode_params, timeout=10)
-            geocode_data = geocode_response.json()
+            geocode_data = await asyncio.wait_for(
+                geocode_address(location),
+                timeout=max(deadline - time.monotonic(), 0)
+            )
             
             # Handle API authorization errors
             if geocode_data.get("status") == "REQUEST_DENIED":
@@ -489,7 +520,7 @@ To enable gear rental search, please:
             lng = location_data["geometry"]["location"]["lng"]
             formatted_address = location_data["formatted_address"]
             
-        except (requests.RequestException, KeyError, ValueError) as e:
+        except (httpx.HTTPError, asyncio.TimeoutError, KeyError, ValueError) as e:
             return f"""❌ **Connection Error**
 
 Unable to connect to Google Places API: {str(e)}
@@ -515,87 +546,33 @@ I can help you find nearby gear rental shops! Please either:
 • Salt Lake City, UT (for Utah's national parks)
 • Asheville, NC (for Appalachian trails)"""
     
-    # Search for outdoor gear rental places
-    places_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    
-    # Search terms for hiking/outdoor gear rental - more specific to avoid unrelated businesses
-    search_queries = [
-        "outdoor equipment rental hiking camping",
-        "sporting goods rental outdoor gear", 
-        "adventure gear rental hiking",
-        "outdoor outfitters rental",
-        "camping hiking equipment rental",
-        "REI outdoor gear rental"  # Include known outdoor brands
-    ]
-    
-    all_places = []
-    
-    for query in search_queries:
-        params = {
-            "location": f"{lat},{lng}",
-            "radius": radius,
-            "keyword": query,
-            "type": "store",
-            "key": api_key
-        }
-        
-        try:
-            response = requests.get(places_url, params=params, timeout=10)
-            data = response.json()
-            
-            if data["status"] == "OK":
-                all_places.extend(data["results"])
-                
-        except (requests.RequestException, KeyError, ValueError):
-            continue
-    
-    # Filter out businesses that are clearly not outdoor gear related
-    outdoor_keywords = [
-        "outdoor", "hiking", "camping", "adventure", "mountain", "trek", 
-        "climbing", "backpack", "gear", "equipment", "outfitter", "sporting goods",
-        "rei", "patagonia", "north face", "sports", "expedition", "alpine", "trail"
-    ]
-    
-    exclude_keywords = [
-        "car", "auto", "vehicle", "truck", "motorcycle", "scooter", "bike rental",
-        "apartment", "house", "property", "real estate", "gravity", "finance"
-    ]
-    
-    filtered_places = []
-    for place in all_places:
-        name = place.get("name", "").lower()
-        types = place.get("types", [])
-        
-        # Skip if it contains excluded keywords
-        if any(keyword in name for keyword in exclude_keywords):
-            continue
-            
-        # Skip if it's clearly not outdoor-related establishment type
-        if "car_rental" in types or "gas_station" in types or "real_estate_agency" in types:
-            continue
-            
-        # Only include if it has outdoor-related keywords OR is a sporting goods store
-        has_outdoor_keywords = any(keyword in name for keyword in outdoor_keywords)
-        is_sporting_goods = "sporting_goods_store" in types
-        is_general_store = "store" in types or "establishment" in types
-        
-        if has_outdoor_keywords or is_sporting_goods or (is_general_store and "rental" in name):
-            filtered_places.append(place)
-    
-    # Remove duplicates based on place_id
-    unique_places = {}
-    for place in filtered_places:
-        place_id = place.get("place_id")
-        if place_id and place_id not in unique_places:
-            unique_places[place_id] = place
+    # Harvested shops for this area, ranked by distance and rating
+    candidates = await asyncio.to_thread(local_rental_candidates, lat, lng, radius)
+    if candidates is None:
+        # Region not harvested yet: search live (shared cache, Google only on a miss)
+        candidates = await find_rental_candidates(lat, lng, radius, deadline=deadline)
     
-    places = list(unique_places.values())
+    if reverse_geocode_task:
+        try:
+            formatted_address = await asyncio.wait_for(
+                reverse_geocode_task,
+                timeout=max(deadline - time.monotonic(), 0)
+            ) or formatted_address
+        except asyncio.TimeoutError:
+            # If reverse geocoding is too slow, use coordinates
+            pass
     
-    if not places:
+    if not candidates:
         return f"🔍 No hiking gear rental shops found within {radius/1000:.0f}km of {formatted_address}. Try expanding your search area or checking nearby cities."
     
-    # Sort by number of reviews (user_ratings_total) and limit to top 3 results
-    places = sorted(places, key=lambda x: x.get("user_ratings_total", 0), reverse=True)[:3]
+    # Candidates are already ranked; show the top 3
+    places = candidates[:3]
+    
+    # Website/phone only if already cached, so the answer doesn't wait on Place Details
+    # calls; the missing ones are fetched in the background for the next answer here
+    place_ids = [place["place_id"] for place in places if place.get("place_id")]
+    place_details = await cached_places_details(place_ids)
+    warm_places_details([place_id for place_id in place_ids if place_id not in place_details])
     
     # Format the response
     result_sections = []
@@ -627,9 +604,13 @@ I can help you find nearby gear rental shops! Please either:
         result_sections.append(f"**{i}. {name}** {status_indicator}")
         result_sections.append(f"• **Rating:** ⭐ {rating}/5 ({user_ratings_total} reviews)")
         result_sections.append(f"• **Address:** {vicinity}{price_indicator}")
+        if place.get("distance_m") is not None:
+            result_sections.append(f"• **Distance:** {place['distance_m'] / 1000:.1f} km")
         
-        # Add coordinates for map integration (hidden from user but available for parsing)
+        # Add coordinates and place id for map integration (hidden from user but available for parsing)
         result_sections.append(f"• **Coordinates:** {place_lat},{place_lng}")
+        if place.get("place_id"):
+            result_sections.append(f"• **Place ID:** {place['place_id']}")
         
         # Add opening hours if available
         if place.get("opening_hours"):
@@ -639,33 +620,15 @@ I can help you find nearby gear rental shops! Please either:
                 result_sections.append(f"• **Status:** {status}")
         
         # Add website/phone if available
-        place_id = place.get("place_id")
-        if place_id:
-            # Get additional details for this place (website, phone, etc.)
-            try:
-                details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-                details_params = {
-                    "place_id": place_id,
-                    "fields": "website,formatted_phone_number",
-                    "key": api_key
-                }
-                details_response = requests.get(details_url, params=details_params, timeout=10)
-                details_data = details_response.json()
-                
-                if details_data.get("status") == "OK" and details_data.get("result"):
-                    details = details_data["result"]
-                    
-                    # Add website if available
-                    if details.get("website"):
-                        result_sections.append(f"• **Website:** {details['website']}")
-                    
-                    # Add phone if available
-                    if details.get("formatted_phone_number"):
-                        result_sections.append(f"• **Phone:** {details['formatted_phone_number']}")
-                        
-            except (requests.RequestException, KeyError, ValueError):
-                # If details request fails, continue without additional info
-                pass
+        details = place_details.get(place.get("place_id"))
+        if details:
+            # Add website if available
+            if details.get("website"):
+                result_sections.append(f"• **Website:** {details['website']}")
+            
+            # Add phone if available
+            if details.get("formatted_phone_number"):
+                result_sections.append(f"• **Phone:** {details['formatted_phone_number']}")
         
         # Always add in-app map coordinates (outside the details block)
         result_sections.append(f"• **Maps:** {place_lat},{place_lng}")
@@ -694,20 +657,16 @@ def chat_tool(question: str) -> str:
     )
     return response.choices[0].message.content
 
-def weather_conditions_tool(detail: bool = False, user_id: str = None) -> str:
+async def weather_conditions_tool(detail: bool = False, user_id: str = None) -> str:
     """Return aggregated current weather along the latest trail for the user with enhanced data from One Call API 3.0."""
-    db = next(get_db())
     # Fetch latest trail
-    query = db.query(TrailData)
-    if user_id:
-        query = query.filter(TrailData.user_id == user_id)
-    trail = query.order_by(TrailData.id.desc()).first()
+    trail = await asyncio.to_thread(load_latest_trail, user_id)
 
     if not trail or not trail.coordinates:
         return "No trail data available. Please upload a trail first."
 
-    # Sample only 2 strategic points (middle and end) for minimal API usage
-    samples = sample_trail_endpoints(trail.coordinates)
+    # High point, ends, elevation bands and spread, one per weather cell, within the call budget
+    samples = sample_trail_weather_points(trail.coordinates)
     if not samples:
         return "Coordinates could not be parsed for weather lookup."
 
@@ -719,12 +678,12 @@ def weather_conditions_tool(detail: bool = False, user_id: str = None) -> str:
     
     successful_calls = 0
     
-    for lat, lon in samples:
-        # Use comprehensive weather data with current weather only
-        weather_data = fetch_comprehensive_weather(
-            lat, lon, 
-            exclude=["minutely", "hourly", "daily"]
-        )
+    # All sample points are fetched concurrently under one deadline
+    point_results = await fetch_weather_for_points(samples, exclude=["minutely", "hourly", "daily"])
+    quality = summarize_weather_quality(point_results)
+    
+    for point in point_results:
+        weather_data = point["data"]
         
         if weather_data and "current" in weather_data:
             current = weather_data["current"]
@@ -763,7 +722,7 @@ def weather_conditions_tool(detail: bool = False, user_id: str = None) -> str:
     if detail:
         breakdown = "\n".join([f"• {d.capitalize()}, {t:.1f}°C" for d, t in zip(descriptions, temps)])
         result = (
-            f"🌤️ **Current Weather Along Your Trail** (middle & end points):\n"
+            f"🌤️ **Current Weather Along Your Trail** ({len(samples)} sampled points):\n"
             f"**Overall Conditions:** {common_desc.capitalize()}, {avg_temp:.1f}°C average\n"
         )
         
@@ -777,6 +736,10 @@ def weather_conditions_tool(detail: bool = False, user_id: str = None) -> str:
         
         result += f"\n**Detailed Breakdown:**\n{breakdown}"
         result += f"\n\n📊 **Data Quality:** {successful_calls}/{len(samples)} sampling points successful"
+        if quality["points_timed_out"] or quality["points_failed"]:
+            result += f" ({quality['points_timed_out'] + quality['points_failed']} unavailable)"
+        if quality["points_stale"]:
+            result += f", {quality['points_stale']} from cached data up to {quality['max_age_seconds'] // 60} min old"
         
         return result
     else:
@@ -785,6 +748,8 @@ def weather_conditions_tool(detail: bool = False, user_id: str = None) -> str:
             result += f" (humidity: {avg_humidity:.0f}%)"
         if weather_alerts:
             result += f" ⚠️ Alerts: {', '.join(weather_alerts)}"
+        if not quality["complete"]:
+            result += f" (based on {successful_calls}/{len(samples)} trail points)"
         return result
 
 # Tool definitions for OpenAI function calling
@@ -995,13 +960,63 @@ class WeatherHourlyRequest(BaseModel):
     lon: float
     hours: Optional[int] = 24
 
+MAX_WEATHER_BATCH_POINTS = 25
+
+def weather_projection(
+    compact: bool = Query(False, description="Return only the fields the app renders"),
+    fields: Optional[str] = Query(None, description="Comma-separated dotted paths, e.g. current.temp,daily.temp.max")
+) -> Optional[Dict[str, Any]]:
+    """Projection tree for the weather endpoints; `fields` takes precedence over `compact`."""
+    if fields:
+        try:
+            return parse_weather_fields(fields.split(","))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return COMPACT_WEATHER_PROJECTION if compact else None
+
+
+class WeatherPoint(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+class WeatherBatchRequest(BaseModel):
+    points: List[WeatherPoint] = Field(..., min_length=1, max_length=MAX_WEATHER_BATCH_POINTS)
+    # Minutely data is never fetched, so it can't be requested
+    sections: List[Literal["current", "hourly", "daily", "alerts"]] = Field(default=["current"], min_length=1)
+
+class PlaceDetailsRequest(BaseModel):
+    place_ids: List[str] = Field(..., min_length=1, max_length=MAX_PLACE_DETAILS_PER_REQUEST)
+
+@router.post("/places/details")
+async def get_places_details(
+    request: PlaceDetailsRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Get website and phone number for gear rental places, fetched concurrently and cached per place."""
+    if not get_places_api_key():
+        raise HTTPException(status_code=503, detail="Places service is not configured.")
+    
+    details = await fetch_places_details(request.place_ids)
+    return {
+        "details": {
+            place_id: {
+                "website": entry.get("website"),
+                "phone": entry.get("formatted_phone_number")
+            }
+            for place_id, entry in details.items()
+        },
+        "missing": [place_id for place_id in request.place_ids if place_id not in details]
+    }
+
 @router.post("/weather/current")
 async def get_current_weather(
     request: WeatherRequest,
+    projection: Optional[Dict[str, Any]] = Depends(weather_projection),
     current_user: User = Depends(get_current_user)
 ):
     """Get current weather for a specific location using One Call API 3.0."""
-    weather_data = fetch_comprehensive_weather(
+    weather_data = await asyncio.to_thread(
+        fetch_comprehensive_weather,
         request.lat, 
         request.lon, 
         exclude=["minutely", "hourly", "daily", "alerts"]
@@ -1013,15 +1028,49 @@ async def get_current_weather(
             detail="Weather service unavailable. Please try again later."
         )
     
-    return weather_data
+    return project_weather(weather_data, projection)
+
+@router.post("/weather/batch")
+async def get_weather_batch(
+    request: WeatherBatchRequest,
+    projection: Optional[Dict[str, Any]] = Depends(weather_projection),
+    current_user: User = Depends(get_current_user)
+):
+    """Get weather sections for several points at once; points in the same grid cell share one lookup."""
+    results = await fetch_weather_batch(
+        [(point.lat, point.lon) for point in request.points],
+        request.sections
+    )
+    
+    if not any(result["data"] for result in results):
+        raise HTTPException(
+            status_code=503, 
+            detail="Weather service unavailable. Please try again later."
+        )
+    
+    return {
+        "results": [
+            {
+                "lat": result["lat"],
+                "lon": result["lon"],
+                "cell": result["cell"],
+                "status": result["status"],
+                "age_seconds": round(result["age_seconds"]) if result["age_seconds"] is not None else None,
+                "weather": project_weather(result["data"], projection)
+            }
+            for result in results
+        ],
+        "quality": summarize_weather_quality(results)
+    }
 
 @router.post("/weather/forecast")
 async def get_weather_forecast(
     request: WeatherForecastRequest,
+    projection: Optional[Dict[str, Any]] = Depends(weather_projection),
     current_user: User = Depends(get_current_user)
 ):
     """Get weather forecast for specified number of days using One Call API 3.0."""
-    weather_data = fetch_weather_forecast(request.lat, request.lon, request.days)
+    weather_data = await asyncio.to_thread(fetch_weather_forecast, request.lat, request.lon, request.days)
     
     if not weather_data:
         raise HTTPException(
@@ -1029,15 +1078,16 @@ async def get_weather_forecast(
             detail="Weather service unavailable. Please try again later."
         )
     
-    return weather_data
+    return project_weather(weather_data, projection)
 
 @router.post("/weather/hourly")
 async def get_hourly_weather(
     request: WeatherHourlyRequest,
+    projection: Optional[Dict[str, Any]] = Depends(weather_projection),
     current_user: User = Depends(get_current_user)
 ):
     """Get hourly weather forecast using One Call API 3.0."""
-    weather_data = fetch_hourly_weather(request.lat, request.lon, request.hours)
+    weather_data = await asyncio.to_thread(fetch_hourly_weather, request.lat, request.lon, request.hours)
     
     if not weather_data:
         raise HTTPException(
@@ -1045,15 +1095,16 @@ async def get_hourly_weather(
             detail="Weather service unavailable. Please try again later."
         )
     
-    return weather_data
+    return project_weather(weather_data, projection)
 
 @router.post("/weather/alerts")
 async def get_weather_alerts(
     request: WeatherRequest,
+    projection: Optional[Dict[str, Any]] = Depends(weather_projection),
     current_user: User = Depends(get_current_user)
 ):
     """Get weather alerts for a location using One Call API 3.0."""
-    alerts = get_weather_alerts(request.lat, request.lon)
+    alerts = await asyncio.to_thread(fetch_weather_alerts, request.lat, request.lon)
     
     if alerts is None:
         raise HTTPException(
@@ -1061,22 +1112,16 @@ async def get_weather_alerts(
             detail="Weather service unavailable. Please try again later."
         )
     
-    return {"alerts": alerts}
+    return project_weather({"alerts": alerts}, projection)
 
 @router.post("/weather/trail-conditions")
 async def get_trail_weather_conditions(
+    projection: Optional[Dict[str, Any]] = Depends(weather_projection),
     current_user: User = Depends(get_current_user)
 ):
     """Get comprehensive weather conditions along the user's latest trail."""
-    db = next(get_db())
-    
     # Fetch latest trail
-    trail = (
-        db.query(TrailData)
-        .filter(TrailData.user_id == current_user.id)
-        .order_by(TrailData.id.desc())
-        .first()
-    )
+    trail = await asyncio.to_thread(load_latest_trail, current_user.id)
     
     if not trail or not trail.coordinates:
         raise HTTPException(
@@ -1084,27 +1129,29 @@ async def get_trail_weather_conditions(
             detail="No trail data available. Please upload a trail first."
         )
     
-    # Sample only 2 strategic points (middle and end) for minimal API usage
-    samples = sample_trail_endpoints(trail.coordinates)
+    # High point, ends, elevation bands and spread, one per weather cell, within the call budget
+    samples = sample_trail_weather_points(trail.coordinates)
     if not samples:
         raise HTTPException(
             status_code=400,
             detail="Coordinates could not be parsed for weather lookup."
         )
     
-    # Get weather data for each sample point
+    # Get weather data for all sample points concurrently (current, daily, and alerts)
+    point_results = await fetch_weather_for_points(samples, exclude=["minutely", "hourly"])
+    
     weather_points = []
-    for i, (lat, lon) in enumerate(samples):
-        weather_data = fetch_comprehensive_weather(
-            lat, lon, 
-            exclude=["minutely", "hourly"]  # Get current, daily, and alerts
-        )
+    for i, point in enumerate(point_results):
+        weather_data = point["data"]
         
         if weather_data:
+            weather_data = project_weather(weather_data, projection)
             weather_points.append({
                 "point_index": i,
-                "lat": lat,
-                "lon": lon,
+                "lat": point["lat"],
+                "lon": point["lon"],
+                "status": point["status"],
+                "age_seconds": round(point["age_seconds"]),
                 "current": weather_data.get("current"),
                 "daily_forecast": weather_data.get("daily", [])[:3],  # 3-day forecast
                 "alerts": weather_data.get("alerts", [])
@@ -1121,7 +1168,8 @@ async def get_trail_weather_conditions(
         "summary": {
             "total_points": len(weather_points),
             "trail_length_km": (trail.distance_meters or 0) / 1000,
-            "elevation_gain_m": trail.elevation_gain_meters or 0
+            "elevation_gain_m": trail.elevation_gain_meters or 0,
+            "quality": summarize_weather_quality(point_results)
         }
     }
 
@@ -1133,9 +1181,7 @@ async def orchestrate(
     """AI Agent Orchestrator that selects and executes appropriate tools based on user input"""
     db = next(get_db())
     # Get user-specific trail data
-    trail = db.query(TrailData).filter(
-        TrailData.user_id == current_user.id
-    ).order_by(TrailData.id.desc()).first()
+    trail = get_latest_trail(db, current_user.id)
     
     trail_context = ""
     if trail:
@@ -1228,7 +1274,10 @@ When the user asks for gear recommendations without specifying conditions, use t
         tool_function = TOOL_FUNCTIONS.get(tool_name)
         if tool_function:
             try:
-                tool_result = tool_function(**tool_args)
+                if inspect.iscoroutinefunction(tool_function):
+                    tool_result = await tool_function(**tool_args)
+                else:
+                    tool_result = tool_function(**tool_args)
             except Exception as e:
                 tool_result = f"Error executing tool: {str(e)}"
         else:
@@ -0,0 +1,15 @@
+from celery_app import app
+from .prefetch_service import WEATHER_PREFETCH_MAX_CALLS, prefetch_active_trail_weather
+from .rental_service import HARVEST_REGIONS_PER_RUN, harvest_due_regions
+
+
+@app.task(name="harvest_rental_shops")
+def harvest_rental_shops(limit: int = HARVEST_REGIONS_PER_RUN):
+    """Refresh the local rental shop table for regions users hike in."""
+    return harvest_due_regions(limit)
+
+
+@app.task(name="prefetch_trail_weather")
+def prefetch_trail_weather(max_calls: int = WEATHER_PREFETCH_MAX_CALLS):
+    """Warm the weather cache for recently active users' latest trails."""
+    return prefetch_active_trail_weather(max_calls)
@@ -1,39 +1,100 @@
+import asyncio
 import os
-import requests
+import threading
+import time
+import httpx
+from src import geo, http_client
+from src.cache import TTLCache, cache_get_json, cache_set_json, cache_try_lock
+from src.quota import SharedRateLimiter
 from typing import Optional, Dict, List, Tuple, Any
 import math
-
-
-def fetch_comprehensive_weather(lat: float, lon: float, exclude: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
-    """Fetch comprehensive weather data from OpenWeatherMap One Call API 3.0.
-
-    Args:
-        lat (float): Latitude of the location.
-        lon (float): Longitude of the location.
-        exclude (Optional[List[str]]): Parts to exclude from response 
-                                     (current, minutely, hourly, daily, alerts)
-
-    Returns:
-        dict | None: Comprehensive weather data with current, hourly, daily forecasts
-                    and alerts, or None if request fails or api key missing.
-    """
+import numpy as np
+
+ONECALL_URL = "https://api.openweathermap.org/data/3.0/onecall"
+ONECALL_SECTIONS = ("current", "minutely", "hourly", "daily", "alerts")
+
+# Weather is cached per geohash cell (~5km) and fetched for the cell centre,
+# one full One Call document per cell serving every section
+WEATHER_CELL_PRECISION = 5
+# How old each section may be before the document is refetched
+WEATHER_SECTION_TTLS = {
+    "current": 10 * 60,
+    "alerts": 10 * 60,
+    "minutely": 10 * 60,
+    "hourly": 60 * 60,
+    "daily": 3 * 3600,
+}
+# Redis keeps documents much longer than any section TTL so a stale copy can
+# be served when OpenWeather is unavailable
+WEATHER_DOC_MAX_AGE_SECONDS = 24 * 3600
+WEATHER_LOCAL_TTL_SECONDS = 60
+WEATHER_FETCH_LOCK_SECONDS = 15
+WEATHER_COALESCE_WAIT_SECONDS = 3.0
+WEATHER_COALESCE_POLL_SECONDS = 0.1
+# Adaptive trail sampling (see sample_trail_weather_points)
+WEATHER_SAMPLE_BUDGET = int(os.getenv("WEATHER_SAMPLE_BUDGET", 6))  # Max upstream calls per request
+WEATHER_SAMPLE_SPACING_KM = 5.0  # Roughly one sample per this distance before the budget applies
+WEATHER_ELEVATION_BAND_M = 300.0
+# Shared budget for fetching all sample points of a trail
+WEATHER_POINTS_DEADLINE_SECONDS = float(os.getenv("WEATHER_POINTS_DEADLINE_SECONDS", 8))
+
+# One OpenWeather key is shared by every API worker and Celery process, so the
+# plan's limits are enforced cluster-wide in Redis (see src/quota.py)
+OPENWEATHER_CALLS_PER_MINUTE = int(os.getenv("OPENWEATHER_CALLS_PER_MINUTE", 60))
+OPENWEATHER_CALLS_PER_DAY = int(os.getenv("OPENWEATHER_CALLS_PER_DAY", 1000))
+OPENWEATHER_COOLDOWN_SECONDS = 60  # Pause after a 429 without Retry-After
+# Share of each budget a priority must leave untouched: background prefetch
+# stops at half the budget, refreshing a stale-but-servable document at 10%,
+# and only users with nothing cached may spend the last calls
+WEATHER_PRIORITY_RESERVES = {
+    "interactive": 0.0,
+    "stale": 0.1,
+    "background": 0.5,
+}
+
+# Burst bucket per minute; the daily plan resets at 00:00 UTC, so it's a calendar-day counter
+openweather_quota = SharedRateLimiter(
+    "openweather",
+    [(OPENWEATHER_CALLS_PER_MINUTE, OPENWEATHER_CALLS_PER_MINUTE / 60.0)],
+    daily_limit=OPENWEATHER_CALLS_PER_DAY,
+)
+
+# Field projection (see project_weather). Top-level keys a projection may name
+WEATHER_TOP_LEVEL_FIELDS = ("lat", "lon", "timezone", "timezone_offset") + ONECALL_SECTIONS
+# What the app actually renders; `compact=true` on the weather endpoints
+COMPACT_WEATHER_FIELDS = (
+    "timezone_offset",
+    "current.dt", "current.temp", "current.feels_like", "current.humidity", "current.uvi",
+    "current.wind_speed", "current.wind_gust", "current.weather.main", "current.weather.description",
+    "current.weather.icon",
+    "hourly.dt", "hourly.temp", "hourly.pop", "hourly.wind_speed", "hourly.weather.main",
+    "hourly.weather.icon",
+    "daily.dt", "daily.sunrise", "daily.sunset", "daily.summary", "daily.temp.min", "daily.temp.max",
+    "daily.pop", "daily.wind_speed", "daily.weather.main", "daily.weather.description", "daily.weather.icon",
+    "alerts.event", "alerts.sender_name", "alerts.start", "alerts.end", "alerts.description",
+)
+
+_weather_local_cache = TTLCache(maxsize=1024, ttl_seconds=WEATHER_LOCAL_TTL_SECONDS)
+_inflight: Dict[str, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+
+def _fetch_onecall(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    """Fetch the full One Call payload (everything except minutely) for a point."""
     api_key = os.getenv("OPENWEATHER_API_KEY")
     if not api_key:
         print("❌ OpenWeather API key not configured")
         return None
 
-    # Build exclude parameter
-    exclude_param = ""
-    if exclude:
-        exclude_param = f"&exclude={','.join(exclude)}"
-
-    url = (
-        "https://api.openweathermap.org/data/3.0/onecall?"
-        f"lat={lat}&lon={lon}&appid={api_key}&units=metric{exclude_param}"
-    )
+    params = {"lat": lat, "lon": lon, "appid": api_key, "units": "metric", "exclude": "minutely"}
 
     try:
-        resp = requests.get(url, timeout=15)
+        # Shared keep-alive pool; transient 5xx and connection errors are retried with jitter.
+        # 429 is not retried: it pauses the shared quota instead (see below)
+        resp = http_client.request(
+            "GET", ONECALL_URL, params=params, timeout=15,
+            retry_statuses=http_client.RETRY_STATUSES - {429}
+        )
         resp.raise_for_status()
         data = resp.json()
         
@@ -44,11 +105,13 @@ def fetch_comprehensive_weather(lat: float, lon: float, exclude: Optional[List[s
         print(f"📡  OpenWeather One Call API OK  {lat},{lon} -> {weather_desc}, {temp}°C")
         
         return data
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             print(f"❌ OpenWeather UNAUTHORIZED {lat},{lon}: Invalid API key or subscription required")
         elif e.response.status_code == 429:
             print(f"❌ OpenWeather RATE LIMITED {lat},{lon}: API limit reached")
+            retry_after = e.response.headers.get("Retry-After", "")
+            openweather_quota.cooldown(int(retry_after) if retry_after.isdigit() else OPENWEATHER_COOLDOWN_SECONDS)
         elif e.response.status_code == 404:
             print(f"❌ OpenWeather NOT FOUND {lat},{lon}: Location not found")
         else:
@@ -59,6 +122,285 @@ def fetch_comprehensive_weather(lat: float, lon: float, exclude: Optional[List[s
         return None
 
 
+def weather_cell(lat: float, lon: float) -> str:
+    """Return the geohash cell weather for this point is cached under."""
+    return geo.encode(lat, lon, WEATHER_CELL_PRECISION)
+
+
+def _weather_key(cell: str) -> str:
+    return f"weather:onecall:{cell}"
+
+
+def _cached_document(cell: str) -> Optional[Dict[str, Any]]:
+    doc = _weather_local_cache.get(cell)
+    if doc is None:
+        doc = cache_get_json(_weather_key(cell))
+        if doc is not None:
+            _weather_local_cache.set(cell, doc)
+    return doc
+
+
+def _is_fresh(doc: Optional[Dict[str, Any]], max_age_seconds: float) -> bool:
+    return doc is not None and time.time() - doc.get("fetched_at", 0) <= max_age_seconds
+
+
+def _refresh_document(cell: str, priority: str) -> Optional[Dict[str, Any]]:
+    if not openweather_quota.try_acquire(reserve_fraction=WEATHER_PRIORITY_RESERVES[priority]):
+        return None
+    lat, lon = geo.decode(cell)
+    data = _fetch_onecall(lat, lon)
+    if data is None:
+        return None
+    doc = {"cell": cell, "fetched_at": time.time(), "data": data}
+    _weather_local_cache.set(cell, doc)
+    cache_set_json(_weather_key(cell), doc, WEATHER_DOC_MAX_AGE_SECONDS)
+    return doc
+
+
+def _wait_for_document(cell: str, max_age_seconds: float) -> Optional[Dict[str, Any]]:
+    """Poll Redis while another worker fetches the same cell."""
+    deadline = time.monotonic() + WEATHER_COALESCE_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(WEATHER_COALESCE_POLL_SECONDS)
+        doc = cache_get_json(_weather_key(cell))
+        if _is_fresh(doc, max_age_seconds):
+            _weather_local_cache.set(cell, doc)
+            return doc
+    return None
+
+
+def cached_weather_age(cell: str) -> Optional[float]:
+    """Age in seconds of the cached document for a cell, or None if nothing is cached."""
+    doc = _cached_document(cell)
+    return time.time() - doc.get("fetched_at", 0) if doc is not None else None
+
+
+def refresh_weather_cell(cell: str, max_age_seconds: float, priority: str = "background") -> bool:
+    """Make sure the cell's document is at most `max_age_seconds` old. Returns True if it is."""
+    lat, lon = geo.decode(cell)
+    return _is_fresh(get_weather_document(lat, lon, max_age_seconds, priority), max_age_seconds)
+
+
+def get_weather_document(
+    lat: float,
+    lon: float,
+    max_age_seconds: float,
+    priority: str = "interactive"
+) -> Optional[Dict[str, Any]]:
+    """Return the cached One Call document for the point's cell, refetching it if older than `max_age_seconds`.
+
+    Concurrent misses for a cell are coalesced: one thread per process and one
+    process across workers (Redis lock) calls OpenWeather, the rest wait for
+    its result. Refetches are charged to the shared OpenWeather quota at the
+    given priority ("interactive" or "background", see WEATHER_PRIORITY_RESERVES).
+    If the fetch fails or the quota refuses it, a stale document is returned
+    when one exists.
+
+    Returns:
+        dict | None: {"cell": str, "fetched_at": float (epoch seconds), "data": One Call payload}
+    """
+    cell = weather_cell(lat, lon)
+    doc = _cached_document(cell)
+    if _is_fresh(doc, max_age_seconds):
+        return doc
+
+    with _inflight_lock:
+        event = _inflight.get(cell)
+        leader = event is None
+        if leader:
+            event = _inflight[cell] = threading.Event()
+
+    if not leader:
+        # Another thread in this process is already fetching this cell
+        event.wait(WEATHER_COALESCE_WAIT_SECONDS + 15)
+        fresh = _cached_document(cell)
+        return fresh if fresh is not None else doc
+
+    try:
+        fresh = None
+        if not cache_try_lock(f"{_weather_key(cell)}:lock", WEATHER_FETCH_LOCK_SECONDS):
+            fresh = _wait_for_document(cell, max_age_seconds)
+        if fresh is None:
+            # An interactive caller that can fall back to a stale copy yields to those who can't
+            if priority == "interactive" and doc is not None:
+                priority = "stale"
+            fresh = _refresh_document(cell, priority)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(cell, None)
+        event.set()
+
+    if fresh is None and doc is not None:
+        print(f"⚠️ Serving stale weather for cell {cell} ({time.time() - doc.get('fetched_at', 0):.0f}s old)")
+        return doc
+    return fresh
+
+
+def fetch_comprehensive_weather(lat: float, lon: float, exclude: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """Fetch comprehensive weather data from OpenWeatherMap One Call API 3.0.
+
+    Served from the grid-cell cache; the document is refetched only when one of
+    the requested sections is older than its TTL (see WEATHER_SECTION_TTLS).
+
+    Args:
+        lat (float): Latitude of the location.
+        lon (float): Longitude of the location.
+        exclude (Optional[List[str]]): Parts to exclude from response 
+                                     (current, minutely, hourly, daily, alerts)
+
+    Returns:
+        dict | None: Comprehensive weather data with current, hourly, daily forecasts
+                    and alerts, or None if request fails or api key missing.
+    """
+    result = _weather_sections(lat, lon, exclude)
+    return result[0] if result else None
+
+
+def _weather_sections(lat: float, lon: float, exclude: Optional[List[str]] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+    """Return (weather data without the excluded sections, age in seconds) for a point."""
+    excluded = set(exclude or [])
+    sections = [section for section in ONECALL_SECTIONS if section not in excluded]
+    max_age = min((WEATHER_SECTION_TTLS[section] for section in sections), default=WEATHER_DOC_MAX_AGE_SECONDS)
+
+    doc = get_weather_document(lat, lon, max_age)
+    if doc is None:
+        return None
+    # Shallow copy so callers can trim sections without touching the cached document
+    data = {key: value for key, value in doc["data"].items() if key not in excluded}
+    age = time.time() - doc.get("fetched_at", 0)
+    return data, age
+
+
+async def fetch_weather_for_points(
+    points: List[Tuple[float, float]],
+    exclude: Optional[List[str]] = None,
+    deadline_seconds: float = WEATHER_POINTS_DEADLINE_SECONDS
+) -> List[Dict[str, Any]]:
+    """Fetch weather for several points concurrently within one shared deadline.
+
+    Each lookup runs in a worker thread; points still pending at the deadline
+    are reported as timed out (their fetch finishes in the background and
+    warms the cache). Data older than its section TTL is marked "stale".
+
+    Returns:
+        List[dict]: one entry per point, in order: {
+            "lat": float, "lon": float,
+            "status": "ok" | "stale" | "timeout" | "error",
+            "age_seconds": float | None,
+            "data": dict | None
+        }
+    """
+    excluded = set(exclude or [])
+    sections = [section for section in ONECALL_SECTIONS if section not in excluded]
+    max_age = min((WEATHER_SECTION_TTLS[section] for section in sections), default=WEATHER_DOC_MAX_AGE_SECONDS)
+
+    tasks = [asyncio.ensure_future(asyncio.to_thread(_weather_sections, lat, lon, exclude)) for lat, lon in points]
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=deadline_seconds)
+        if pending:
+            print(f"⏱️ Weather deadline hit, {len(pending)}/{len(tasks)} point(s) still pending")
+
+    results = []
+    for (lat, lon), task in zip(points, tasks):
+        entry = {"lat": lat, "lon": lon, "status": "timeout", "age_seconds": None, "data": None}
+        if task.done():
+            outcome = None if task.exception() else task.result()
+            if outcome is None:
+                entry["status"] = "error"
+            else:
+                entry["data"], entry["age_seconds"] = outcome
+                entry["status"] = "ok" if entry["age_seconds"] <= max_age else "stale"
+        results.append(entry)
+    return results
+
+
+async def fetch_weather_batch(
+    points: List[Tuple[float, float]],
+    sections: List[str],
+    deadline_seconds: float = WEATHER_POINTS_DEADLINE_SECONDS
+) -> List[Dict[str, Any]]:
+    """Fetch the requested sections for many points, one lookup per weather cell.
+
+    Points sharing a cell share its document, so duplicates cost neither a
+    thread nor an upstream call. Returns `fetch_weather_for_points` entries,
+    one per input point in order, each with its "cell" added.
+    """
+    cells: Dict[str, Tuple[float, float]] = {}
+    point_cells = []
+    for lat, lon in points:
+        cell = weather_cell(lat, lon)
+        cells.setdefault(cell, (lat, lon))
+        point_cells.append(cell)
+
+    exclude = [section for section in ONECALL_SECTIONS if section not in sections]
+    cell_results = dict(zip(cells, await fetch_weather_for_points(list(cells.values()), exclude, deadline_seconds)))
+    return [
+        {**cell_results[cell], "lat": lat, "lon": lon, "cell": cell}
+        for (lat, lon), cell in zip(points, point_cells)
+    ]
+
+
+def summarize_weather_quality(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Counts of `fetch_weather_for_points` outcomes, for data-quality indicators."""
+    statuses = [result["status"] for result in results]
+    ages = [result["age_seconds"] for result in results if result["age_seconds"] is not None]
+    return {
+        "points_requested": len(results),
+        "points_ok": statuses.count("ok"),
+        "points_stale": statuses.count("stale"),
+        "points_timed_out": statuses.count("timeout"),
+        "points_failed": statuses.count("error"),
+        "complete": statuses.count("ok") == len(results),
+        "max_age_seconds": round(max(ages)) if ages else None,
+    }
+
+
+def parse_weather_fields(fields: List[str]) -> Dict[str, Any]:
+    """Turn dotted field paths ("current.temp", "daily.temp.max") into a projection tree.
+
+    A path naming a whole object ("alerts") keeps all of it. Raises ValueError
+    for paths that don't start with a One Call top-level key.
+    """
+    tree: Dict[str, Any] = {}
+    for field in fields:
+        parts = [part for part in field.strip().split(".") if part]
+        if not parts:
+            continue
+        if parts[0] not in WEATHER_TOP_LEVEL_FIELDS:
+            raise ValueError(f"Unknown weather field: {field}")
+        node = tree
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is True:
+                break
+            node = child
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def project_weather(data: Any, projection: Optional[Dict[str, Any]]) -> Any:
+    """Keep only the projected fields of a One Call payload (or part of one).
+
+    Lists are projected element-wise, so "hourly.temp" keeps the temperature
+    of every hour. A None projection returns the data unchanged.
+    """
+    if projection is None:
+        return data
+    if isinstance(data, list):
+        return [project_weather(item, projection) for item in data]
+    if not isinstance(data, dict):
+        return data
+    projected = {}
+    for key, subtree in projection.items():
+        if key in data:
+            projected[key] = data[key] if subtree is True else project_weather(data[key], subtree)
+    return projected
+
+
+COMPACT_WEATHER_PROJECTION = parse_weather_fields(list(COMPACT_WEATHER_FIELDS))
+
+
 def fetch_current_weather(lat: float, lon: float) -> Optional[Dict[str, float]]:
     """Fetch current weather from OpenWeatherMap One Call API 3.0.
     
@@ -207,7 +549,7 @@ def sample_coordinates(coords: List, km_between: float = 5.0) -> List[Tuple[floa
     Always includes the first point.
     
     Note: This function is kept for backward compatibility but consider using
-    sample_trail_endpoints() for more efficient weather sampling.
+    sample_trail_weather_points() for budgeted, cell-deduplicated weather sampling.
     """
     if not coords:
         return []
@@ -270,4 +612,55 @@ def sample_trail_endpoints(coords: List) -> List[Tuple[float, float]]:
     middle_idx = len(norm) // 2
     end_idx = len(norm) - 1
     
-    return [norm[middle_idx], norm[end_idx]] 
\ No newline at end of file
+    return [norm[middle_idx], norm[end_idx]]
+
+
+def sample_trail_weather_points(coords: List, budget: int = WEATHER_SAMPLE_BUDGET) -> List[Tuple[float, float]]:
+    """Pick weather sample points along a trail, at most one per weather grid cell and `budget` in total.
+
+    Candidates are taken in priority order: the high point, the end, the
+    start, one point per elevation band (when the track has elevation), then
+    points evenly spread by distance. A candidate whose grid cell is already
+    sampled is skipped, since it would return the same cached weather. The
+    target count grows with trail length (one per WEATHER_SAMPLE_SPACING_KM,
+    at least two) up to the budget.
+
+    Returns:
+        List of (lat, lon) tuples in trail order.
+    """
+    if budget <= 0:
+        return []
+    lat, lon, elevation = geo.track_arrays(coords)
+    if lat is None:
+        # Fewer than two usable points
+        return geo.normalize_coordinates(coords)[:1]
+
+    cumulative_km = np.concatenate(([0.0], np.cumsum(geo.segment_lengths_m(lat, lon)) / 1000.0))
+    length_km = float(cumulative_km[-1])
+    # Never fewer than two, so short trails still sample the end (if it's in another cell)
+    target = min(budget, max(2, 1 + int(length_km // WEATHER_SAMPLE_SPACING_KM)))
+
+    last = len(lat) - 1
+    candidates = []
+    if elevation is not None:
+        candidates.append(int(np.argmax(elevation)))
+    candidates.extend([last, 0])
+    if elevation is not None:
+        # First point entering each elevation band, lowest band first
+        _, first_index = np.unique((elevation // WEATHER_ELEVATION_BAND_M).astype(int), return_index=True)
+        candidates.extend(int(i) for i in first_index)
+    # Spatial spread: midpoints first, then quarters, eighths, ...
+    divisions = 2
+    while divisions <= 2 * max(target, 2):
+        marks = length_km * np.arange(1, divisions, 2) / divisions
+        candidates.extend(int(i) for i in np.minimum(np.searchsorted(cumulative_km, marks), last))
+        divisions *= 2
+
+    chosen = {}
+    for i in candidates:
+        if len(chosen) >= target:
+            break
+        cell = weather_cell(float(lat[i]), float(lon[i]))
+        if cell not in chosen:
+            chosen[cell] = i
+    return [(float(lat[i]), float(lon[i])) for i in sorted(set(chosen.values()))]
@@ -1,61 +1,137 @@
-# WebSocket implementation (commented out for now - using HTTP instead)
+# WebSocket chat: the user is authenticated once per connection; database and
+# LLM work happens per message, off the event loop, so idle sockets hold no
+# pool connections and one slow completion doesn't stall the other sockets.
 
-from fastapi import WebSocket, WebSocketDisconnect, Depends
-from typing import List, Dict
-import json
+from fastapi import WebSocket, WebSocketDisconnect, status
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 import asyncio
 from .schemas import GearAndHikeResponse
 from .knowledge_base import retrieve_gear
-from src.posts.models import TrailData
-from src.database import get_db, SessionLocal
-from sqlalchemy.orm import Session
+from .connection_manager import manager
+from .ws_protocol import ProtocolError, codec_for, negotiate_subprotocol, receive_frame
+from src.auth.activity import record_user_activity
+from src.auth.dependencies import user_id_from_token
+from src.auth.models import User
+from src.database import SessionLocal
+from src.posts.service import load_latest_trail
 import openai
 import os
 
+OPENAI_TIMEOUT_SECONDS = 30
+SUGGESTION_KEYWORDS = ["gear", "hike", "suggest", "recommend", "what should i bring"]
+DEFAULT_GEAR = ["Hiking boots", "Water bottle", "First aid kit", "Weather-appropriate clothing", "Navigation tools"]
+
+
+# Async client: completions are awaited instead of blocking the event loop
+openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT_SECONDS)
+
+
+def _websocket_token(websocket: WebSocket) -> Optional[str]:
+    """Bearer token from the Authorization header, or the `token` query parameter
+    for clients that can't set headers on the upgrade request."""
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials.strip():
+        return credentials.strip()
+    return websocket.query_params.get("token")
+
+
+def _user_exists(user_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(User.id).filter(User.id == user_id).first() is not None
+    finally:
+        db.close()
+
+
+async def authenticate_websocket(websocket: WebSocket) -> Optional[str]:
+    """Return the id of the user the connection's token belongs to, or None."""
+    user_id = user_id_from_token(_websocket_token(websocket))
+    if user_id is None or not await asyncio.to_thread(_user_exists, user_id):
+        return None
+    return user_id
+
+
+class _SuggestionParser:
+    """Sorts completion lines into gear items and hike tips as the text streams in."""
 
-class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.gear: List[str] = []
+        self.hike: List[str] = []
+        self._section = None
+        self._partial = ""
+
+    def feed(self, text: str) -> bool:
+        """Consume streamed text; returns True if a new item was completed."""
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        return any([self._parse_line(line) for line in lines])
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    def finish(self) -> None:
+        self._parse_line(self._partial)
+        self._partial = ""
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    def _parse_line(self, line: str) -> bool:
+        line = line.strip()
+        if not line:
+            return False
+        if 'gear' in line.lower() or 'equipment' in line.lower():
+            self._section = 'gear'
+        elif 'tip' in line.lower() or 'advice' in line.lower():
+            self._section = 'hike'
+        elif line.startswith('•') or line.startswith('-') or line.startswith('*'):
+            if self._section == 'gear':
+                self.gear.append(line.lstrip('•-* '))
+                return True
+            elif self._section == 'hike':
+                self.hike.append(line.lstrip('•-* '))
+                return True
+        return False
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+def format_suggestions(gear: List[str], hike: List[str]) -> str:
+    gear_text = "🧢 Gear Suggestions:\n" + "\n".join([f"• {item}" for item in gear])
+    hike_text = "🥾 Hike Tips:\n" + "\n".join([f"• {item}" for item in hike])
+    return f"{gear_text}\n\n{hike_text}"
 
-manager = ConnectionManager()
 
-# Create OpenAI client instance
-openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def format_partial_suggestions(gear: List[str], hike: List[str]) -> str:
+    """What `format_suggestions` shows so far; each call extends the previous one
+    as long as items arrive gear first, then tips."""
+    if not gear:
+        return ""
+    if not hike:
+        return "🧢 Gear Suggestions:\n" + "\n".join([f"• {item}" for item in gear])
+    return format_suggestions(gear, hike)
+
+
+async def get_gear_and_hike_suggestions(
+    user_id: str,
+    on_progress: Optional[Callable[[List[str], List[str]], Awaitable[None]]] = None
+) -> GearAndHikeResponse:
+    """Get gear and hike suggestions based on the user's latest trail
+
+    The completion is streamed; `on_progress(gear, hike)` is awaited whenever
+    a new item has been parsed, before fallbacks are applied.
+    """
+    # Short-lived session in a worker thread; nothing is held between messages
+    trail = await asyncio.to_thread(load_latest_trail, user_id)
 
-async def get_gear_and_hike_suggestions(db: Session) -> GearAndHikeResponse:
-    """Get gear and hike suggestions based on latest trail data"""
-    trail = db.query(TrailData).order_by(TrailData.id.desc()).first()
-    
     if not trail:
         return GearAndHikeResponse(
             gear=["No trail data available. Please upload trail data first."],
             hike=["No trail data available. Please upload trail data first."]
         )
-    
+
     # Retrieve context from knowledge base
     context_gear = retrieve_gear(
-        trail.trail_conditions, 
-        trail.elevation_gain_meters, 
+        trail.trail_conditions,
+        trail.elevation_gain_meters,
         trail.distance_meters
     )
-    
+
     # Use OpenAI to generate suggestions
     try:
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4-1106-preview",
             messages=[
                 {"role": "system", "content": "You are a hiking expert. Provide gear recommendations and hiking tips based on trail data."},
@@ -65,40 +141,29 @@ async def get_gear_and_hike_suggestions(db: Session) -> GearAndHikeResponse:
                 - Elevation gain: {trail.elevation_gain_meters}m
                 - Trail conditions: {', '.join(trail.trail_conditions)}
                 - Available gear context: {', '.join(context_gear)}
-                
+
                 Provide:
                 1. 5 specific gear recommendations
                 2. 5 hiking tips for this trail
                 """}
             ],
-            max_tokens=500
+            max_tokens=500,
+            stream=True
         )
-        
-        content = response.choices[0].message.content
-        
-        # Simple parsing - split by lines and categorize
-        lines = content.split('\n')
-        gear_suggestions = []
-        hike_tips = []
-        
-        current_section = None
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if 'gear' in line.lower() or 'equipment' in line.lower():
-                current_section = 'gear'
-            elif 'tip' in line.lower() or 'advice' in line.lower():
-                current_section = 'hike'
-            elif line.startswith('•') or line.startswith('-') or line.startswith('*'):
-                if current_section == 'gear':
-                    gear_suggestions.append(line.lstrip('•-* '))
-                elif current_section == 'hike':
-                    hike_tips.append(line.lstrip('•-* '))
-        
+
+        # Simple parsing - split by lines and categorize, as the text arrives
+        parser = _SuggestionParser()
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta and parser.feed(delta) and on_progress:
+                await on_progress(parser.gear, parser.hike)
+        parser.finish()
+        gear_suggestions = parser.gear
+        hike_tips = parser.hike
+
         # Fallback if parsing fails
         if not gear_suggestions:
-            gear_suggestions = context_gear[:5] if context_gear else ["Hiking boots", "Water bottle", "First aid kit", "Weather-appropriate clothing", "Navigation tools"]
+            gear_suggestions = context_gear[:5] if context_gear else DEFAULT_GEAR
         if not hike_tips:
             hike_tips = [
                 "Check weather conditions before starting",
@@ -107,86 +172,80 @@ async def get_gear_and_hike_suggestions(db: Session) -> GearAndHikeResponse:
                 "Stay on marked trails",
                 "Pack out all trash"
             ]
-        
+
         return GearAndHikeResponse(gear=gear_suggestions, hike=hike_tips)
-        
+
     except Exception as e:
+        print(f"⚠️ OpenAI suggestions failed, using fallback: {e}")
         # Fallback response
         return GearAndHikeResponse(
-            gear=context_gear[:5] if context_gear else ["Hiking boots", "Water bottle", "First aid kit", "Weather-appropriate clothing", "Navigation tools"],
+            gear=context_gear[:5] if context_gear else DEFAULT_GEAR,
             hike=["Check weather conditions", "Bring enough water", "Tell someone your plans", "Stay on marked trails", "Pack out all trash"]
         )
 
+
+async def handle_chat_message(codec, user_id: str, message: Dict[str, Any]):
+    if message["type"] == "ping":
+        # Client keepalive; only ever sent in reply, so clients that don't ping never see "pong"
+        await codec.send("pong", "", message["seq"])
+        return
+    if message["type"] != "chat":
+        return
+
+    # Keeps the user in the active set that drives weather prefetch during long chats
+    await asyncio.to_thread(record_user_activity, user_id)
+    user_message = message["message"].lower()
+
+    # Check if user is asking for gear/hike suggestions
+    if any(keyword in user_message for keyword in SUGGESTION_KEYWORDS):
+        # Binary clients get the suggestions streamed as they are generated
+        stream = codec.stream(message["seq"])
+        suggestions = await get_gear_and_hike_suggestions(
+            user_id,
+            on_progress=lambda gear, hike: stream.update(format_partial_suggestions(gear, hike))
+        )
+        await stream.finish(format_suggestions(suggestions.gear, suggestions.hike))
+    else:
+        # General chat response
+        await codec.send("response", "Ask me for gear or hike suggestions for your latest route!", message["seq"])
+
+
 async def websocket_endpoint(websocket: WebSocket):
-    print(f"WebSocket connection attempt from {websocket.client.host}:{websocket.client.port}")
-    print(f"Headers: {websocket.headers}")
-    print(f"Query params: {websocket.query_params}")
-    
-    db = SessionLocal()  # <-- Open a new DB session
+    user_id = await authenticate_websocket(websocket)
+    if user_id is None:
+        # Rejects the handshake before accepting it
+        await manager.reject(websocket, status.WS_1008_POLICY_VIOLATION, "auth")
+        return
+
+    # JSON text frames unless the client offered the binary subprotocol
+    subprotocol = negotiate_subprotocol(websocket)
+    connection = await manager.connect(websocket, user_id, subprotocol)
+    if connection is None:
+        print(f"🚫 WebSocket rejected for user {user_id}: worker at capacity")
+        return
+    codec = codec_for(connection, subprotocol)
+    print(f"🔌 WebSocket connected for user {user_id} ({subprotocol or 'json'}). Total connections: {len(manager.connections)}")
     try:
-        await manager.connect(websocket)
-        print(f"WebSocket connected successfully. Total connections: {len(manager.active_connections)}")
-        print(f"Connection URL: {websocket.url}")
-        print(f"Connection scheme: {websocket.url.scheme}")
-        try:
-            while True:
-                # Receive message from client
-                data = await websocket.receive_text()
-                message_data = json.loads(data)
-                print(f"Received WebSocket message: {message_data}")
-            
-                # Handle different message types
-                if message_data.get("type") == "chat":
-                    user_message = message_data.get("message", "").lower()
-                    print(f"Processing chat message: {user_message}")
-                
-                    # Check if user is asking for gear/hike suggestions
-                    if any(keyword in user_message for keyword in ["gear", "hike", "suggest", "recommend", "what should i bring"]):
-                        print("Generating gear and hike suggestions...")
-                        # Get suggestions
-                        suggestions = await get_gear_and_hike_suggestions(db)
-                    
-                        # Format response
-                        gear_text = "🧢 Gear Suggestions:\n" + "\n".join([f"• {item}" for item in suggestions.gear])
-                        hike_text = "🥾 Hike Tips:\n" + "\n".join([f"• {item}" for item in suggestions.hike])
-                        response_text = f"{gear_text}\n\n{hike_text}"
-                    
-                        print(f"Sending response: {response_text}")
-                        # Send response
-                        await manager.send_personal_message(
-                            json.dumps({
-                                "type": "response",
-                                "message": response_text,
-                                "timestamp": asyncio.get_event_loop().time()
-                            }),
-                            websocket
-                        )
-                    else:
-                        # General chat response
-                        response_text = "Ask me for gear or hike suggestions for your latest route!"
-                        print(f"Sending general response: {response_text}")
-                        await manager.send_personal_message(
-                            json.dumps({
-                                "type": "response",
-                                "message": response_text,
-                                "timestamp": asyncio.get_event_loop().time()
-                            }),
-                            websocket
-                        )
-            
-        except WebSocketDisconnect:
-            manager.disconnect(websocket)
-            print(f"WebSocket disconnected. Total connections: {len(manager.active_connections)}")
-        except Exception as e:
-            print(f"WebSocket error: {str(e)}")
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "error",
-                    "message": f"Error: {str(e)}",
-                    "timestamp": asyncio.get_event_loop().time()
-                }),
-                websocket
-            )
-            manager.disconnect(websocket)
+        while True:
+            frame = await receive_frame(websocket)
+            connection.touch()
+            try:
+                messages = codec.decode(frame)
+            except ProtocolError as e:
+                await codec.send("error", f"Error: {e}")
+                continue
+
+            for message in messages:
+                try:
+                    await handle_chat_message(codec, user_id, message)
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    # A failed message doesn't end the conversation
+                    print(f"❌ WebSocket message error for user {user_id}: {e}")
+                    await codec.send("error", f"Error: {str(e)}", message["seq"])
+    except WebSocketDisconnect:
+        pass
     finally:
-        db.close()  # <-- Always close the DB session 
\ No newline at end of file
+        await manager.disconnect(connection)
+        print(f"🔌 WebSocket disconnected for user {user_id}. Total connections: {len(manager.connections)}")
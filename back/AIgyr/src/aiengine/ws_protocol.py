@@ -0,0 +1,221 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import msgpack
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .connection_manager import Connection
+
+# Wire protocols for /ws/chat.
+#
+# JSON (default): one text frame per message,
+#   {"type": "chat" | "response" | "error" | "pong", "message": str, "timestamp": float}
+#
+# Binary (negotiated by offering the MSGPACK_SUBPROTOCOL websocket subprotocol):
+# each binary frame holds one msgpack map or an array of them (a batch), with
+# short keys:
+#   "t"  message type (MSG_* below)
+#   "s"  sequence id, increasing per sender and connection
+#   "r"  sequence id of the client message a server message answers
+#   "m"  message text
+#   "d"  text delta of a streamed response (MSG_CHUNK)
+#   "ts" server time, epoch milliseconds (omitted on chunks)
+# Long responses are streamed as MSG_CHUNK deltas to append, closed by MSG_END.
+# MSG_END carries "m" only when the final text isn't the concatenated deltas.
+
+MSGPACK_SUBPROTOCOL = "aigear.msgpack.v1"
+
+MSG_CHAT = 1
+MSG_RESPONSE = 2
+MSG_ERROR = 3
+MSG_PING = 4
+MSG_PONG = 5
+MSG_CHUNK = 6
+MSG_END = 7
+
+_TYPE_NAMES = {MSG_CHAT: "chat", MSG_PING: "ping"}
+
+BATCH_WINDOW_SECONDS = 0.05  # Chunks produced within this window share one frame
+BATCH_MAX_BYTES = 4096
+MAX_BATCH_MESSAGES = 32  # Incoming batches beyond this are refused
+
+
+def negotiate_subprotocol(websocket: WebSocket) -> Optional[str]:
+    """Return the binary subprotocol if the client offered it, else None (JSON)."""
+    offered = websocket.scope.get("subprotocols") or []
+    return MSGPACK_SUBPROTOCOL if MSGPACK_SUBPROTOCOL in offered else None
+
+
+async def receive_frame(websocket: WebSocket) -> Dict[str, Any]:
+    """Receive the next text or binary frame, raising WebSocketDisconnect on close."""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    return frame
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class ProtocolError(ValueError):
+    """A frame that doesn't follow the negotiated protocol."""
+
+
+class ResponseStream:
+    """Sends a response that is rendered progressively.
+
+    `update` is called with the full text rendered so far and sends only what
+    was appended since the last call; `finish` closes the stream with the
+    final text, which is sent whole if it doesn't extend what was streamed.
+    """
+
+    def __init__(self, codec: "BinaryCodec", reply_to: Optional[int]):
+        self.codec = codec
+        self.reply_to = reply_to
+        self.sent = ""
+        self.diverged = False
+
+    async def update(self, text: str) -> None:
+        if self.diverged or len(text) <= len(self.sent):
+            return
+        if not text.startswith(self.sent):
+            self.diverged = True
+            return
+        delta, self.sent = text[len(self.sent):], text
+        await self.codec.send_chunk(delta, self.reply_to)
+
+    async def finish(self, text: str) -> None:
+        await self.codec.send(MSG_END, text if text != self.sent else None, self.reply_to)
+
+
+class JsonResponseStream:
+    """JSON clients get the final text as one response."""
+
+    def __init__(self, codec: "JsonCodec"):
+        self.codec = codec
+
+    async def update(self, text: str) -> None:
+        pass
+
+    async def finish(self, text: str) -> None:
+        await self.codec.send("response", text)
+
+
+class JsonCodec:
+    """The original text protocol."""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    def decode(self, frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if frame.get("text") is None:
+            raise ProtocolError("expected a text frame")
+        try:
+            message = json.loads(frame["text"])
+        except json.JSONDecodeError:
+            raise ProtocolError("invalid message format")
+        if not isinstance(message, dict) or not isinstance(message.get("message") or "", str):
+            raise ProtocolError("invalid message format")
+        return [{"type": message.get("type"), "message": message.get("message") or "", "seq": None}]
+
+    async def send(self, message_type: str, message: str, reply_to: Optional[int] = None) -> None:
+        await self.connection.send(json.dumps({
+            "type": message_type,
+            "message": message,
+            "timestamp": asyncio.get_running_loop().time()
+        }))
+
+    def stream(self, reply_to: Optional[int] = None) -> JsonResponseStream:
+        return JsonResponseStream(self)
+
+
+class BinaryCodec:
+    """msgpack framing with sequence ids, batching and streamed responses."""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self._seq = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_bytes = 0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def decode(self, frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if frame.get("bytes") is None:
+            raise ProtocolError("expected a binary frame")
+        try:
+            payload = msgpack.unpackb(frame["bytes"], raw=False)
+        except (ValueError, msgpack.UnpackException):
+            raise ProtocolError("invalid msgpack frame")
+        messages = payload if isinstance(payload, list) else [payload]
+        if len(messages) > MAX_BATCH_MESSAGES:
+            raise ProtocolError(f"batch larger than {MAX_BATCH_MESSAGES} messages")
+        decoded = []
+        for message in messages:
+            if not isinstance(message, dict):
+                raise ProtocolError("invalid message format")
+            # Checked here so a malformed field is answered with an error, not a crash
+            if not _is_int(message.get("t")):
+                raise ProtocolError("message type must be an integer")
+            if not isinstance(message.get("m") or "", str):
+                raise ProtocolError("message text must be a string")
+            if message.get("s") is not None and not _is_int(message["s"]):
+                raise ProtocolError("sequence id must be an integer")
+            decoded.append({
+                "type": _TYPE_NAMES.get(message.get("t")),
+                "message": message.get("m") or "",
+                "seq": message.get("s"),
+            })
+        return decoded
+
+    def _next(self, message_type: int, reply_to: Optional[int]) -> Dict[str, Any]:
+        self._seq += 1
+        message = {"t": message_type, "s": self._seq}
+        if message_type != MSG_CHUNK:
+            message["ts"] = int(time.time() * 1000)
+        if reply_to is not None:
+            message["r"] = reply_to
+        return message
+
+    async def send(self, message_type: Any, message: Optional[str], reply_to: Optional[int] = None) -> None:
+        """Send a message now, together with any chunks still waiting for their batch."""
+        if isinstance(message_type, str):
+            message_type = {"response": MSG_RESPONSE, "error": MSG_ERROR, "pong": MSG_PONG}[message_type]
+        frame = self._next(message_type, reply_to)
+        if message is not None:
+            frame["m"] = message
+        self._pending.append(frame)
+        await self.flush()
+
+    async def send_chunk(self, delta: str, reply_to: Optional[int]) -> None:
+        frame = self._next(MSG_CHUNK, reply_to)
+        frame["d"] = delta
+        self._pending.append(frame)
+        self._pending_bytes += len(delta)
+        if self._pending_bytes >= BATCH_MAX_BYTES:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_bytes = self._pending, [], 0
+        await self.connection.send(msgpack.packb(batch[0] if len(batch) == 1 else batch, use_bin_type=True))
+
+    def stream(self, reply_to: Optional[int] = None) -> ResponseStream:
+        return ResponseStream(self, reply_to)
+
+
+def codec_for(connection: Connection, subprotocol: Optional[str]):
+    return BinaryCodec(connection) if subprotocol == MSGPACK_SUBPROTOCOL else JsonCodec(connection)
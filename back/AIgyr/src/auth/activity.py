@@ -0,0 +1,36 @@
+import time
+from typing import List
+
+import redis
+
+from src.cache import TTLCache, get_redis
+
+ACTIVE_USERS_KEY = "activity:users"  # Sorted set: user id -> last seen (epoch seconds)
+ACTIVITY_WRITE_INTERVAL_SECONDS = 60
+ACTIVITY_RETENTION_SECONDS = 24 * 3600
+
+# Users whose activity this process recorded recently; avoids a Redis write per request
+_recently_recorded = TTLCache(maxsize=10000, ttl_seconds=ACTIVITY_WRITE_INTERVAL_SECONDS)
+
+
+def record_user_activity(user_id: str) -> None:
+    """Mark a user as active, at most once per ACTIVITY_WRITE_INTERVAL_SECONDS per process."""
+    if _recently_recorded.get(user_id):
+        return
+    _recently_recorded.set(user_id, True)
+    try:
+        get_redis().zadd(ACTIVE_USERS_KEY, {user_id: time.time()})
+    except redis.RedisError as e:
+        print(f"⚠️ Could not record activity for user {user_id}: {e}")
+
+
+def recently_active_users(window_seconds: float, limit: int = 1000) -> List[str]:
+    """Return ids of users active within `window_seconds`, most recent first, pruning old entries."""
+    now = time.time()
+    try:
+        client = get_redis()
+        client.zremrangebyscore(ACTIVE_USERS_KEY, "-inf", now - ACTIVITY_RETENTION_SECONDS)
+        return client.zrevrangebyscore(ACTIVE_USERS_KEY, "+inf", now - window_seconds, start=0, num=limit)
+    except redis.RedisError as e:
+        print(f"⚠️ Could not read active users: {e}")
+        return []
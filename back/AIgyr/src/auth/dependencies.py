@@ -1,28 +1,71 @@
+import hashlib
+import hmac
+import os
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 from src.auth.models import User
+from src.cache import TTLCache
 from src.database import get_db
+from src.auth.activity import record_user_activity
 
 from .utils import SECRET_KEY, ALGORITHM
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Shared secret for operational endpoints (stats, metrics); unset disables them
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+internal_token_header = APIKeyHeader(name="X-Internal-Token", auto_error=False)
+
+# Authenticated users by (user id, token digest), detached from any session. The cache is
+# per worker: invalidation only reaches the worker that made the change, so the TTL bounds
+# how long another worker can keep serving an updated or deleted account.
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 30))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+
+_principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS)
+
+def user_id_from_token(token: Optional[str]) -> Optional[str]:
+    """Return the user id a valid access token was issued for, or None."""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+def invalidate_principal(user_id: str) -> None:
+    """Drop this worker's cached copies of a user; call after changing or deleting them."""
+    _principal_cache.delete_where(lambda key: key[0] == user_id)
+
+def require_internal(token: Optional[str] = Depends(internal_token_header)) -> None:
+    """Allow only callers presenting INTERNAL_API_TOKEN in the X-Internal-Token header."""
+    if not (INTERNAL_API_TOKEN and token and hmac.compare_digest(token, INTERNAL_API_TOKEN)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    # Still decoded every time, so an expired token stops working even while its user is cached
+    user_id = user_id_from_token(token)
+    if user_id is None:
         raise credentials_exception
-    user = db.query(User).filter(User.id == user_id).first()
+    key = (user_id, hashlib.sha256(token.encode()).hexdigest())
+    user = _principal_cache.get(key)
     if user is None:
-        raise credentials_exception
-    return user
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise credentials_exception
+        db.expunge(user)
+        _principal_cache.set(key, user)
+    record_user_activity(user_id)
+    # A session-bound copy built from the cached state without a SELECT; changes made by
+    # the endpoint are flushed as usual and the cached instance itself is never mutated
+    return db.merge(user, load=False)
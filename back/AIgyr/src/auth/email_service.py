@@ -1,75 +1,156 @@
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content
+from python_http_client.exceptions import HTTPError
+import asyncio
 import os
+import time
+import redis
+from src.cache import get_redis
 from .config import SENDGRID_API_KEY, SENDGRID_FROM_EMAIL, EMAIL_VERIFICATION_EMAIL_SUBJECT, EMAIL_VERIFICATION_EMAIL_TEMPLATE, EMAIL_VERIFICATION_CODE_EXPIRY_MINUTES
 from .exceptions import EmailSendError
-from typing import Optional
+from typing import Any, Dict, Optional
+
+SENDGRID_TIMEOUT_SECONDS = 10
+# Worth retrying: throttling, SendGrid outages and network errors (no status code)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Delivery status per /send-code request id, kept as long as the code it carries is valid.
+# Keyed by an unguessable id rather than the address so it can't be used to probe signups.
+EMAIL_STATUS_PREFIX = "email_status:"
+EMAIL_STATUS_TTL_SECONDS = EMAIL_VERIFICATION_CODE_EXPIRY_MINUTES * 60
+EMAIL_METRICS_KEY = "email:metrics"  # Hash of counters shared by the API and Celery workers
+
+
+def _error_reason(status_code: Optional[int]) -> str:
+    if status_code == 429:
+        return "rate_limited"
+    if status_code is not None and 400 <= status_code < 500:
+        return "rejected"
+    return "unavailable"
+
+
+def record_email_status(request_id: str, status: str, attempts: int = 0, error: Optional[str] = None) -> None:
+    """Store the latest delivery state for a request and count it; Redis errors are logged and ignored.
+
+    `error` is an EmailSendError reason, never the provider's message.
+    """
+    try:
+        pipe = get_redis().pipeline()
+        key = f"{EMAIL_STATUS_PREFIX}{request_id}"
+        pipe.delete(key)
+        pipe.hset(key, mapping={
+            "status": status,
+            "attempts": attempts,
+            "error": error or "",
+            "updated_at": time.time(),
+        })
+        pipe.expire(key, EMAIL_STATUS_TTL_SECONDS)
+        pipe.hincrby(EMAIL_METRICS_KEY, status, 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Could not record email status for {request_id}: {e}")
+
+
+def get_email_status(request_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        status = get_redis().hgetall(f"{EMAIL_STATUS_PREFIX}{request_id}")
+    except redis.RedisError as e:
+        print(f"⚠️ Could not read email status for {request_id}: {e}")
+        return None
+    if not status:
+        return None
+    return {
+        "status": status["status"],
+        "attempts": int(status["attempts"]),
+        "error": status["error"] or None,
+        "updated_at": float(status["updated_at"]),
+    }
+
+
+def email_metrics() -> Dict[str, int]:
+    """Deliveries by outcome (queued, sending, retrying, sent, failed, expired) across all processes."""
+    try:
+        return {status: int(count) for status, count in get_redis().hgetall(EMAIL_METRICS_KEY).items()}
+    except redis.RedisError as e:
+        print(f"⚠️ Could not read email metrics: {e}")
+        return {}
+
 
 class EmailService:
     def __init__(self):
         self.api_key = SENDGRID_API_KEY
         self.from_email = SENDGRID_FROM_EMAIL
+        self._client: Optional[SendGridAPIClient] = None
 
-    async def send_verification_email(self, to_email: str, code: str) -> bool:
-        """Send verification code email asynchronously"""
+    @property
+    def client(self) -> SendGridAPIClient:
+        # One client per process instead of one per email
+        if self._client is None:
+            self._client = SendGridAPIClient(self.api_key)
+            self._client.client.timeout = SENDGRID_TIMEOUT_SECONDS
+        return self._client
+
+    def _send(self, message: Mail) -> bool:
         try:
-            html_content = EMAIL_VERIFICATION_EMAIL_TEMPLATE.format(
-                code=code,
-                expiry_minutes=EMAIL_VERIFICATION_CODE_EXPIRY_MINUTES
-            )
-            message = Mail(
-                from_email=self.from_email,
-                to_emails=to_email,
-                subject=EMAIL_VERIFICATION_EMAIL_SUBJECT,
-                html_content=html_content
+            response = self.client.send(message)
+        except HTTPError as e:
+            # For 403 errors, SendGrid usually provides details in the response body
+            print("SENDGRID ERROR BODY:", e.body)
+            raise EmailSendError(
+                f"SendGrid error: {e.status_code}",
+                retryable=e.status_code in RETRYABLE_STATUSES,
+                reason=_error_reason(e.status_code)
             )
-            sg = SendGridAPIClient(self.api_key)
-            response = sg.send(message)
-            if response.status_code >= 200 and response.status_code < 300:
-                return True
-            else:
-                raise EmailSendError(f"SendGrid error: {response.status_code} {response.body}")
         except Exception as e:
-            # For 403 errors, SendGrid usually provides details in the response body
-            if hasattr(e, 'body'):
-                print("SENDGRID ERROR BODY:", e.body)
             print("EMAIL ERROR:", e)
-            raise EmailSendError(f"Failed to send verification email: {str(e)}")
-    
+            raise EmailSendError(f"Failed to send email: {str(e)}", retryable=True, reason=_error_reason(None))
+        if response.status_code >= 200 and response.status_code < 300:
+            return True
+        raise EmailSendError(
+            f"SendGrid error: {response.status_code} {response.body}",
+            retryable=response.status_code in RETRYABLE_STATUSES,
+            reason=_error_reason(response.status_code)
+        )
+
+    def send_verification_email(self, to_email: str, code: str) -> bool:
+        """Send verification code email; blocks, so call it from a worker (see src.auth.tasks)"""
+        html_content = EMAIL_VERIFICATION_EMAIL_TEMPLATE.format(
+            code=code,
+            expiry_minutes=EMAIL_VERIFICATION_CODE_EXPIRY_MINUTES
+        )
+        message = Mail(
+            from_email=self.from_email,
+            to_emails=to_email,
+            subject=EMAIL_VERIFICATION_EMAIL_SUBJECT,
+            html_content=html_content
+        )
+        return self._send(message)
+
     async def send_custom_email(
-        self, 
-        to_email: str, 
-        subject: str, 
-        html_content: str, 
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
         text_content: Optional[str] = None
     ) -> bool:
         """Send a custom email using SendGrid"""
-        try:
-            # If text_content is provided, include both plain and HTML parts
-            if text_content:
-                message = Mail(
-                    from_email=self.from_email,
-                    to_emails=to_email,
-                    subject=subject,
-                    plain_text_content=text_content,
-                    html_content=html_content
-                )
-            else:
-                message = Mail(
-                    from_email=self.from_email,
-                    to_emails=to_email,
-                    subject=subject,
-                    html_content=html_content
-                )
-            sg = SendGridAPIClient(self.api_key)
-            response = sg.send(message)
-            if response.status_code >= 200 and response.status_code < 300:
-                return True
-            else:
-                raise EmailSendError(f"SendGrid error: {response.status_code} {response.body}")
-        except Exception as e:
-            print("EMAIL ERROR:", e)
-            raise EmailSendError(f"Failed to send custom email: {str(e)}")
+        # If text_content is provided, include both plain and HTML parts
+        if text_content:
+            message = Mail(
+                from_email=self.from_email,
+                to_emails=to_email,
+                subject=subject,
+                plain_text_content=text_content,
+                html_content=html_content
+            )
+        else:
+            message = Mail(
+                from_email=self.from_email,
+                to_emails=to_email,
+                subject=subject,
+                html_content=html_content
+            )
+        return await asyncio.to_thread(self._send, message)
 
 # Global instance
-email_service = EmailService() 
\ No newline at end of file
+email_service = EmailService()
@@ -11,9 +11,19 @@ class InvalidCodeError(EmailVerificationError):
     pass
 
 class EmailSendError(EmailVerificationError):
-    """Raised when email sending fails"""
-    pass
+    """Raised when email sending fails; `retryable` if a later attempt may succeed.
+
+    `reason` is a coarse class safe to show clients: rate_limited, rejected or unavailable.
+    """
+    def __init__(self, message: str, retryable: bool = False, reason: str = "unavailable"):
+        super().__init__(message)
+        self.retryable = retryable
+        self.reason = reason
 
 class TooManyAttemptsError(EmailVerificationError):
     """Raised when too many verification attempts"""
     pass
+
+class PasswordHashingBusyError(Exception):
+    """Raised when the password hashing queue is full"""
+    pass
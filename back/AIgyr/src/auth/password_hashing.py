@@ -0,0 +1,106 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .exceptions import PasswordHashingBusyError
+from .utils import BCRYPT_ROUNDS, hash_password, verify_and_update_password
+
+# bcrypt gets its own small pool so a login burst queues here instead of
+# occupying the threadpool that sync endpoints (uploads, DB reads) run in.
+# bcrypt releases the GIL, so threads scale up to the number of cores.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+# Jobs allowed to wait for a worker; beyond this requests fail fast with 503
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 64))
+TIMING_SAMPLES = 1000  # Recent jobs kept for the wait/run percentiles
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1)
+
+
+class PasswordHasher:
+    """Bounded executor for bcrypt work, with queue limit and metrics."""
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pending = 0  # Queued or running
+        self.running = 0
+        self.counters = {"completed": 0, "failed": 0, "rejected": 0, "rehashed": 0}
+        self._wait_seconds = deque(maxlen=TIMING_SAMPLES)
+        self._run_seconds = deque(maxlen=TIMING_SAMPLES)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run a blocking password function in the pool, or fail fast if the queue is full."""
+        with self._lock:
+            if self.pending >= self.workers + self.queue_limit:
+                self.counters["rejected"] += 1
+                raise PasswordHashingBusyError("Too many sign-ins in progress, please retry shortly")
+            self.pending += 1
+        queued_at = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self.running += 1
+                self._wait_seconds.append(started - queued_at)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self._run_seconds.append(time.perf_counter() - started)
+
+        future = self._executor.submit(job)
+        # Released when the job ends, not when the caller stops waiting: a cancelled
+        # request whose hash is already running still occupies its worker
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled():
+                return
+            self.counters["failed" if future.exception() else "completed"] += 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify off the event loop; returns (valid, new hash if the cost changed)."""
+        valid, new_hash = await self.run(verify_and_update_password, password, hashed_password)
+        if new_hash:
+            with self._lock:
+                self.counters["rehashed"] += 1
+        return valid, new_hash
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                **self.counters,
+                "wait_ms_p50": _percentile(self._wait_seconds, 0.5),
+                "wait_ms_p99": _percentile(self._wait_seconds, 0.99),
+                "run_ms_p50": _percentile(self._run_seconds, 0.5),
+                "run_ms_p99": _percentile(self._run_seconds, 0.99),
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
@@ -1,28 +1,36 @@
+import asyncio
+import uuid
 from fastapi import APIRouter, Depends, HTTPException, status, Body
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from src.auth.schemas import (
     UserCreate, UserLogin, UserVerify, TokenResponse, UserResponse,
     SendCodeRequest, SendCodeResponse, VerifyCodeRequest, VerifyCodeResponse,
-    ProfileUpdate, ProfileResponse, MessageResponse
+    ProfileUpdate, ProfileResponse, MessageResponse, EmailStatusResponse
 )
 from src.auth.service import create_user, authenticate_user, delete_user_account
 from src.auth.utils import create_access_token
-from src.auth.dependencies import get_current_user
+from src.auth.dependencies import get_current_user, invalidate_principal, require_internal
 from src.auth.verification_service import verification_service
-from src.auth.email_service import email_service
+from src.auth.email_service import email_metrics, get_email_status, record_email_status
+from src.auth.tasks import send_verification_email as send_verification_email_task
 from src.auth.exceptions import (
     EmailVerificationError, CodeExpiredError, InvalidCodeError, 
-    EmailSendError, TooManyAttemptsError
+    EmailSendError, TooManyAttemptsError, PasswordHashingBusyError
 )
+from src.auth.password_hashing import password_hasher
 from src.database import get_db
 from src.auth.models import User
 from google.oauth2 import id_token
 from google.auth.transport import requests
+from src.http_client import get_requests_session
 import jwt
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Reused across sign-ins so Google cert fetches go over a pooled keep-alive session
+_google_request = requests.Request(session=get_requests_session())
+
 def create_user_response(user: User) -> UserResponse:
     """Helper function to safely create UserResponse from User model"""
     return UserResponse(
@@ -36,19 +44,28 @@ def create_user_response(user: User) -> UserResponse:
         profile_completed=user.profile_completed if user.profile_completed is not None else False
     )
 
+def _hashing_busy(e: PasswordHashingBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+# Async so the bcrypt wait happens on the event loop, not in a threadpool slot
 @router.post("/register", response_model=UserResponse, status_code=201)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     try:
-        db_user = create_user(db, user.email, user.password, user.username)
+        db_user = await create_user(db, user.email, user.password, user.username)
+    except PasswordHashingBusyError as e:
+        raise _hashing_busy(e)
     except IntegrityError:
-        db.rollback()
+        await asyncio.to_thread(db.rollback)
         raise HTTPException(status_code=409, detail="Email already exists")
     # In production, send code via email
     return create_user_response(db_user)
 
 @router.post("/login", response_model=TokenResponse)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = authenticate_user(db, user.email, user.password)
+async def login(user: UserLogin, db: Session = Depends(get_db)):
+    try:
+        db_user = await authenticate_user(db, user.email, user.password)
+    except PasswordHashingBusyError as e:
+        raise _hashing_busy(e)
     if not db_user or not db_user.is_verified:
         raise HTTPException(status_code=401, detail="Invalid credentials or email not verified")
     token = create_access_token({"sub": db_user.id})
@@ -61,8 +78,13 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 @router.delete("/delete-account", summary="Delete current user account")
 def delete_account(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     delete_user_account(current_user, db)
+    invalidate_principal(current_user.id)
     return {"msg": "Account deleted"}
 
+@router.get("/password-hashing/stats", dependencies=[Depends(require_internal)])
+def password_hashing_stats():
+    return password_hasher.stats()
+
 @router.get("/me", response_model=UserResponse)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
     return create_user_response(current_user)
@@ -99,6 +121,7 @@ def update_profile(
     current_user.profile_completed = True
     
     db.commit()
+    invalidate_principal(current_user.id)
     db.refresh(current_user)
     
     return ProfileResponse(
@@ -128,7 +151,7 @@ def google_auth(data: dict = Body(...), db: Session = Depends(get_db)):
     if not token:
         raise HTTPException(status_code=400, detail="Google token required")
     try:
-        idinfo = id_token.verify_oauth2_token(token, requests.Request())
+        idinfo = id_token.verify_oauth2_token(token, _google_request)
         email = idinfo["email"]
         username = idinfo.get("name")
         user = db.query(User).filter(User.email == email).first()
@@ -227,39 +250,66 @@ def apple_auth(data: dict = Body(...), db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Invalid Apple token")
 
 # Email verification endpoints
+def _queue_verification_email(email: str, request_id: str) -> None:
+    record_email_status(request_id, "queued")
+    # Only the address goes to the broker; the worker reads the live code from Redis
+    send_verification_email_task.delay(email, request_id)
+
 @router.post("/send-code", response_model=SendCodeResponse, status_code=200)
 async def send_verification_code(request: SendCodeRequest):
     """Send a verification code to the provided email address"""
     try:
         # Generate and store verification code
-        code = await verification_service.generate_and_store_code(request.email)
-        
-        # Send email with verification code
-        await email_service.send_verification_email(request.email, code)
-        
-        return SendCodeResponse(
-            message="Verification code sent successfully",
-            email=request.email
-        )
-        
+        await verification_service.generate_and_store_code(request.email)
     except TooManyAttemptsError as e:
         raise HTTPException(
             status_code=429, 
             detail=str(e)
         )
-    except EmailSendError as e:
-        # Clean up the stored code if email sending fails
-        await verification_service.delete_code(request.email)
+    except Exception as e:
         raise HTTPException(
             status_code=500, 
-            detail="Failed to send verification email. Please try again."
+            detail="An unexpected error occurred"
         )
+
+    request_id = uuid.uuid4().hex
+    try:
+        # Delivery happens in a Celery worker; progress shows up at /auth/send-code/status/{request_id}
+        await asyncio.to_thread(_queue_verification_email, request.email, request_id)
     except Exception as e:
+        # Clean up the stored code if the email couldn't be queued
+        print(f"❌ Could not queue verification email for {request.email}: {e}")
+        await verification_service.delete_code(request.email)
+        await asyncio.to_thread(record_email_status, request_id, "failed", 0, "unavailable")
         raise HTTPException(
             status_code=500, 
-            detail="An unexpected error occurred"
+            detail="Failed to send verification email. Please try again."
         )
 
+    return SendCodeResponse(
+        message="Verification code sent successfully",
+        email=request.email,
+        request_id=request_id
+    )
+
+@router.get("/send-code/status/{request_id}", response_model=EmailStatusResponse)
+def send_code_status(request_id: str):
+    """Delivery state of the email queued by a /send-code call, looked up by its request id"""
+    delivery = get_email_status(request_id)
+    if delivery is None:
+        return EmailStatusResponse(request_id=request_id, status="unknown")
+    return EmailStatusResponse(request_id=request_id, **delivery)
+
+@router.get("/email/stats", dependencies=[Depends(require_internal)])
+def email_stats():
+    return email_metrics()
+
+def _mark_email_verified(db: Session, email: str) -> None:
+    user = db.query(User).filter(User.email == email).first()
+    if user:
+        user.is_verified = True
+        db.commit()
+
 @router.post("/verify-code", response_model=VerifyCodeResponse, status_code=200)
 async def verify_code(request: VerifyCodeRequest, db: Session = Depends(get_db)):
     """Verify the provided code for the email address"""
@@ -267,12 +317,8 @@ async def verify_code(request: VerifyCodeRequest, db: Session = Depends(get_db))
         # Verify the code in Redis
         is_valid = await verification_service.verify_code(request.email, request.code)
         if is_valid:
-            # Set user.is_verified = True in PostgreSQL
-            user = db.query(User).filter(User.email == request.email).first()
-            if user:
-                user.is_verified = True
-                db.commit()
-                db.refresh(user)
+            # Set user.is_verified = True in PostgreSQL, off the event loop
+            await asyncio.to_thread(_mark_email_verified, db, request.email)
             return VerifyCodeResponse(
                 message="Code verified successfully",
                 email=request.email,
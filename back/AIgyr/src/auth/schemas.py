@@ -53,6 +53,14 @@ class SendCodeRequest(BaseModel):
 class SendCodeResponse(BaseModel):
     message: str
     email: str
+    request_id: Optional[str] = None  # For /auth/send-code/status/{request_id}
+
+class EmailStatusResponse(BaseModel):
+    request_id: str
+    status: str  # queued, sending, retrying, sent, failed, expired or unknown
+    attempts: int = 0
+    error: Optional[str] = None  # rate_limited, rejected or unavailable
+    updated_at: Optional[float] = None
 
 class VerifyCodeRequest(BaseModel):
     email: EmailStr
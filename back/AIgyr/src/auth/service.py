@@ -1,11 +1,11 @@
+import asyncio
 from sqlalchemy.orm import Session
 from src.auth.models import User
-from src.auth.utils import hash_password, verify_password
+from src.auth.password_hashing import password_hasher
 import uuid
 import random
 
-def create_user(db: Session, email: str, password: str, username: str = None):
-    hashed_pw = hash_password(password)
+def _insert_user(db: Session, email: str, hashed_pw: str, username: str = None):
     user = User(
         id=str(uuid.uuid4()),
         email=email,
@@ -18,10 +18,26 @@ def create_user(db: Session, email: str, password: str, username: str = None):
     db.refresh(user)
     return user
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def create_user(db: Session, email: str, password: str, username: str = None):
+    hashed_pw = await password_hasher.hash(password)
+    return await asyncio.to_thread(_insert_user, db, email, hashed_pw, username)
+
+def _save_password_hash(db: Session, user: User, hashed_pw: str) -> None:
+    user.hashed_password = hashed_pw
+    db.commit()
+    # Reload here: the commit expired the user, and the caller reads it on the event loop
+    db.refresh(user)
+
+async def authenticate_user(db: Session, email: str, password: str):
+    user = await asyncio.to_thread(lambda: db.query(User).filter(User.email == email).first())
+    if not user:
+        return None
+    valid, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # Stored with a different BCRYPT_ROUNDS; upgrade while we have the plain password
+        await asyncio.to_thread(_save_password_hash, db, user, new_hash)
     return user
 
 def delete_user_account(user, db):
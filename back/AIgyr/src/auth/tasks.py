@@ -0,0 +1,52 @@
+import random
+
+import redis
+
+from celery_app import app
+from .email_service import email_service, record_email_status
+from .exceptions import EmailSendError
+from .verification_service import verification_service
+
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_BACKOFF_SECONDS = 2
+EMAIL_RETRY_BACKOFF_MAX_SECONDS = 60
+
+
+def _backoff(retries: int) -> float:
+    return random.uniform(0, min(EMAIL_RETRY_BACKOFF_MAX_SECONDS, EMAIL_RETRY_BACKOFF_SECONDS * (2 ** retries)))
+
+
+@app.task(name="send_verification_email", bind=True, max_retries=EMAIL_MAX_RETRIES, acks_late=True)
+def send_verification_email(self, to_email: str, request_id: str):
+    """Deliver the address's current verification code, retrying transient failures with jittered backoff.
+
+    The code is read from Redis here rather than passed in, so it never sits in the broker
+    or in task logs; if it expired or was used while queued there is nothing to send.
+    """
+    attempt = self.request.retries + 1
+    try:
+        code = verification_service.get_live_code(to_email)
+    except redis.RedisError as e:
+        if self.request.retries < self.max_retries:
+            record_email_status(request_id, "retrying", attempt, "unavailable")
+            raise self.retry(exc=e, countdown=_backoff(self.request.retries))
+        record_email_status(request_id, "failed", attempt, "unavailable")
+        print(f"❌ Could not read the verification code for {to_email}: {e}")
+        return False
+    if code is None:
+        record_email_status(request_id, "expired", attempt)
+        print(f"⚠️ Verification code for {to_email} is gone, skipping email")
+        return False
+
+    record_email_status(request_id, "sending", attempt)
+    try:
+        email_service.send_verification_email(to_email, code)
+    except EmailSendError as e:
+        if e.retryable and self.request.retries < self.max_retries:
+            record_email_status(request_id, "retrying", attempt, e.reason)
+            raise self.retry(exc=e, countdown=_backoff(self.request.retries))
+        record_email_status(request_id, "failed", attempt, e.reason)
+        print(f"❌ Verification email to {to_email} failed after {attempt} attempt(s): {e}")
+        return False
+    record_email_status(request_id, "sent", attempt)
+    return True
@@ -1,9 +1,8 @@
 import redis
+import redis.asyncio
 import random
 import string
-import asyncio
-from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Dict, Optional
 from .constants import (
     REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD,
     VERIFICATION_CODE_LENGTH, VERIFICATION_CODE_EXPIRY_MINUTES,
@@ -15,142 +14,168 @@ from .exceptions import (
     CodeExpiredError, InvalidCodeError, TooManyAttemptsError
 )
 
+REDIS_MAX_CONNECTIONS = 20
+REDIS_SOCKET_TIMEOUT_SECONDS = 2
+
+# Each script checks the limits and applies its changes atomically, so concurrent
+# requests for the same email can't both slip under a limit, and each endpoint
+# costs one round trip (EVALSHA).
+
+# KEYS: minute counter, hour counter, attempt counter, code
+# ARGV: code, code ttl, per-minute limit, per-hour limit, max attempts
+_STORE_CODE_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') >= tonumber(ARGV[3])
+        or tonumber(redis.call('GET', KEYS[2]) or '0') >= tonumber(ARGV[4]) then
+    return -1
+end
+if tonumber(redis.call('GET', KEYS[3]) or '0') >= tonumber(ARGV[5]) then
+    return -2
+end
+redis.call('SET', KEYS[4], ARGV[1], 'EX', ARGV[2])
+if redis.call('INCR', KEYS[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], 60)
+end
+if redis.call('INCR', KEYS[2]) == 1 then
+    redis.call('EXPIRE', KEYS[2], 3600)
+end
+return 1
+"""
+STORE_RATE_LIMITED = -1
+STORE_TOO_MANY_ATTEMPTS = -2
+
+# KEYS: code, attempt counter
+# ARGV: submitted code, max attempts, attempt window seconds
+_VERIFY_CODE_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') >= tonumber(ARGV[2]) then
+    return -2
+end
+local stored = redis.call('GET', KEYS[1])
+if stored and stored == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 1
+end
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if stored then
+    return 0
+end
+return -1
+"""
+VERIFY_OK = 1
+VERIFY_INVALID = 0
+VERIFY_EXPIRED = -1
+VERIFY_TOO_MANY_ATTEMPTS = -2
+
+
 class VerificationCodeService:
     def __init__(self):
-        self.redis_client = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            db=REDIS_DB,
-            password=REDIS_PASSWORD,
-            decode_responses=True
-        )
-    
+        # Created on first use so the pool binds to the running event loop
+        self._redis_client: Optional[redis.asyncio.Redis] = None
+        self._sync_client: Optional[redis.Redis] = None
+        self._scripts: Dict[str, redis.commands.core.AsyncScript] = {}
+
+    @property
+    def redis_client(self) -> redis.asyncio.Redis:
+        if self._redis_client is None:
+            self._redis_client = redis.asyncio.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                password=REDIS_PASSWORD,
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+            )
+        return self._redis_client
+
+    def _script(self, source: str) -> redis.commands.core.AsyncScript:
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = self.redis_client.register_script(source)
+        return script
+
     def _generate_code(self) -> str:
         """Generate a random numeric verification code"""
         return ''.join(random.choices(string.digits, k=VERIFICATION_CODE_LENGTH))
-    
+
     def _get_verification_key(self, email: str) -> str:
         """Get Redis key for verification code"""
         return f"{VERIFICATION_CODE_PREFIX}{email}"
-    
+
     def _get_attempt_key(self, email: str) -> str:
         """Get Redis key for attempt count"""
         return f"{ATTEMPT_COUNT_PREFIX}{email}"
-    
+
     def _get_rate_limit_key(self, email: str, window: str) -> str:
         """Get Redis key for rate limiting"""
         return f"rate_limit:{window}:{email}"
-    
-    async def check_rate_limit(self, email: str) -> bool:
-        """Check if email is rate limited"""
-        current_time = datetime.now()
-        
-        # Check per-minute rate limit
-        minute_key = self._get_rate_limit_key(email, "minute")
-        minute_count = self.redis_client.get(minute_key)
-        if minute_count and int(minute_count) >= RATE_LIMIT_PER_MINUTE:
-            return False
-        
-        # Check per-hour rate limit
-        hour_key = self._get_rate_limit_key(email, "hour")
-        hour_count = self.redis_client.get(hour_key)
-        if hour_count and int(hour_count) >= RATE_LIMIT_PER_HOUR:
-            return False
-        
-        return True
-    
-    async def increment_rate_limit(self, email: str):
-        """Increment rate limit counters"""
-        current_time = datetime.now()
-        
-        # Increment per-minute counter
-        minute_key = self._get_rate_limit_key(email, "minute")
-        pipe = self.redis_client.pipeline()
-        pipe.incr(minute_key)
-        pipe.expire(minute_key, 60)  # Expire in 60 seconds
-        pipe.execute()
-        
-        # Increment per-hour counter
-        hour_key = self._get_rate_limit_key(email, "hour")
-        pipe = self.redis_client.pipeline()
-        pipe.incr(hour_key)
-        pipe.expire(hour_key, 3600)  # Expire in 1 hour
-        pipe.execute()
-    
-    async def check_attempt_limit(self, email: str) -> bool:
-        """Check if email has exceeded attempt limit"""
-        attempt_key = self._get_attempt_key(email)
-        attempt_count = self.redis_client.get(attempt_key)
-        
-        if attempt_count and int(attempt_count) >= MAX_ATTEMPTS_PER_EMAIL:
-            return False
-        return True
-    
-    async def increment_attempt_count(self, email: str):
-        """Increment attempt count for email"""
-        attempt_key = self._get_attempt_key(email)
-        pipe = self.redis_client.pipeline()
-        pipe.incr(attempt_key)
-        pipe.expire(attempt_key, ATTEMPT_WINDOW_MINUTES * 60)
-        pipe.execute()
-    
-    async def reset_attempt_count(self, email: str):
-        """Reset attempt count for email (on successful verification)"""
-        attempt_key = self._get_attempt_key(email)
-        self.redis_client.delete(attempt_key)
-    
+
     async def generate_and_store_code(self, email: str) -> str:
-        """Generate a verification code and store it in Redis"""
-        # Check rate limits
-        if not await self.check_rate_limit(email):
+        """Check the send and attempt limits, store a new code and count the send, atomically"""
+        code = self._generate_code()
+        result = await self._script(_STORE_CODE_SCRIPT)(
+            keys=[
+                self._get_rate_limit_key(email, "minute"),
+                self._get_rate_limit_key(email, "hour"),
+                self._get_attempt_key(email),
+                self._get_verification_key(email),
+            ],
+            args=[
+                code,
+                VERIFICATION_CODE_EXPIRY_MINUTES * 60,
+                RATE_LIMIT_PER_MINUTE,
+                RATE_LIMIT_PER_HOUR,
+                MAX_ATTEMPTS_PER_EMAIL,
+            ],
+        )
+        if result == STORE_RATE_LIMITED:
             raise TooManyAttemptsError("Rate limit exceeded. Please try again later.")
-        
-        # Check attempt limits
-        if not await self.check_attempt_limit(email):
+        if result == STORE_TOO_MANY_ATTEMPTS:
             raise TooManyAttemptsError("Too many verification attempts. Please try again later.")
-        
-        # Generate code
-        code = self._generate_code()
-        
-        # Store in Redis with expiration
-        verification_key = self._get_verification_key(email)
-        expiry_seconds = VERIFICATION_CODE_EXPIRY_MINUTES * 60
-        
-        self.redis_client.setex(verification_key, expiry_seconds, code)
-        
-        # Increment rate limit counters
-        await self.increment_rate_limit(email)
-        
         return code
-    
+
     async def verify_code(self, email: str, code: str) -> bool:
-        """Verify the provided code for the email"""
-        verification_key = self._get_verification_key(email)
-        stored_code = self.redis_client.get(verification_key)
-        
-        if not stored_code:
-            await self.increment_attempt_count(email)
+        """Verify the provided code for the email; a match consumes the code and resets attempts"""
+        result = await self._script(_VERIFY_CODE_SCRIPT)(
+            keys=[self._get_verification_key(email), self._get_attempt_key(email)],
+            args=[code, MAX_ATTEMPTS_PER_EMAIL, ATTEMPT_WINDOW_MINUTES * 60],
+        )
+        if result == VERIFY_TOO_MANY_ATTEMPTS:
+            raise TooManyAttemptsError("Too many verification attempts. Please try again later.")
+        if result == VERIFY_EXPIRED:
             raise CodeExpiredError("Verification code has expired or doesn't exist")
-        
-        if stored_code != code:
-            await self.increment_attempt_count(email)
+        if result == VERIFY_INVALID:
             raise InvalidCodeError("Invalid verification code")
-        
-        # Code is valid - clean up
-        self.redis_client.delete(verification_key)
-        await self.reset_attempt_count(email)
-        
         return True
-    
+
     async def get_stored_code(self, email: str) -> Optional[str]:
         """Get the stored verification code for an email (for testing/debugging)"""
-        verification_key = self._get_verification_key(email)
-        return self.redis_client.get(verification_key)
-    
+        return await self.redis_client.get(self._get_verification_key(email))
+
+    def get_live_code(self, email: str) -> Optional[str]:
+        """Blocking read of the current code, for Celery workers (no event loop there)"""
+        if self._sync_client is None:
+            self._sync_client = redis.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                password=REDIS_PASSWORD,
+                decode_responses=True,
+                socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+            )
+        return self._sync_client.get(self._get_verification_key(email))
+
     async def delete_code(self, email: str):
         """Delete the stored verification code for an email"""
-        verification_key = self._get_verification_key(email)
-        self.redis_client.delete(verification_key)
+        await self.redis_client.delete(self._get_verification_key(email))
+
+    async def close(self) -> None:
+        if self._redis_client is not None:
+            await self._redis_client.aclose()
+            self._redis_client = None
+            self._scripts.clear()
 
 # Global instance
-verification_service = VerificationCodeService() 
\ No newline at end of file
+verification_service = VerificationCodeService()
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+import redis
+import redis.asyncio
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with a size bound and per-entry TTL.
+
+    Entries are evicted least-recently-used first once `maxsize` is reached.
+    Use it for cheap, per-worker memoization; anything that must be shared
+    between workers belongs in Redis.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Delete every entry whose key matches `predicate`; O(n), for rare invalidations."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# --- Redis-backed shared cache ---
+# Shared between workers and Celery; every helper degrades to a cache miss if Redis is down.
+CACHE_REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+CACHE_REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+CACHE_REDIS_DB = int(os.getenv("CACHE_REDIS_DB", os.getenv("REDIS_DB", 0)))
+CACHE_REDIS_PASSWORD = os.getenv("REDIS_PASSWORD") or None
+CACHE_SOCKET_TIMEOUT_SECONDS = 0.5
+# A cache lookup is never worth waiting for: no retries, so a Redis outage costs one timeout
+CACHE_RETRIES = 0
+
+_redis_client = None
+_async_redis_client = None
+
+
+def get_redis():
+    """Return the shared synchronous Redis client for caching."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis(
+            host=CACHE_REDIS_HOST,
+            port=CACHE_REDIS_PORT,
+            db=CACHE_REDIS_DB,
+            password=CACHE_REDIS_PASSWORD,
+            decode_responses=True,
+            socket_timeout=CACHE_SOCKET_TIMEOUT_SECONDS,
+            socket_connect_timeout=CACHE_SOCKET_TIMEOUT_SECONDS,
+            retry=Retry(NoBackoff(), CACHE_RETRIES),
+        )
+    return _redis_client
+
+
+def get_async_redis():
+    """Return the shared asyncio Redis client for caching."""
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = redis.asyncio.Redis(
+            host=CACHE_REDIS_HOST,
+            port=CACHE_REDIS_PORT,
+            db=CACHE_REDIS_DB,
+            password=CACHE_REDIS_PASSWORD,
+            decode_responses=True,
+            socket_timeout=CACHE_SOCKET_TIMEOUT_SECONDS,
+            socket_connect_timeout=CACHE_SOCKET_TIMEOUT_SECONDS,
+            retry=AsyncRetry(NoBackoff(), CACHE_RETRIES),
+        )
+    return _async_redis_client
+
+
+def cache_get_json(key: str) -> Any:
+    """Return the JSON value stored under `key`, or None on a miss or Redis error."""
+    try:
+        raw = get_redis().get(key)
+    except redis.RedisError as e:
+        print(f"⚠️ Cache GET failed for {key}: {e}")
+        return None
+    return json.loads(raw) if raw is not None else None
+
+
+def cache_set_json(key: str, value: Any, ttl_seconds: int) -> None:
+    """Store `value` as JSON under `key` for `ttl_seconds`; errors are logged and ignored."""
+    try:
+        get_redis().set(key, json.dumps(value), ex=ttl_seconds)
+    except redis.RedisError as e:
+        print(f"⚠️ Cache SET failed for {key}: {e}")
+
+
+def cache_try_lock(key: str, ttl_seconds: int) -> bool:
+    """Take a short-lived Redis lock (SET NX). Returns False if someone else holds it.
+
+    If Redis is unavailable the lock is treated as acquired, so callers still make progress.
+    """
+    try:
+        return bool(get_redis().set(key, "1", nx=True, ex=ttl_seconds))
+    except redis.RedisError as e:
+        print(f"⚠️ Cache lock failed for {key}: {e}")
+        return True
+
+
+async def cache_get_json_async(key: str) -> Any:
+    """Async variant of `cache_get_json`."""
+    try:
+        raw = await get_async_redis().get(key)
+    except redis.RedisError as e:
+        print(f"⚠️ Cache GET failed for {key}: {e}")
+        return None
+    return json.loads(raw) if raw is not None else None
+
+
+async def cache_get_many_json_async(keys: List[str]) -> List[Any]:
+    """Fetch several JSON values in one round trip; misses (or a Redis error) come back as None."""
+    if not keys:
+        return []
+    try:
+        raws = await get_async_redis().mget(keys)
+    except redis.RedisError as e:
+        print(f"⚠️ Cache MGET failed for {len(keys)} key(s): {e}")
+        return [None] * len(keys)
+    return [json.loads(raw) if raw is not None else None for raw in raws]
+
+
+async def cache_set_json_async(key: str, value: Any, ttl_seconds: int) -> None:
+    """Async variant of `cache_set_json`."""
+    try:
+        await get_async_redis().set(key, json.dumps(value), ex=ttl_seconds)
+    except redis.RedisError as e:
+        print(f"⚠️ Cache SET failed for {key}: {e}")
+
+
+async def cache_try_lock_async(key: str, ttl_seconds: int) -> bool:
+    """Async variant of `cache_try_lock`."""
+    try:
+        return bool(await get_async_redis().set(key, "1", nx=True, ex=ttl_seconds))
+    except redis.RedisError as e:
+        print(f"⚠️ Cache lock failed for {key}: {e}")
+        return True
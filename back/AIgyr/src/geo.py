@@ -0,0 +1,219 @@
+import itertools
+import math
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Geohash alphabet (base32 without a, i, l, o)
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE_MAP = {c: i for i, c in enumerate(_BASE32)}
+
+EARTH_RADIUS_M = 6371000.0
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+
+def _cell_bits(precision: int) -> Tuple[int, int]:
+    """Return (lat_bits, lon_bits) for a geohash of the given precision."""
+    total = precision * 5
+    lon_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return lat_bits, lon_bits
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """Return (lat_step, lon_step) in degrees of a geohash cell at `precision`."""
+    lat_bits, lon_bits = _cell_bits(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _cell_index(lat: float, lon: float, precision: int) -> Tuple[int, int]:
+    """Return the integer (lat, lon) grid index of the cell containing a point."""
+    lat_bits, lon_bits = _cell_bits(precision)
+    lat_cells, lon_cells = 1 << lat_bits, 1 << lon_bits
+    lat_idx = int((lat + 90.0) / 180.0 * lat_cells)
+    lon_idx = int((lon + 180.0) / 360.0 * lon_cells)
+    return min(max(lat_idx, 0), lat_cells - 1), min(max(lon_idx, 0), lon_cells - 1)
+
+
+def _encode_index(lat_idx: int, lon_idx: int, precision: int) -> str:
+    """Interleave grid indices into a geohash string (longitude bit first)."""
+    lat_bits, lon_bits = _cell_bits(precision)
+    chars = []
+    value = 0
+    bit_count = 0
+    lat_pos, lon_pos = lat_bits - 1, lon_bits - 1
+    for i in range(precision * 5):
+        if i % 2 == 0:
+            bit = (lon_idx >> lon_pos) & 1
+            lon_pos -= 1
+        else:
+            bit = (lat_idx >> lat_pos) & 1
+            lat_pos -= 1
+        value = (value << 1) | bit
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[value])
+            value = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def encode(lat: float, lon: float, precision: int = 7) -> str:
+    """Encode a lat/lon point as a geohash string."""
+    lat_idx, lon_idx = _cell_index(lat, lon, precision)
+    return _encode_index(lat_idx, lon_idx, precision)
+
+
+def decode_bbox(geohash: str) -> BBox:
+    """Return the (min_lat, min_lon, max_lat, max_lon) box covered by a geohash."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    is_lon = True
+    for char in geohash:
+        bits = _DECODE_MAP[char]
+        for shift in range(4, -1, -1):
+            bit = (bits >> shift) & 1
+            if is_lon:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            is_lon = not is_lon
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def decode(geohash: str) -> Tuple[float, float]:
+    """Return the centre (lat, lon) of a geohash cell."""
+    min_lat, min_lon, max_lat, max_lon = decode_bbox(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cells_for_bbox(bbox: BBox, precision: int) -> Set[str]:
+    """Return every geohash cell at `precision` that overlaps the bounding box."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    lat_lo, lon_lo = _cell_index(min_lat, min_lon, precision)
+    lat_hi, lon_hi = _cell_index(max_lat, max_lon, precision)
+    return {
+        _encode_index(lat_idx, lon_idx, precision)
+        for lat_idx in range(lat_lo, lat_hi + 1)
+        for lon_idx in range(lon_lo, lon_hi + 1)
+    }
+
+
+def count_cells_for_bbox(bbox: BBox, precision: int) -> int:
+    """Return how many cells `cells_for_bbox` would produce, without building them."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    lat_lo, lon_lo = _cell_index(min_lat, min_lon, precision)
+    lat_hi, lon_hi = _cell_index(max_lat, max_lon, precision)
+    return (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1)
+
+
+def cells_for_points(points: Iterable[Tuple[float, float]], precision: int) -> Set[str]:
+    """Return the set of geohash cells touched by a polyline.
+
+    Segments longer than half a cell are densified so a trail that crosses a
+    cell without having a vertex inside it is still indexed under that cell.
+    """
+    lat_step, lon_step = cell_size_degrees(precision)
+    max_step = min(lat_step, lon_step) / 2
+    indices: Set[Tuple[int, int]] = set()
+    prev: Optional[Tuple[float, float]] = None
+    for lat, lon in points:
+        if prev is not None:
+            span = max(abs(lat - prev[0]), abs(lon - prev[1]))
+            if span > max_step:
+                steps = int(span / max_step)
+                for k in range(1, steps + 1):
+                    t = k / (steps + 1)
+                    indices.add(_cell_index(
+                        prev[0] + (lat - prev[0]) * t,
+                        prev[1] + (lon - prev[1]) * t,
+                        precision,
+                    ))
+        indices.add(_cell_index(lat, lon, precision))
+        prev = (lat, lon)
+    return {_encode_index(lat_idx, lon_idx, precision) for lat_idx, lon_idx in indices}
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return great-circle distance between two lat/lon points in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def bbox_around(lat: float, lon: float, radius_m: float) -> BBox:
+    """Return a bounding box that fully contains a circle of `radius_m` around a point."""
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    d_lon = min(math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)), 180.0)
+    return (
+        max(lat - d_lat, -90.0),
+        max(lon - d_lon, -180.0),
+        min(lat + d_lat, 90.0),
+        min(lon + d_lon, 180.0),
+    )
+
+
+def distance_to_bbox_m(lat: float, lon: float, bbox: BBox) -> float:
+    """Return the distance in metres from a point to the nearest edge of a box (0 if inside)."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    nearest_lat = min(max(lat, min_lat), max_lat)
+    nearest_lon = min(max(lon, min_lon), max_lon)
+    return haversine_m(lat, lon, nearest_lat, nearest_lon)
+
+
+def normalize_coordinates(coords: List) -> List[Tuple[float, float]]:
+    """Normalise [[lat, lon], ...] or flat [lat, lon, ...] arrays into (lat, lon) tuples."""
+    if not coords:
+        return []
+    if isinstance(coords[0], (list, tuple)):
+        return [(c[0], c[1]) for c in coords if len(c) >= 2]
+    it = iter(coords)
+    return list(zip(it, it))  # type: ignore
+
+
+def track_arrays(coordinates: List):
+    """Return (lat, lon, elevation | None) numpy arrays from stored trail coordinates.
+
+    Accepts [[lat, lon], ...], [[lat, lon, elevation], ...] or a flat [lat, lon, ...] list.
+    """
+    if not coordinates:
+        return None, None, None
+    if isinstance(coordinates[0], (list, tuple)):
+        # Postgres multidimensional arrays are rectangular, so rows share a width;
+        # fromiter over the flattened rows is ~2x faster than asarray on nested lists
+        width = len(coordinates[0])
+        try:
+            arr = np.fromiter(
+                itertools.chain.from_iterable(coordinates), dtype=float, count=len(coordinates) * width
+            ).reshape(-1, width)
+        except ValueError:
+            arr = np.asarray([c[:2] for c in coordinates if len(c) >= 2], dtype=float)
+    else:
+        arr = np.asarray(coordinates, dtype=float)
+    if arr.ndim == 1:
+        arr = arr[: arr.size - arr.size % 2].reshape(-1, 2)
+    if arr.ndim != 2 or arr.shape[1] < 2 or len(arr) < 2:
+        return None, None, None
+    elevation = arr[:, 2] if arr.shape[1] >= 3 else None
+    return arr[:, 0], arr[:, 1], elevation
+
+
+def segment_lengths_m(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Vectorized haversine distance between consecutive points, in metres."""
+    phi = np.radians(lat)
+    d_phi = np.diff(phi)
+    d_lambda = np.diff(np.radians(lon))
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Collection, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared outbound HTTP layer: one keep-alive pool per process (sync) or event
+# loop (async), per-host concurrency limits and bounded retries with jitter.
+# Integrations should go through `request` / `arequest` instead of creating clients.
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 15))
+DEFAULT_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", 10))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+KEEPALIVE_EXPIRY_SECONDS = 60
+
+DEFAULT_RETRIES = 2
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF_SECONDS = 0.25
+RETRY_BACKOFF_MAX_SECONDS = 2.0
+
+# Per-host concurrency overrides; hosts not listed get DEFAULT_MAX_PER_HOST
+_host_limits: Dict[str, int] = {}
+
+_sync_client: Optional[httpx.Client] = None
+_sync_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_sync_lock = threading.Lock()
+
+# Async clients and semaphores are bound to the event loop that created them
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_async_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+_requests_session: Optional[requests.Session] = None
+
+
+def set_host_concurrency(host: str, limit: int) -> None:
+    """Cap concurrent requests to `host` from this process (or event loop)."""
+    _host_limits[host] = limit
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+def _backoff_seconds(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Full-jitter exponential backoff, honouring a short Retry-After header."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit() and int(retry_after) <= RETRY_BACKOFF_MAX_SECONDS:
+            return float(retry_after)
+    return random.uniform(0, min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * (2 ** attempt)))
+
+
+def get_sync_client() -> httpx.Client:
+    """Return the process-wide pooled sync client."""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(
+                    http2=HTTP2_AVAILABLE,
+                    timeout=DEFAULT_TIMEOUT_SECONDS,
+                    limits=_limits(),
+                )
+    return _sync_client
+
+
+def _sync_semaphore(host: str) -> threading.BoundedSemaphore:
+    semaphore = _sync_semaphores.get(host)
+    if semaphore is None:
+        with _sync_lock:
+            semaphore = _sync_semaphores.setdefault(
+                host, threading.BoundedSemaphore(_host_limits.get(host, DEFAULT_MAX_PER_HOST))
+            )
+    return semaphore
+
+
+def request(
+    method: str,
+    url: str,
+    retries: int = DEFAULT_RETRIES,
+    retry_statuses: Collection[int] = RETRY_STATUSES,
+    **kwargs: Any
+) -> httpx.Response:
+    """Send a request through the shared sync pool.
+
+    Transport errors and `retry_statuses` responses (429/5xx by default) are
+    retried up to `retries` times; the last response is returned as is (call
+    `raise_for_status` as needed), the last transport error is raised.
+    """
+    semaphore = _sync_semaphore(_host(url))
+    attempt = 0
+    while True:
+        try:
+            with semaphore:
+                response = get_sync_client().request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt >= retries:
+                raise
+            delay = _backoff_seconds(attempt)
+        else:
+            if attempt >= retries or response.status_code not in retry_statuses:
+                return response
+            delay = _backoff_seconds(attempt, response)
+        attempt += 1
+        time.sleep(delay)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async client for the running event loop."""
+    global _async_loop, _async_client, _async_semaphores
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_loop is not loop or _async_client.is_closed:
+        # A new loop (e.g. asyncio.run in a Celery task) can't reuse the old loop's connections
+        _async_loop = loop
+        _async_semaphores = {}
+        _async_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=DEFAULT_TIMEOUT_SECONDS,
+            limits=_limits(),
+        )
+    return _async_client
+
+
+def _async_semaphore(host: str) -> asyncio.Semaphore:
+    semaphore = _async_semaphores.get(host)
+    if semaphore is None:
+        semaphore = _async_semaphores[host] = asyncio.Semaphore(_host_limits.get(host, DEFAULT_MAX_PER_HOST))
+    return semaphore
+
+
+async def arequest(
+    method: str,
+    url: str,
+    retries: int = DEFAULT_RETRIES,
+    retry_statuses: Collection[int] = RETRY_STATUSES,
+    **kwargs: Any
+) -> httpx.Response:
+    """Async variant of `request`."""
+    client = get_async_client()
+    semaphore = _async_semaphore(_host(url))
+    attempt = 0
+    while True:
+        try:
+            async with semaphore:
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt >= retries:
+                raise
+            delay = _backoff_seconds(attempt)
+        else:
+            if attempt >= retries or response.status_code not in retry_statuses:
+                return response
+            delay = _backoff_seconds(attempt, response)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def aclose_async_client() -> None:
+    """Close the async pool; call before its event loop shuts down."""
+    global _async_client, _async_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+    _async_client = None
+    _async_loop = None
+
+
+def get_requests_session() -> requests.Session:
+    """Pooled `requests.Session` for libraries that only accept requests (e.g. google-auth)."""
+    global _requests_session
+    if _requests_session is None:
+        with _sync_lock:
+            if _requests_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    pool_maxsize=DEFAULT_MAX_PER_HOST,
+                    max_retries=Retry(
+                        total=DEFAULT_RETRIES,
+                        backoff_factor=RETRY_BACKOFF_SECONDS,
+                        backoff_jitter=RETRY_BACKOFF_SECONDS,
+                        status_forcelist=sorted(RETRY_STATUSES),
+                        allowed_methods=["GET", "HEAD"],
+                        raise_on_status=False,
+                    ),
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _requests_session = session
+    return _requests_session
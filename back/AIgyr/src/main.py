@@ -1,20 +1,34 @@
 import os
-from fastapi import FastAPI, Body
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Body, Depends, WebSocket
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from src.posts.router import router as post_router
 from src.database import Base, engine
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from src.aiengine.router import router as aiengine_router
 from src.auth.router import router as auth_router
 from src.aiengine.websocket import websocket_endpoint
+from src.aiengine.connection_manager import manager as websocket_manager
+from src.auth.dependencies import require_internal
+from src.auth.password_hashing import password_hasher
+from src.auth.verification_service import verification_service
 
 from celery_app import create_task
 
 # Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close chat sockets and the cross-worker fan-out listener with the worker
+    await websocket_manager.close()
+    password_hasher.close()
+    await verification_service.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +38,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses above the threshold for clients that accept gzip (weather
+# documents and trail coordinates are large and compress well); small ones
+# aren't worth the CPU. See benchmarks/bench_weather_payload.py for the numbers.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", 1024)),
+    compresslevel=int(os.getenv("GZIP_COMPRESS_LEVEL", 5)),
+)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -55,6 +78,11 @@ app.include_router(auth_router)
 async def health_check():
     return {"status": "healthy", "websocket_support": True}
 
+# Open sockets, evictions and rejections summed over all workers
+@app.get("/ws/stats", dependencies=[Depends(require_internal)])
+async def websocket_stats():
+    return await websocket_manager.cluster_stats()
+
 @app.websocket("/ws/chat")
-async def websocket_chat(websocket):
+async def websocket_chat(websocket: WebSocket):
     await websocket_endpoint(websocket)
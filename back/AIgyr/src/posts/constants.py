@@ -1 +1,11 @@
+# Spatial index settings
+TRAIL_CELL_PRECISION = 5  # ~4.9km x 4.9km cells in trail_geo_cells
+TRAIL_GEOHASH_PRECISION = 7  # ~150m centroid geohash on trail_data
+MAX_QUERY_CELLS = 32  # Coarsen the query precision until the lookup fits in this many cells
+MAX_NEARBY_RADIUS_M = 200000
 
+# Geometry fingerprint settings
+FINGERPRINT_SIMPLIFY_TOLERANCE_DEG = 0.0001  # ~11m, drops GPS jitter and redundant vertices
+FINGERPRINT_COORD_DECIMALS = 4  # Quantize simplified vertices to ~11m
+FINGERPRINT_DISTANCE_STEP_M = 10
+FINGERPRINT_ELEVATION_STEP_M = 5
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, String, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, String, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import relationship
 from src.database import Base
 
 class Post(Base):
@@ -20,4 +21,37 @@ class TrailData(Base):
     distance_meters = Column(Float)
     elevation_gain_meters = Column(Float)
     trail_conditions = Column(ARRAY(String))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped when a duplicate upload reuses this row, so it becomes the latest trail again
+    last_uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    fingerprint = Column(String(64), nullable=True)  # See compute_trail_fingerprint
+
+    # Spatial summary computed on upload (see src/posts/utils.py)
+    min_lat = Column(Float, nullable=True)
+    min_lon = Column(Float, nullable=True)
+    max_lat = Column(Float, nullable=True)
+    max_lon = Column(Float, nullable=True)
+    centroid_lat = Column(Float, nullable=True)
+    centroid_lon = Column(Float, nullable=True)
+    geohash = Column(String(12, collation="C"), nullable=True, index=True)  # Centroid geohash
+
+    geo_cells = relationship(
+        "TrailGeoCell",
+        back_populates="trail",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        Index("ix_trail_data_user_id_fingerprint", "user_id", "fingerprint"),
+    )
+
+class TrailGeoCell(Base):
+    """Geohash cells a trail passes through, used for index-only spatial lookups."""
+    __tablename__ = "trail_geo_cells"
+
+    # Cell first so the primary key index serves `cell IN (...)` and prefix range scans
+    cell = Column(String(12, collation="C"), primary_key=True)
+    trail_id = Column(Integer, ForeignKey("trail_data.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+    trail = relationship("TrailData", back_populates="geo_cells")
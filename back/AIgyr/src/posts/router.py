@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 from typing import List
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from src.database import get_db
 from src.posts.models import TrailData  # Assuming you have this in models.py
 from src.auth.dependencies import get_current_user
 from src.auth.models import User
 
-from src.posts.schemas import TrailUploadRequest, LatestTrailResponse
+from src.posts.schemas import TrailUploadRequest, LatestTrailResponse, NearbyTrailResponse
+from src.posts.constants import MAX_NEARBY_RADIUS_M
+from src.posts.service import (
+    apply_trail_geometry, find_duplicate_trail, find_trails_in_bbox, find_trails_near, latest_trails_query
+)
+from src.posts.utils import compute_trail_fingerprint, compute_trail_geometry
 
 router = APIRouter(prefix="/gear", tags=["Gear"])
 
@@ -30,21 +36,36 @@ def upload_trail_data(
     db: Session = Depends(get_db)
 ):
     try:
+        fingerprint = compute_trail_fingerprint(
+            request.coordinates,
+            request.distance_meters,
+            request.elevation_gain_meters,
+            request.trail_conditions
+        )
+
+        # Re-upload of a route we already have: reuse the row (and everything cached for it)
+        duplicate = find_duplicate_trail(db, current_user.id, fingerprint)
+        if duplicate:
+            duplicate.last_uploaded_at = func.now()
+            db.commit()
+            return {"message": "Trail data already uploaded", "trail_id": duplicate.id}
+
         trail = TrailData(
             user_id=current_user.id,  # Associate with current user
             coordinates=request.coordinates,
             distance_meters=request.distance_meters,
             elevation_gain_meters=request.elevation_gain_meters,
-            trail_conditions=request.trail_conditions
+            trail_conditions=request.trail_conditions,
+            fingerprint=fingerprint
         )
+        # Bounding box, centroid and geohash cells for nearby-trail lookups
+        apply_trail_geometry(trail, compute_trail_geometry(request.coordinates))
         db.add(trail)
         db.commit()
         db.refresh(trail)
         
         # Clean up old trail data - keep only the 3 most recent
-        user_trails = db.query(TrailData).filter(
-            TrailData.user_id == current_user.id
-        ).order_by(TrailData.id.desc()).all()
+        user_trails = latest_trails_query(db, current_user.id).all()
         
         if len(user_trails) > 3:
             # Delete trails beyond the 3 most recent
@@ -65,10 +86,52 @@ def get_latest_trail(
     db: Session = Depends(get_db)
 ):
     # Get latest trail for the current user only
-    trail = db.query(TrailData).filter(
-        TrailData.user_id == current_user.id
-    ).order_by(TrailData.id.desc()).first()
+    trail = latest_trails_query(db, current_user.id).first()
     
     if not trail:
         raise HTTPException(status_code=404, detail="No trail data found")
     return trail
+
+def _nearby_trail_response(trail: TrailData, distance_from_point: float = None) -> NearbyTrailResponse:
+    return NearbyTrailResponse(
+        id=trail.id,
+        distance_meters=trail.distance_meters or 0,
+        elevation_gain_meters=trail.elevation_gain_meters or 0,
+        trail_conditions=trail.trail_conditions or [],
+        centroid_lat=trail.centroid_lat,
+        centroid_lon=trail.centroid_lon,
+        min_lat=trail.min_lat,
+        min_lon=trail.min_lon,
+        max_lat=trail.max_lat,
+        max_lon=trail.max_lon,
+        distance_from_point_meters=distance_from_point
+    )
+
+@router.get("/nearby", response_model=List[NearbyTrailResponse])
+def get_nearby_trails(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(5000, gt=0, le=MAX_NEARBY_RADIUS_M),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Return the current user's trails that pass within `radius_m` of a point."""
+    results = find_trails_near(db, lat, lon, radius_m, user_id=current_user.id, limit=limit)
+    return [_nearby_trail_response(trail, distance) for trail, distance in results]
+
+@router.get("/within", response_model=List[NearbyTrailResponse])
+def get_trails_within(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Return the current user's trails that pass through a bounding box."""
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+    trails = find_trails_in_bbox(db, (min_lat, min_lon, max_lat, max_lon), user_id=current_user.id, limit=limit)
+    return [_nearby_trail_response(trail) for trail in trails]
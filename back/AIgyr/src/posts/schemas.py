@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class TrailUploadRequest(BaseModel):
     coordinates: List[List[float]]
@@ -19,4 +19,17 @@ class LatestTrailResponse(BaseModel):
     trail_conditions: List[str]
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class NearbyTrailResponse(BaseModel):
+    id: int
+    distance_meters: float
+    elevation_gain_meters: float
+    trail_conditions: List[str]
+    centroid_lat: float
+    centroid_lon: float
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    distance_from_point_meters: Optional[float] = None
@@ -0,0 +1,165 @@
+import math
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, defer
+
+from src import geo
+from src.database import SessionLocal
+from src.posts.constants import MAX_QUERY_CELLS, TRAIL_CELL_PRECISION
+from src.posts.models import TrailData, TrailGeoCell
+
+
+def latest_trails_query(db: Session, user_id: Optional[str] = None):
+    """Query trails newest first, treating a re-uploaded duplicate as new."""
+    query = db.query(TrailData)
+    if user_id:
+        query = query.filter(TrailData.user_id == user_id)
+    return query.order_by(TrailData.last_uploaded_at.desc().nullslast(), TrailData.id.desc())
+
+
+def get_latest_trail(db: Session, user_id: Optional[str] = None) -> Optional[TrailData]:
+    """Return the most recently uploaded trail, optionally for a single user."""
+    return latest_trails_query(db, user_id).first()
+
+
+def load_latest_trail(user_id: Optional[str] = None) -> Optional[TrailData]:
+    """`get_latest_trail` in its own short-lived session (safe to run in a worker thread)."""
+    db = SessionLocal()
+    try:
+        return get_latest_trail(db, user_id)
+    finally:
+        db.close()
+
+
+def find_duplicate_trail(db: Session, user_id: str, fingerprint: Optional[str]) -> Optional[TrailData]:
+    """Return the user's stored trail with the same geometry fingerprint, if any."""
+    if not fingerprint:
+        return None
+    return (
+        db.query(TrailData)
+        .filter(TrailData.user_id == user_id, TrailData.fingerprint == fingerprint)
+        .order_by(TrailData.id.desc())
+        .first()
+    )
+
+
+def apply_trail_geometry(trail: TrailData, geometry: Optional[dict]) -> None:
+    """Copy a `compute_trail_geometry` result onto a trail and its geohash cells."""
+    if not geometry:
+        return
+    trail.min_lat = geometry["min_lat"]
+    trail.min_lon = geometry["min_lon"]
+    trail.max_lat = geometry["max_lat"]
+    trail.max_lon = geometry["max_lon"]
+    trail.centroid_lat = geometry["centroid_lat"]
+    trail.centroid_lon = geometry["centroid_lon"]
+    trail.geohash = geometry["geohash"]
+    trail.geo_cells = [TrailGeoCell(cell=cell) for cell in sorted(geometry["cells"])]
+
+
+def _cell_filter(bbox: geo.BBox):
+    """Build an index-friendly filter on trail_geo_cells covering a bounding box.
+
+    Exact cells are matched with IN; for large boxes the query precision is
+    coarsened and each coarse cell becomes a prefix range scan on the same index.
+    """
+    precision = TRAIL_CELL_PRECISION
+    while precision > 1 and geo.count_cells_for_bbox(bbox, precision) > MAX_QUERY_CELLS:
+        precision -= 1
+
+    cells = sorted(geo.cells_for_bbox(bbox, precision))
+    if precision == TRAIL_CELL_PRECISION:
+        return TrailGeoCell.cell.in_(cells)
+    # "~" sorts after every geohash character under the C collation
+    return or_(*[and_(TrailGeoCell.cell >= cell, TrailGeoCell.cell < cell + "~") for cell in cells])
+
+
+def _bbox_overlap(bbox: geo.BBox):
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return and_(
+        TrailData.max_lat >= min_lat,
+        TrailData.min_lat <= max_lat,
+        TrailData.max_lon >= min_lon,
+        TrailData.min_lon <= max_lon,
+    )
+
+
+def _candidate_query(db: Session, bbox: geo.BBox, user_id: Optional[str] = None):
+    trail_ids = select(TrailGeoCell.trail_id).where(_cell_filter(bbox)).distinct()
+    query = (
+        db.query(TrailData)
+        .options(defer(TrailData.coordinates))
+        .filter(TrailData.id.in_(trail_ids))
+        .filter(_bbox_overlap(bbox))
+    )
+    if user_id:
+        query = query.filter(TrailData.user_id == user_id)
+    return query
+
+
+def find_trails_in_bbox(
+    db: Session,
+    bbox: geo.BBox,
+    user_id: Optional[str] = None,
+    limit: int = 50
+) -> List[TrailData]:
+    """Return trails whose path enters the (min_lat, min_lon, max_lat, max_lon) box."""
+    return (
+        _candidate_query(db, bbox, user_id)
+        .order_by(TrailData.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def find_trails_near(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_m: float,
+    user_id: Optional[str] = None,
+    limit: int = 50
+) -> List[Tuple[TrailData, float]]:
+    """Return (trail, distance_m) pairs for trails within `radius_m` of a point.
+
+    Candidates come from the geohash cell index; the radius test is done
+    against each trail's bounding box and results are sorted by centroid distance.
+    """
+    bbox = geo.bbox_around(lat, lon, radius_m)
+    cos_lat = math.cos(math.radians(lat))
+    # Planar approximation of centroid distance, good enough to order candidates
+    approx_distance = (
+        (TrailData.centroid_lat - lat) * (TrailData.centroid_lat - lat)
+        + (TrailData.centroid_lon - lon) * (TrailData.centroid_lon - lon) * cos_lat * cos_lat
+    )
+    candidates = (
+        _candidate_query(db, bbox, user_id)
+        .order_by(approx_distance)
+        .limit(limit * 2)
+        .all()
+    )
+
+    results = []
+    for trail in candidates:
+        trail_bbox = (trail.min_lat, trail.min_lon, trail.max_lat, trail.max_lon)
+        if geo.distance_to_bbox_m(lat, lon, trail_bbox) > radius_m:
+            continue
+        results.append((trail, geo.haversine_m(lat, lon, trail.centroid_lat, trail.centroid_lon)))
+
+    results.sort(key=lambda item: item[1])
+    return results[:limit]
+
+
+def find_users_near(db: Session, lat: float, lon: float, radius_m: float) -> List[str]:
+    """Return ids of users with a stored trail in the box around a `radius_m` circle."""
+    bbox = geo.bbox_around(lat, lon, radius_m)
+    trail_ids = select(TrailGeoCell.trail_id).where(_cell_filter(bbox)).distinct()
+    rows = (
+        db.query(TrailData.user_id)
+        .filter(TrailData.id.in_(trail_ids))
+        .filter(_bbox_overlap(bbox))
+        .distinct()
+        .all()
+    )
+    return [row.user_id for row in rows]
@@ -0,0 +1,134 @@
+import hashlib
+import math
+from typing import Dict, List, Optional, Set, Tuple
+
+from src import geo
+from src.posts.constants import (
+    TRAIL_CELL_PRECISION, TRAIL_GEOHASH_PRECISION,
+    FINGERPRINT_SIMPLIFY_TOLERANCE_DEG, FINGERPRINT_COORD_DECIMALS,
+    FINGERPRINT_DISTANCE_STEP_M, FINGERPRINT_ELEVATION_STEP_M
+)
+
+
+def compute_trail_geometry(coordinates: List) -> Optional[Dict]:
+    """Compute the spatial summary stored alongside a trail.
+
+    Returns a dict with the bounding box, centroid, centroid geohash and the set
+    of geohash cells the polyline passes through, or None if the coordinates
+    cannot be parsed.
+    """
+    points = geo.normalize_coordinates(coordinates)
+    if not points:
+        return None
+
+    lats = [p[0] for p in points]
+    lons = [p[1] for p in points]
+    centroid_lat = sum(lats) / len(lats)
+    centroid_lon = sum(lons) / len(lons)
+
+    cells: Set[str] = geo.cells_for_points(points, TRAIL_CELL_PRECISION)
+
+    return {
+        "min_lat": min(lats),
+        "min_lon": min(lons),
+        "max_lat": max(lats),
+        "max_lon": max(lons),
+        "centroid_lat": centroid_lat,
+        "centroid_lon": centroid_lon,
+        "geohash": geo.encode(centroid_lat, centroid_lon, TRAIL_GEOHASH_PRECISION),
+        "cells": cells,
+    }
+
+
+def _simplify(points: List[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    """Simplify a polyline with a radial-distance pass followed by Douglas-Peucker.
+
+    Longitudes are scaled by cos(latitude) so the tolerance is roughly isotropic.
+    """
+    if len(points) <= 2:
+        return points
+
+    lon_scale = math.cos(math.radians(points[0][0]))
+    scaled = [(lat, lon * lon_scale) for lat, lon in points]
+
+    # Radial pass: drop vertices closer than `tolerance` to the last kept one
+    keep = [0]
+    tol_sq = tolerance * tolerance
+    for i in range(1, len(scaled) - 1):
+        last = scaled[keep[-1]]
+        if (scaled[i][0] - last[0]) ** 2 + (scaled[i][1] - last[1]) ** 2 >= tol_sq:
+            keep.append(i)
+    keep.append(len(scaled) - 1)
+
+    # Douglas-Peucker on the surviving vertices (iterative to avoid recursion limits)
+    marked = [False] * len(keep)
+    marked[0] = marked[-1] = True
+    stack = [(0, len(keep) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = scaled[keep[first]]
+        bx, by = scaled[keep[last]]
+        dx, dy = bx - ax, by - ay
+        seg_len_sq = dx * dx + dy * dy
+        max_dist_sq, index = 0.0, None
+        for i in range(first + 1, last):
+            px, py = scaled[keep[i]]
+            if seg_len_sq == 0:
+                dist_sq = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg_len_sq))
+                dist_sq = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if dist_sq > max_dist_sq:
+                max_dist_sq, index = dist_sq, i
+        if index is not None and max_dist_sq > tol_sq:
+            marked[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [points[keep[i]] for i in range(len(keep)) if marked[i]]
+
+
+def compute_trail_fingerprint(
+    coordinates: List,
+    distance_meters: Optional[float],
+    elevation_gain_meters: Optional[float],
+    trail_conditions: Optional[List[str]]
+) -> Optional[str]:
+    """Return a stable SHA-256 fingerprint of a trail's geometry and scalars.
+
+    The polyline is simplified and quantized first, so re-uploads of the same
+    route (retries, the same planned route) map to the same fingerprint even
+    if the float values differ in the last digits.
+    """
+    points = geo.normalize_coordinates(coordinates)
+    if not points:
+        return None
+
+    simplified = _simplify(points, FINGERPRINT_SIMPLIFY_TOLERANCE_DEG)
+    quantized = []
+    for lat, lon in simplified:
+        vertex = (round(lat, FINGERPRINT_COORD_DECIMALS), round(lon, FINGERPRINT_COORD_DECIMALS))
+        if not quantized or quantized[-1] != vertex:
+            quantized.append(vertex)
+
+    digest = hashlib.sha256()
+    fmt = f"{{:.{FINGERPRINT_COORD_DECIMALS}f}},{{:.{FINGERPRINT_COORD_DECIMALS}f}};"
+    for lat, lon in quantized:
+        digest.update(fmt.format(lat, lon).encode())
+    digest.update(b"|")
+    digest.update(str(round((distance_meters or 0) / FINGERPRINT_DISTANCE_STEP_M)).encode())
+    digest.update(b"|")
+    digest.update(str(round((elevation_gain_meters or 0) / FINGERPRINT_ELEVATION_STEP_M)).encode())
+    digest.update(b"|")
+    digest.update(",".join(sorted(c.strip().lower() for c in trail_conditions or [])).encode())
+    return digest.hexdigest()
+
+
+def trail_cache_key(trail, namespace: str, *parts) -> str:
+    """Build a cache key for results derived from a trail.
+
+    Keys use the geometry fingerprint rather than the row id, so a duplicate
+    upload keeps hitting the results computed for the original.
+    """
+    identity = trail.fingerprint or f"id-{trail.id}"
+    return ":".join([namespace, "trail", identity, *[str(p) for p in parts]])
@@ -0,0 +1,116 @@
+from datetime import datetime, time as datetime_time, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import redis
+
+from src.cache import get_redis
+
+# Quotas shared by every worker and Celery process through Redis: token buckets
+# for bursts plus an optional fixed per-UTC-day counter, since daily API plans
+# reset at midnight rather than refilling continuously. Everything is checked
+# and charged atomically in one script; bucket refills use Redis' own clock,
+# so hosts with skewed clocks agree.
+#
+# KEYS: cooldown, daily counter, bucket...
+# ARGV: cost, reserve fraction, daily limit (0 = none), daily expiry (epoch s),
+#       then capacity and refill rate per bucket
+_ACQUIRE_SCRIPT = """
+local cooldown_key = KEYS[1]
+if redis.call('EXISTS', cooldown_key) == 1 then
+    return {0, -1}
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local reserve_fraction = tonumber(ARGV[2])
+local daily_limit = tonumber(ARGV[3])
+local lowest = nil
+if daily_limit > 0 then
+    local used = tonumber(redis.call('GET', KEYS[2]) or '0')
+    if used + cost > daily_limit * (1 - reserve_fraction) then
+        return {0, math.floor(daily_limit - used)}
+    end
+    lowest = daily_limit - used - cost
+end
+local levels = {}
+for i = 3, #KEYS do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens - cost < capacity * reserve_fraction then
+        return {0, math.floor(tokens)}
+    end
+    levels[i] = tokens
+    if lowest == nil or tokens - cost < lowest then
+        lowest = tokens - cost
+    end
+end
+if daily_limit > 0 then
+    redis.call('INCRBYFLOAT', KEYS[2], cost)
+    redis.call('EXPIREAT', KEYS[2], ARGV[4])
+end
+for i = 3, #KEYS do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    redis.call('HSET', KEYS[i], 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[i], math.ceil(capacity / rate) + 60)
+end
+return {1, math.floor(lowest or 0)}
+"""
+
+
+class SharedRateLimiter:
+    """Cluster-wide token-bucket limiter for an upstream API key.
+
+    `limits` is a list of (capacity, refill_per_second) buckets, e.g. a
+    per-minute burst bucket, and `daily_limit` caps calls per UTC calendar
+    day; a call must fit in all of them. Callers pass a `reserve_fraction` to
+    express priority: the call is only allowed if every budget keeps at least
+    that fraction of its capacity, so low-priority work stops well before
+    interactive requests are refused.
+
+    If Redis is unavailable the limiter fails open.
+    """
+
+    def __init__(self, name: str, limits: List[Tuple[float, float]], daily_limit: Optional[int] = None):
+        self.name = name
+        self.limits = limits
+        self.daily_limit = daily_limit
+        self._cooldown_key = f"quota:{name}:cooldown"
+        self._bucket_keys = [f"quota:{name}:bucket:{i}" for i in range(len(limits))]
+        self._script = None
+
+    def _get_script(self):
+        if self._script is None:
+            self._script = get_redis().register_script(_ACQUIRE_SCRIPT)
+        return self._script
+
+    def try_acquire(self, cost: float = 1, reserve_fraction: float = 0.0) -> bool:
+        """Take `cost` tokens if the budget allows it at this priority."""
+        today = datetime.now(timezone.utc).date()
+        next_midnight = datetime.combine(today + timedelta(days=1), datetime_time(), tzinfo=timezone.utc)
+        daily_key = f"quota:{self.name}:day:{today.isoformat()}"
+        args = [cost, reserve_fraction, self.daily_limit or 0, int(next_midnight.timestamp())]
+        for capacity, rate in self.limits:
+            args.extend([capacity, rate])
+        try:
+            allowed, remaining = self._get_script()(
+                keys=[self._cooldown_key, daily_key, *self._bucket_keys], args=args
+            )
+        except redis.RedisError as e:
+            print(f"⚠️ Quota check for {self.name} failed, allowing call: {e}")
+            return True
+        if not allowed:
+            reason = "cooling down after rate limit" if remaining == -1 else f"{remaining} token(s) left"
+            print(f"🚦 {self.name} quota denied call ({reason}, reserve {reserve_fraction:.0%})")
+        return bool(allowed)
+
+    def cooldown(self, seconds: float) -> None:
+        """Pause all calls cluster-wide, e.g. after the upstream answered 429."""
+        try:
+            get_redis().set(self._cooldown_key, "1", ex=max(1, int(seconds)))
+        except redis.RedisError as e:
+            print(f"⚠️ Could not set {self.name} cooldown: {e}")